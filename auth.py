@@ -1,6 +1,6 @@
 import streamlit as st
 import pandas as pd
-from database import DatabaseManager
+from database import DatabaseManager, TradeHistory
 from datetime import datetime
 import re
 import os
@@ -48,7 +48,7 @@ class AuthManager:
                 p['positions'] = {}
             if not isinstance(p.get('inventory'), dict):
                 p['inventory'] = {}
-            if not isinstance(p.get('trade_history'), list):
+            if not isinstance(p.get('trade_history'), (list, TradeHistory)):
                 p['trade_history'] = []
             if 'cash' not in p:
                 p['cash'] = 100000
@@ -196,7 +196,7 @@ class AuthManager:
                 account_data['positions'] = {}
             if not isinstance(account_data.get('inventory'), dict):
                 account_data['inventory'] = {}
-            if not isinstance(account_data.get('trade_history'), list):
+            if not isinstance(account_data.get('trade_history'), (list, TradeHistory)):
                 account_data['trade_history'] = []
             if 'cash' not in account_data:
                 account_data['cash'] = 100000
@@ -212,7 +212,7 @@ class AuthManager:
                 'total_value': 100000,
                 'positions': {},
                 'inventory': {},
-                'trade_history': [],
+                'trade_history': TradeHistory(self.db.db_path, user_id),
                 'max_items_per_symbol': 1000
             }
         
@@ -0,0 +1,380 @@
+import numpy as np
+import pandas as pd
+
+# 可选的Numba加速，未安装时使用纯NumPy/Python实现
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# 回测从第20根K线开始（MA20有效）
+START_INDEX = 19
+# T+7：买入7根K线后才能止盈卖出
+HOLD_BARS = 7
+# 首次建仓和后续加仓的仓位
+FIRST_LOT = 0.3
+ADD_LOT = 0.1
+# 单个参数组合同时持有的最大批次数。总仓位<1时才加仓0.1：0.3的首仓被止盈卖出后可只剩0.1的批次，
+# 10批的浮点累加和为0.9999999999999999，仍会再加一批，因此最多11批，MAX_LOTS 多留1批余量
+MAX_LOTS = 12
+
+RESULT_COLUMNS = ['pos', 'ret', 'buy', 'sell', 'price', 'ma5', 'ma10', 'ma20', 'bias']
+
+
+def _backtest_kernel(buy_cond, stop_cond, tp_cond, sell_factor, start, n):
+    """
+    逐K线的仓位状态机
+
+    持仓按买入顺序存放在数组队列中（lot_bar/lot_size，head~tail为当前持仓）。
+    已满7根K线的持仓总是队列的前缀，因此止盈和清仓都只需要移动head。
+
+    Returns:
+        tuple: (pos, buy, sell, 是否发生过买入, 是否发生过卖出)
+    """
+    lot_bar = np.zeros(n, dtype=np.int64)
+    lot_size = np.zeros(n)
+    head = 0
+    tail = 0
+
+    pos_out = np.zeros(n)
+    buy_out = np.zeros(n)
+    sell_out = np.zeros(n)
+    any_buy = False
+    any_sell = False
+
+    for i in range(start, n):
+        # 按买入顺序累加，与逐笔求和的结果完全一致
+        current_pos = 0.0
+        for j in range(head, tail):
+            current_pos += lot_size[j]
+
+        buy = 0.0
+        sell = 0.0
+
+        # 买入逻辑
+        if buy_cond[i]:
+            if head == tail:
+                lot_bar[tail] = i
+                lot_size[tail] = FIRST_LOT
+                tail += 1
+                buy = FIRST_LOT
+                any_buy = True
+            elif current_pos < 1:
+                lot_bar[tail] = i
+                lot_size[tail] = ADD_LOT
+                tail += 1
+                buy = ADD_LOT
+                any_buy = True
+        # 卖出逻辑
+        else:
+            sold_pos = 0.0
+            if stop_cond[i]:
+                # 清仓：卖出全部持仓
+                for j in range(head, tail):
+                    sold_pos += lot_size[j]
+                    any_sell = True
+                head = tail
+            else:
+                # 止盈：从最早的已解锁持仓开始卖出
+                sell_pos = current_pos * sell_factor if tp_cond[i] else 0.0
+                while head < tail and i - lot_bar[head] >= HOLD_BARS:
+                    sold_pos += lot_size[head]
+                    head += 1
+                    any_sell = True
+                    if sold_pos >= sell_pos:
+                        break
+            sell = sold_pos
+
+        pos_out[i] = current_pos + buy - sell
+        buy_out[i] = buy
+        sell_out[i] = sell
+
+    return pos_out, buy_out, sell_out, any_buy, any_sell
+
+
+if NUMBA_AVAILABLE:
+    _backtest_kernel = njit(cache=True)(_backtest_kernel)
+
+
+def prepare_indicators(close):
+    """
+    预计算回测用到的收益率和均线（与参数无关，可在多组参数之间复用）
+
+    Args:
+        close (pd.Series): 收盘价
+
+    Returns:
+        dict: ret/ma5/ma10/ma20 的float64数组及收盘价
+    """
+    return {
+        'close': close.to_numpy(dtype=float),
+        'ret': close.pct_change().to_numpy(dtype=float),
+        'ma5': close.rolling(5).mean().to_numpy(dtype=float),
+        'ma10': close.rolling(10).mean().to_numpy(dtype=float),
+        'ma20': close.rolling(20).mean().to_numpy(dtype=float),
+    }
+
+
+def slice_indicators(indicators, start, stop):
+    """
+    截取预计算指标的一段（视图，不重新计算均线）
+
+    截取段前面的K线已经为均线提供了预热数据，因此 start 取目标区间起点之前
+    START_INDEX 根K线时，回测结果正好从目标区间起点开始。
+    """
+    return {key: values[start:stop] for key, values in indicators.items()}
+
+
+def run_backtest(indicators, k0=6.7, bias_th=0.07, sell_days=3, sell_drop_th=-0.05):
+    """
+    在预计算指标上执行回测
+
+    Returns:
+        dict: 各结果列的数组（从START_INDEX开始）
+    """
+    close = indicators['close']
+    ma5 = indicators['ma5']
+    ma10 = indicators['ma10']
+    ma20 = indicators['ma20']
+    n = len(close)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bias = close / ma5 - 1
+        price_drop = np.zeros(n)
+        if sell_days < n:
+            price_drop[sell_days:] = close[sell_days:] / close[:n - sell_days] - 1
+
+    can_stop = np.arange(n) >= sell_days
+    buy_cond = (ma5 > ma20) & (close > ma10) & (bias < bias_th)
+    stop_cond = can_stop & (price_drop < sell_drop_th) & (close < ma10)
+    tp_cond = bias >= bias_th
+    sell_factor = 1 - np.exp(-k0 * bias_th)
+    if not NUMBA_AVAILABLE:
+        # 纯Python循环中逐元素访问列表比访问NumPy数组快得多
+        buy_cond, stop_cond, tp_cond = buy_cond.tolist(), stop_cond.tolist(), tp_cond.tolist()
+
+    pos, buy, sell, any_buy, any_sell = _backtest_kernel(
+        buy_cond, stop_cond, tp_cond, float(sell_factor), START_INDEX, n
+    )
+
+    window = slice(START_INDEX, n)
+    pos = pos[window]
+    result = {
+        'pos': pos,
+        'ret': pos * indicators['ret'][window],
+        'buy': buy[window],
+        'sell': sell[window],
+        'price': close[window],
+        'ma5': ma5[window],
+        'ma10': ma10[window],
+        'ma20': ma20[window],
+        'bias': bias[window],
+    }
+
+    # 从未成交时仓位列保持整数类型（与逐行记录构造的DataFrame一致）
+    if not any_buy:
+        for col in ('pos', 'buy'):
+            result[col] = result[col].astype(np.int64)
+    if not any_sell:
+        result['sell'] = result['sell'].astype(np.int64)
+    return result
+
+
+def run_backtest_batch(indicators, params):
+    """
+    同时回测多组参数
+
+    所有参数组合逐K线同步推进，持仓状态为 [n_params, MAX_LOTS] 的数组，
+    每根K线只做一次向量化运算，结果与逐组调用 run_backtest 完全一致。
+
+    Args:
+        indicators (dict): prepare_indicators 的结果
+        params (array-like): [n_params, 4] 的参数矩阵，列为 k0/bias_th/sell_days/sell_drop_th
+
+    Returns:
+        dict: pos/ret/buy/sell 为 [n_params, n_bars] 的矩阵（从START_INDEX开始）
+    """
+    params = np.atleast_2d(np.asarray(params, dtype=float))
+    k0 = params[:, 0]
+    bias_th = params[:, 1]
+    sell_days = params[:, 2].astype(np.int64)
+    sell_drop_th = params[:, 3]
+
+    close = indicators['close']
+    ma5 = indicators['ma5']
+    ma10 = indicators['ma10']
+    ma20 = indicators['ma20']
+    n = len(close)
+    n_params = len(params)
+    bars = np.arange(n)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bias = close / ma5 - 1
+        # 各参数组合按自己的观察天数计算跌幅 [n_params, n]
+        lag_index = bars[None, :] - sell_days[:, None]
+        price_drop = np.where(lag_index >= 0, close[None, :] / close[np.maximum(lag_index, 0)] - 1, 0.0)
+
+    trend_ok = (ma5 > ma20) & (close > ma10)
+    buy_cond = trend_ok[None, :] & (bias[None, :] < bias_th[:, None])
+    stop_cond = (lag_index >= 0) & (price_drop < sell_drop_th[:, None]) & (close < ma10)[None, :]
+    tp_cond = bias[None, :] >= bias_th[:, None]
+    sell_factor = 1 - np.exp(-k0 * bias_th)
+
+    # 持仓按买入顺序左对齐存放，count为每组参数当前的持仓批次数
+    lot_bar = np.zeros((n_params, MAX_LOTS), dtype=np.int64)
+    lot_size = np.zeros((n_params, MAX_LOTS))
+    count = np.zeros(n_params, dtype=np.int64)
+    rows = np.arange(n_params)
+    columns = np.arange(MAX_LOTS)
+
+    pos_out = np.zeros((n_params, n))
+    buy_out = np.zeros((n_params, n))
+    sell_out = np.zeros((n_params, n))
+
+    for i in range(START_INDEX, n):
+        # 按买入顺序逐批累加（空位为0，不影响结果）
+        current_pos = np.zeros(n_params)
+        for j in range(MAX_LOTS):
+            current_pos = current_pos + lot_size[:, j]
+
+        # 买入逻辑
+        buying = buy_cond[:, i]
+        first = buying & (count == 0)
+        add = buying & (count > 0) & (current_pos < 1)
+        buy = np.where(first, FIRST_LOT, np.where(add, ADD_LOT, 0.0))
+        opened = first | add
+        if opened.any():
+            slot = count[opened]
+            lot_bar[rows[opened], slot] = i
+            lot_size[rows[opened], slot] = buy[opened]
+            count = count + opened
+
+        # 卖出逻辑
+        selling = ~buying
+        stop = selling & stop_cond[:, i]
+        take_profit = selling & ~stop_cond[:, i]
+
+        # 止盈：从最早的已解锁持仓开始卖出，累计达到目标仓位后停止
+        sell_pos = np.where(tp_cond[:, i], current_pos * sell_factor, 0.0)
+        sold_pos = np.zeros(n_params)
+        sold_count = np.zeros(n_params, dtype=np.int64)
+        active = take_profit
+        for j in range(MAX_LOTS):
+            active = active & (j < count) & (i - lot_bar[:, j] >= HOLD_BARS)
+            if not active.any():
+                break
+            sold_pos = np.where(active, sold_pos + lot_size[:, j], sold_pos)
+            sold_count = sold_count + active
+            active = active & ~(sold_pos >= sell_pos)
+
+        # 清仓：卖出全部持仓（按买入顺序累加即为当前仓位）
+        sold_pos = np.where(stop, current_pos, sold_pos)
+        sold_count = np.where(stop, count, sold_count)
+
+        if sold_count.any():
+            shifted = columns[None, :] + sold_count[:, None]
+            keep = shifted < MAX_LOTS
+            shifted = np.minimum(shifted, MAX_LOTS - 1)
+            lot_size = np.where(keep, np.take_along_axis(lot_size, shifted, axis=1), 0.0)
+            lot_bar = np.where(keep, np.take_along_axis(lot_bar, shifted, axis=1), 0)
+            count = count - sold_count
+
+        sell = np.where(selling, sold_pos, 0.0)
+        pos_out[:, i] = current_pos + buy - sell
+        buy_out[:, i] = buy
+        sell_out[:, i] = sell
+
+    window = slice(START_INDEX, n)
+    pos = pos_out[:, window]
+    return {
+        'pos': pos,
+        'ret': pos * indicators['ret'][None, window],
+        'buy': buy_out[:, window],
+        'sell': sell_out[:, window],
+    }
+
+
+def backtest_strategy(kline_df, k0=6.7, bias_th=0.07, sell_days=3, sell_drop_th=-0.05):
+    """
+    回测函数，增加仓位记录和买卖信号
+
+    Args:
+        kline_df (pd.DataFrame): 以date为索引、包含close列的K线数据
+        k0 (float): 止盈强度因子
+        bias_th (float): 相对MA5的偏离阈值
+        sell_days (int): 止损观察天数
+        sell_drop_th (float): 止损跌幅阈值
+
+    Returns:
+        pd.DataFrame: 以date为索引，列为 pos/ret/buy/sell/price/ma5/ma10/ma20/bias
+    """
+    if len(kline_df) <= START_INDEX:
+        return pd.DataFrame(columns=['date'] + RESULT_COLUMNS).set_index('date')
+
+    indicators = prepare_indicators(kline_df['close'])
+    result = run_backtest(indicators, k0, bias_th, sell_days, sell_drop_th)
+    index = kline_df.index[START_INDEX:]
+    return pd.DataFrame(result, index=index.rename('date'), columns=RESULT_COLUMNS)
+
+
+def get_risk_metrics(df, num=365):
+    """计算策略收益情况"""
+    if df.empty or 'ret' not in df.columns:
+        return {}
+
+    value_df = (1 + df['ret']).cumprod()
+    annual_ret = value_df.iloc[-1] ** (num / len(df)) - 1
+    vol = df['ret'].std() * np.sqrt(num)
+    sharpe = annual_ret / vol if vol != 0 else 0
+    max_dd = (1 - value_df / value_df.cummax()).max()
+    calmar = annual_ret / max_dd if max_dd != 0 else 0
+
+    return {
+        '总收益率': (value_df.iloc[-1] - 1),
+        '年化收益': annual_ret,
+        '波动率': vol,
+        'Sharpe': sharpe,
+        '最大回撤': max_dd,
+        'Calmar': calmar
+    }
+
+
+def get_risk_metrics_array(ret, num=365):
+    """
+    get_risk_metrics 的NumPy版本，直接作用于每日收益数组（参数优化中大量调用时使用）
+
+    Args:
+        ret (np.ndarray): 每日收益，一维数组或 [n_params, n_bars] 的矩阵
+        num (int): 年化天数
+
+    Returns:
+        dict: 与 get_risk_metrics 相同的指标；输入为矩阵时每个指标为长度n_params的数组
+    """
+    ret = np.asarray(ret, dtype=float)
+    if ret.shape[-1] == 0:
+        return {}
+
+    matrix = np.atleast_2d(ret)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = np.nancumprod(1 + matrix, axis=1)
+        annual_ret = value[:, -1] ** (num / matrix.shape[1]) - 1
+        valid = np.count_nonzero(~np.isnan(matrix), axis=1) > 1
+        vol = np.full(len(matrix), np.nan)
+        if valid.any():
+            vol[valid] = np.nanstd(matrix[valid], axis=1, ddof=1) * np.sqrt(num)
+        sharpe = np.where(vol != 0, annual_ret / vol, 0)
+        max_dd = np.max(1 - value / np.maximum.accumulate(value, axis=1), axis=1)
+        calmar = np.where(max_dd != 0, annual_ret / max_dd, 0)
+
+    metrics = {
+        '总收益率': (value[:, -1] - 1),
+        '年化收益': annual_ret,
+        '波动率': vol,
+        'Sharpe': sharpe,
+        '最大回撤': max_dd,
+        'Calmar': calmar
+    }
+    if ret.ndim == 1:
+        return {key: values[0] for key, values in metrics.items()}
+    return metrics
@@ -0,0 +1,126 @@
+"""
+回测基准测试：逐行pandas回测 与 backtest_engine 数组引擎的耗时
+
+loop_backtest_strategy 是改为数组引擎之前 backtest_strategy 的逐行pandas写法（对照组）。
+Numba 已安装时内核会被编译，首次调用的编译时间不计入。
+
+用法（在仓库根目录执行）：
+    python benchmarks/bench_backtest.py [K线根数] [参数组数]
+"""
+import itertools
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backtest_engine  # noqa: E402
+
+
+def loop_backtest_strategy(kline_df, k0=6.7, bias_th=0.07, sell_days=3, sell_drop_th=-0.05):
+    """改为数组引擎之前的逐行pandas回测（对照实现）"""
+    ret = kline_df['close'].pct_change()
+    ma5 = kline_df['close'].rolling(5).mean()
+    ma10 = kline_df['close'].rolling(10).mean()
+    ma20 = kline_df['close'].rolling(20).mean()
+
+    pos = {}
+    ret_ls = []
+    for i in range(19, len(kline_df)):
+        close = kline_df['close'].iloc[i]
+        bias = close / ma5.iloc[i] - 1
+
+        price_drop = 0
+        ma10_break = False
+        if i >= sell_days:
+            drop_cal = kline_df['close'].iloc[i - sell_days]
+            price_drop = close / drop_cal - 1
+            ma10_break = close < ma10.iloc[i]
+
+        current_pos = sum(list(pos.values()))
+        buy = 0
+        sell = 0
+        sold_pos = 0
+
+        if ma5.iloc[i] > ma20.iloc[i] and close > ma10.iloc[i] and bias < bias_th:
+            if not pos:
+                pos[i] = 0.3
+                buy = 0.3
+            elif current_pos < 1:
+                pos[i] = 0.1
+                buy = 0.1
+        else:
+            if i >= sell_days and price_drop < sell_drop_th and ma10_break:
+                for k in list(pos.keys()):
+                    sold_pos += pos[k]
+                    del pos[k]
+            else:
+                sell_pos = current_pos * (1 - np.exp(-k0 * bias_th)) if bias >= bias_th else 0
+                for k in list(pos.keys()):
+                    if i - k >= 7:
+                        sold_pos += pos[k]
+                        del pos[k]
+                        if sold_pos >= sell_pos:
+                            break
+            sell = sold_pos
+
+        ret_ls.append({
+            'date': kline_df.index[i],
+            'pos': current_pos + buy - sell,
+            'ret': (current_pos + buy - sell) * ret.iloc[i],
+            'buy': buy,
+            'sell': sell,
+            'price': close,
+            'ma5': ma5.iloc[i],
+            'ma10': ma10.iloc[i],
+            'ma20': ma20.iloc[i],
+            'bias': bias
+        })
+    return pd.DataFrame(ret_ls).set_index('date')
+
+
+def make_klines(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.002, 0.03, n)))
+    return pd.DataFrame({'close': close}, index=pd.date_range('2000-01-01', periods=n, freq='D'))
+
+
+def per_call_ms(fn, reps):
+    fn()
+    start = time.perf_counter()
+    for _ in range(reps):
+        fn()
+    return (time.perf_counter() - start) / reps * 1e3
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    n_params = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    kline_df = make_klines(n)
+    indicators = backtest_engine.prepare_indicators(kline_df['close'])
+    grid = list(itertools.product(np.linspace(2, 15, 4), np.linspace(0.02, 0.1, 4), (1, 3, 5, 7), (-0.08, -0.05)))
+    params = grid[:n_params]
+
+    expected = loop_backtest_strategy(kline_df)
+    result = backtest_engine.backtest_strategy(kline_df)
+    pd.testing.assert_frame_equal(result, expected, check_exact=True, check_freq=False)
+
+    loop_ms = per_call_ms(lambda: loop_backtest_strategy(kline_df), 3)
+    print(f'bars={n}  numba={backtest_engine.NUMBA_AVAILABLE}  results identical to the loop')
+    print(f'{"impl":34s} {"ms/param set":>13s} {"speedup":>8s}')
+    cases = (
+        ('pandas loop', loop_ms),
+        ('backtest_strategy', per_call_ms(lambda: backtest_engine.backtest_strategy(kline_df), 20)),
+        ('run_backtest (shared indicators)', per_call_ms(lambda: backtest_engine.run_backtest(indicators), 20)),
+        (f'run_backtest_batch ({len(params)} sets)',
+         per_call_ms(lambda: backtest_engine.run_backtest_batch(indicators, params), 3) / len(params)),
+    )
+    for name, ms in cases:
+        print(f'{name:34s} {ms:13.3f} {loop_ms / ms:7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
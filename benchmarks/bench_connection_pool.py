@@ -0,0 +1,71 @@
+"""
+连接池基准测试：多个会话线程并发执行 登录 -> 读取账户 -> 保存账户
+
+对比两种配置：
+  pooled    默认连接池，空闲连接在会话间复用
+  unpooled  空闲上限为0的连接池，每次操作新建并关闭连接
+
+用法（在仓库根目录执行）：
+    python benchmarks/bench_connection_pool.py [会话数] [每个会话的操作次数]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import ConnectionPool, DatabaseManager  # noqa: E402
+
+
+def run(db_path, sessions, ops, pool_size=None):
+    db = DatabaseManager(db_path)
+    if pool_size is not None:
+        db.pool = ConnectionPool(db_path, size=pool_size)
+        db.pool.initialized = True
+    for i in range(sessions):
+        db.register_user(f'u{i}', f'u{i}@example.com', 'pw', f'U{i}')
+
+    failed = []
+
+    def session(i):
+        for _ in range(ops):
+            # 每次页面刷新都会新建DatabaseManager，连接池按数据库文件共享
+            d = DatabaseManager(db_path)
+            d.pool = db.pool
+            ok, user = d.login_user(f'u{i}', 'pw')
+            account = d.get_user_account(user['id'])
+            account['cash'] -= 1
+            account['trade_history'].append({
+                'date': datetime.now().isoformat(), 'symbol': 'A', 'action': '买入',
+                'quantity': 1, 'price': 1.0, 'total': 1.0, 'type': '买入',
+            })
+            if not d.save_user_account(user['id'], account):
+                failed.append(i)
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    db.pool.close_all()
+    return elapsed, len(failed)
+
+
+def main():
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    ops = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    total = sessions * ops
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, pool_size in (('pooled', None), ('unpooled', 0)):
+            elapsed, failed = run(os.path.join(tmp, f'{name}.db'), sessions, ops, pool_size)
+            print(f'{name:9s} sessions={sessions} ops={total} {elapsed:.2f}s '
+                  f'{total / elapsed:.0f} ops/s failed_saves={failed}')
+
+
+if __name__ == '__main__':
+    main()
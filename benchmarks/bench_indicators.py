@@ -0,0 +1,132 @@
+"""
+指标计算基准测试：逐列pandas实现 与 indicators 模块的耗时和内存峰值
+
+pandas_indicators 是 indicators 模块之前 calculate_technical_indicators 的逐列pandas写法，
+每一步都会生成中间Series并把结果逐列插入DataFrame。内存峰值由 tracemalloc 统计。
+
+用法（在仓库根目录执行）：
+    python benchmarks/bench_indicators.py [K线根数] [重复次数]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import indicators  # noqa: E402
+
+
+def pandas_indicators(df):
+    """逐列pandas实现（对照组）"""
+    df = df.copy()
+
+    for window in indicators.MA_WINDOWS:
+        df[f'ma{window}'] = df['close'].rolling(window).mean()
+    df['ema12'] = df['close'].ewm(span=12).mean()
+    df['ema26'] = df['close'].ewm(span=26).mean()
+
+    delta = df['close'].diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+    df['rsi'] = 100 - (100 / (1 + gain / loss))
+
+    df['macd'] = df['ema12'] - df['ema26']
+    df['macd_signal'] = df['macd'].ewm(span=9).mean()
+    df['macd_histogram'] = df['macd'] - df['macd_signal']
+
+    df['bb_middle'] = df['close'].rolling(20).mean()
+    bb_std = df['close'].rolling(20).std()
+    df['bb_upper'] = df['bb_middle'] + (bb_std * 2)
+    df['bb_lower'] = df['bb_middle'] - (bb_std * 2)
+    df['bb_position'] = (df['close'] - df['bb_lower']) / (df['bb_upper'] - df['bb_lower'])
+
+    low_min = df['low'].rolling(9).min()
+    high_max = df['high'].rolling(9).max()
+    rsv = (df['close'] - low_min) / (high_max - low_min) * 100
+    df['k'] = rsv.ewm(com=2).mean()
+    df['d'] = df['k'].ewm(com=2).mean()
+    df['j'] = 3 * df['k'] - 2 * df['d']
+
+    df['obv'] = (df['volume'] * ((df['close'] > df['close'].shift(1)).astype(int) * 2 - 1)).cumsum()
+
+    typical_price = (df['high'] + df['low'] + df['close']) / 3
+    money_flow = typical_price * df['volume']
+    positive_flow = money_flow.where(typical_price > typical_price.shift(1), 0).rolling(14).sum()
+    negative_flow = money_flow.where(typical_price < typical_price.shift(1), 0).rolling(14).sum()
+    df['mfi'] = 100 - (100 / (1 + positive_flow / negative_flow))
+
+    high_low = df['high'] - df['low']
+    high_close = (df['high'] - df['close'].shift(1)).abs()
+    low_close = (df['low'] - df['close'].shift(1)).abs()
+    true_range = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
+    df['atr'] = true_range.rolling(14).mean()
+
+    df['volume_ma'] = df['volume'].rolling(20).mean()
+    df['volume_ratio'] = df['volume'] / df['volume_ma']
+    return df
+
+
+def make_klines(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = np.round(100 * np.exp(np.cumsum(rng.normal(0, 0.02, n))), 2)
+    high = close * (1 + rng.uniform(0, 0.02, n))
+    low = close * (1 - rng.uniform(0, 0.02, n))
+    volume = rng.integers(1, 1000, n).astype(float)
+    index = pd.date_range('2000-01-01', periods=n, freq='D')
+    return pd.DataFrame({'open': close, 'high': high, 'low': low, 'close': close, 'volume': volume},
+                        index=index)
+
+
+def measure(fn, reps):
+    """返回 (平均耗时ms, tracemalloc内存峰值MB)"""
+    fn()
+    start = time.perf_counter()
+    for _ in range(reps):
+        fn()
+    elapsed = (time.perf_counter() - start) / reps
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed * 1e3, peak / 1e6
+
+
+def max_relative_error(expected, actual):
+    worst = 0.0
+    for col in indicators.INDICATOR_COLUMNS:
+        a = expected[col].to_numpy(float)
+        b = actual[col].to_numpy(float)
+        mask = np.isfinite(a) & np.isfinite(b)
+        if mask.any():
+            worst = max(worst, float(np.max(np.abs(a[mask] - b[mask]) / np.maximum(1, np.abs(a[mask])))))
+    return worst
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    reps = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    df = make_klines(n)
+    arrays = [df[col].to_numpy() for col in ('high', 'low', 'close', 'volume')]
+
+    print(f'bars={n}  max relative error vs pandas: '
+          f'{max_relative_error(pandas_indicators(df), indicators.with_indicators(df)):.1e}')
+    cases = (
+        ('pandas (per column)', lambda: pandas_indicators(df)),
+        ('with_indicators', lambda: indicators.with_indicators(df)),
+        ('compute_indicators', lambda: indicators.compute_indicators(*arrays)),
+        ('IndicatorFrame rsi', lambda: indicators.IndicatorFrame.from_frame(df)['rsi']),
+    )
+    baseline = None
+    print(f'{"impl":22s} {"ms":>9s} {"peak MB":>9s} {"speedup":>8s}')
+    for name, fn in cases:
+        ms, peak = measure(fn, reps)
+        baseline = baseline or ms
+        print(f'{name:22s} {ms:9.2f} {peak:9.2f} {baseline / ms:7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
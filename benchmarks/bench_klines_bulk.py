@@ -0,0 +1,67 @@
+"""
+批量K线获取基准测试：串行（max_workers=1）与并发获取的整批耗时
+
+本地启动一个模拟K线接口，每个请求固定耗时 delay 秒，通过共享 HttpClient 走完整的请求和解析流程。
+
+用法（在仓库根目录执行）：
+    python benchmarks/bench_klines_bulk.py [标的数] [接口延迟秒] [并发数]
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import http_client  # noqa: E402
+import kline_data  # noqa: E402
+
+
+class KlineHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        time.sleep(self.server.delay)
+        now = int(time.time())
+        rows = [[(now - 86400 * (200 - i)) * 1000, 10 + i, 11 + i, 9 + i, 10.5 + i, 100 + i] for i in range(200)]
+        body = json.dumps({'success': True, 'data': rows}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 24
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.1
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else kline_data.DEFAULT_MAX_WORKERS
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), KlineHandler)
+    server.daemon_threads = True
+    server.delay = delay
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_address[1]}'
+    symbols = {f'sym{i}': base + f'/kline/{i}?timestamp={{}}&end={{}}' for i in range(count)}
+    client = http_client.HttpClient(pool_size=workers, per_host_limit=workers)
+
+    try:
+        print(f'symbols={count} delay={delay * 1000:.0f}ms')
+        serial = None
+        for max_workers in (1, workers):
+            batch = kline_data.get_klines_bulk(symbols, max_workers=max_workers, client=client)
+            assert not batch.errors, batch.errors
+            serial = serial or batch.elapsed
+            print(f'max_workers={max_workers:<3d} {batch.elapsed:6.2f}s  speedup {serial / batch.elapsed:4.1f}x')
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
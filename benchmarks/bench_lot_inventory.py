@@ -0,0 +1,92 @@
+"""
+批次库存基准测试：LotInventory 与旧版逐件字典列表（locked_items）的单次操作耗时
+
+旧版每件物品一个 {'purchase_date', 'purchase_price'} 字典，查询可卖数量要逐件解析日期，
+卖出要筛选、排序后 list.remove。LotInventory 按批次存放在numpy数组中。
+每个规模计时前先用相同的操作序列与逐件FIFO列表核对结果，不一致时直接报错。
+
+用法（在仓库根目录执行）：
+    python benchmarks/bench_lot_inventory.py [批次数 ...]
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inventory import LOCK_DAYS, LotInventory  # noqa: E402
+
+NOW = datetime(2026, 10, 17)
+UNITS_PER_LOT = 3
+
+
+def per_op_us(fn, reps):
+    start = time.perf_counter()
+    for i in range(reps):
+        fn(i)
+    return (time.perf_counter() - start) / reps * 1e6
+
+
+def check_lots(n):
+    """计时前核对结果：按与计时相同的操作序列，与逐件FIFO列表的可卖数量、卖出成本和剩余批次对照"""
+    base = NOW - timedelta(days=30)
+    lots = [((base + timedelta(seconds=10 * i)).isoformat(), 10.0 + i % 7, UNITS_PER_LOT) for i in range(n)]
+    inv = LotInventory.from_lots(lots)
+    units = [(date, price) for date, price, quantity in lots for _ in range(quantity)]
+    for i in range(2000):
+        assert inv.available_quantity(NOW) == len(units)
+        date, price = units.pop(0)
+        assert inv.sell(1, NOW) == price
+        inv.add(NOW + timedelta(seconds=i), 11.0, 2)
+    # 新买入的批次尚未解锁
+    assert inv.available_quantity(NOW) == len(units)
+    assert inv.total_quantity == len(units) + 2 * 2000
+    assert abs(inv.total_cost - (sum(price for _, price in units) + 11.0 * 2 * 2000)) < 1e-6 * inv.total_cost
+
+
+def bench_lots(n, reps=2000):
+    base = NOW - timedelta(days=30)
+    lots = [((base + timedelta(seconds=10 * i)).isoformat(), 10.0 + i % 7, UNITS_PER_LOT)
+            for i in range(n)]
+    inv = LotInventory.from_lots(lots)
+    avail = per_op_us(lambda i: inv.available_quantity(NOW), reps)
+    sell = per_op_us(lambda i: inv.sell(1, NOW), reps)
+    add = per_op_us(lambda i: inv.add(NOW + timedelta(seconds=i), 11.0, 2), reps)
+    return avail, sell, add
+
+
+def bench_legacy(n, reps=20):
+    base = NOW - timedelta(days=30)
+    items = [{'purchase_date': (base + timedelta(seconds=10 * (i // UNITS_PER_LOT))).isoformat(),
+              'purchase_price': 10.0 + (i // UNITS_PER_LOT) % 7}
+             for i in range(UNITS_PER_LOT * n)]
+
+    def available(i):
+        return sum(1 for it in items
+                   if (NOW - datetime.fromisoformat(it['purchase_date'])).days >= LOCK_DAYS)
+
+    def sell(i):
+        unlocked = [it for it in items
+                    if (NOW - datetime.fromisoformat(it['purchase_date'])).days >= LOCK_DAYS]
+        unlocked.sort(key=lambda it: datetime.fromisoformat(it['purchase_date']))
+        items.remove(unlocked[0])
+
+    def add(i):
+        items.extend({'purchase_date': (NOW + timedelta(seconds=i)).isoformat(),
+                      'purchase_price': 11.0} for _ in range(2))
+
+    return per_op_us(available, reps), per_op_us(sell, reps), per_op_us(add, reps)
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [1000, 10000, 50000]
+    print(f'{"lots":>7s}  {"impl":12s} {"available us":>13s} {"sell us":>10s} {"add us":>10s}')
+    for n in sizes:
+        check_lots(n)
+        for name, result in (('LotInventory', bench_lots(n)), ('per-unit', bench_legacy(n))):
+            print(f'{n:7d}  {name:12s} {result[0]:13.1f} {result[1]:10.1f} {result[2]:10.1f}')
+
+
+if __name__ == '__main__':
+    main()
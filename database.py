@@ -1,99 +1,405 @@
 import sqlite3
 import hashlib
 import json
+import queue
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 import streamlit as st
 
+from inventory import LOCK_DAYS, LotInventory, build_inventory
+
+# 默认数据库文件
+DEFAULT_DB_PATH = "trading_platform.db"
+# 连接池保留的空闲连接数
+DEFAULT_POOL_SIZE = 8
+# 等待其他会话释放写锁的最长时间（毫秒）
+BUSY_TIMEOUT_MS = 5000
+# 每个连接缓存的预编译语句数
+STATEMENT_CACHE_SIZE = 256
+
+
+class ConnectionPool:
+    """
+    SQLite连接池（线程安全）
+
+    连接创建时一次性设置WAL、synchronous=NORMAL和busy_timeout，之后在各会话线程间复用，
+    复用的连接同时保留了sqlite3的预编译语句缓存。WAL模式下读操作不会被写操作阻塞。
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, size: int = DEFAULT_POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self.initialized = False
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    def _create(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000,
+                               check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """取出一个空闲连接，没有空闲连接时新建"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._create()
+
+    def release(self, conn: sqlite3.Connection):
+        """归还连接；未提交的事务会被回滚，超出空闲上限的连接直接关闭"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            return
+        if self._idle.qsize() < self.size:
+            self._idle.put(conn)
+        else:
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def initialize_once(self, init: Callable[[], None]):
+        """
+        对该连接池执行一次初始化（建表、迁移），并发调用时其余调用等待其完成
+
+        init抛出异常时不标记为已初始化，下次调用会重试。
+        """
+        with self._lock:
+            if not self.initialized:
+                init()
+                self.initialized = True
+
+    def close_all(self):
+        """关闭全部空闲连接"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(db_path: str = DEFAULT_DB_PATH) -> ConnectionPool:
+    """获取数据库文件对应的进程级共享连接池"""
+    with _POOLS_LOCK:
+        pool = _POOLS.get(db_path)
+        if pool is None:
+            pool = _POOLS[db_path] = ConnectionPool(db_path)
+        return pool
+
+
+def get_connection(db_path: str = DEFAULT_DB_PATH):
+    """
+    从共享连接池借用连接
+
+    用法: with get_connection() as conn: ...
+    """
+    return get_pool(db_path).connection()
+
+
+# trades表的列（与交易历史字典的键对应，trade_type 对应 'type'）
+TRADE_COLUMNS = ('trade_date', 'symbol', 'action', 'quantity', 'price', 'total',
+                 'cost', 'pnl_amount', 'pnl_percent', 'trade_type')
+_TRADE_KEYS = ('date', 'symbol', 'action', 'quantity', 'price', 'total',
+               'cost', 'pnl_amount', 'pnl_percent', 'type')
+
+
+def _trade_from_row(row) -> Dict:
+    # 买入记录没有成本和盈亏字段
+    return {key: value for key, value in zip(_TRADE_KEYS, row) if value is not None}
+
+
+def _trade_to_row(user_id: int, trade: Dict) -> tuple:
+    return (user_id,) + tuple(trade.get(key) for key in _TRADE_KEYS)
+
+
+class TradeHistory:
+    """
+    账户交易历史（按需从trades表读取）
+
+    len() 只使用加载账户时查询的计数；迭代、下标访问或导出时才读取全部记录；
+    append() 的新交易在保存账户时写入，已有记录不会被重写。
+    """
+
+    def __init__(self, db_path: str, user_id: int, count: int = 0):
+        self.db_path = db_path
+        self.user_id = user_id
+        self._count = count
+        self._rows = None
+        self.pending = []
+
+    def __len__(self):
+        return self._count + len(self.pending)
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __getitem__(self, index):
+        return self.to_list()[index]
+
+    def append(self, trade: Dict):
+        self.pending.append(trade)
+
+    def add_saved(self, trade: Dict):
+        """记录一条已由交易事务写入数据库的交易"""
+        if self._rows is not None:
+            self._rows.append(trade)
+        self._count += 1
+
+    def mark_saved(self, count: int):
+        """保存成功后将前count条待写入记录并入已保存部分"""
+        if self._rows is not None:
+            self._rows.extend(self.pending[:count])
+        self._count += count
+        self.pending = self.pending[count:]
+
+    def to_list(self) -> List[Dict]:
+        """读取全部交易历史（按成交顺序）"""
+        if self._rows is None:
+            with get_connection(self.db_path) as conn:
+                cursor = conn.execute(f'''
+                    SELECT {', '.join(TRADE_COLUMNS)} FROM trades WHERE user_id = ? ORDER BY id
+                ''', (self.user_id,))
+                self._rows = [_trade_from_row(row) for row in cursor.fetchall()]
+        return self._rows + self.pending
+
+
+def group_lots(items: List[Dict]) -> List[tuple]:
+    """
+    将旧版逐件库存（locked_items）合并为批次
+
+    Args:
+        items (list): [{'purchase_date', 'purchase_price'}, ...]，同一次买入的物品相邻
+
+    Returns:
+        list: [(purchase_date, purchase_price, quantity), ...]，保持原有顺序
+    """
+    lots = []
+    for item in items:
+        purchase_date = item['purchase_date']
+        if not isinstance(purchase_date, str):
+            purchase_date = purchase_date.isoformat()
+        key = (purchase_date, float(item['purchase_price']))
+        if lots and lots[-1][:2] == key:
+            lots[-1] = key + (lots[-1][2] + 1,)
+        else:
+            lots.append(key + (1,))
+    return lots
+
+
+def mark_dirty(account_data: Dict, symbol: str):
+    """
+    标记会话中手动修改过持仓或库存的标的，下次保存账户时只重写这些标的
+
+    交易由 execute_trade_tx 在事务内直接写库，不需要标记。
+    """
+    account_data.setdefault('dirty_symbols', set()).add(symbol)
+
+
+def _inventory_lots(inv: Dict) -> List[tuple]:
+    lots = inv.get('lots')
+    if isinstance(lots, LotInventory):
+        return lots.to_lots()
+    return group_lots(inv.get('locked_items', []))
+
+
 class DatabaseManager:
-    def __init__(self, db_path: str = "trading_platform.db"):
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
         self.db_path = db_path
-        self.init_database()
+        self.pool = get_pool(db_path)
+        # 建表和迁移每个进程只执行一次
+        self.pool.initialize_once(self.init_database)
     
     def init_database(self):
         """初始化数据库表"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        conn = self.pool.acquire()
+        try:
+            cursor = conn.cursor()
         
-        # 用户表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                display_name TEXT NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                last_login DATETIME,
-                is_active BOOLEAN DEFAULT 1
-            )
-        ''')
+            # 用户表
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT UNIQUE NOT NULL,
+                    email TEXT UNIQUE NOT NULL,
+                    password_hash TEXT NOT NULL,
+                    display_name TEXT NOT NULL,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    last_login DATETIME,
+                    is_active BOOLEAN DEFAULT 1
+                )
+            ''')
         
-        # 用户账户表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_accounts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                cash REAL NOT NULL DEFAULT 100000,
-                total_value REAL NOT NULL DEFAULT 100000,
-                positions TEXT DEFAULT '{}',
-                inventory TEXT DEFAULT '{}',
-                trade_history TEXT DEFAULT '[]',
-                max_items_per_symbol INTEGER DEFAULT 1000,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
+            # 用户账户表
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS user_accounts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    cash REAL NOT NULL DEFAULT 100000,
+                    total_value REAL NOT NULL DEFAULT 100000,
+                    positions TEXT DEFAULT '{}',
+                    inventory TEXT DEFAULT '{}',
+                    trade_history TEXT DEFAULT '[]',
+                    max_items_per_symbol INTEGER DEFAULT 1000,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
+            ''')
         
-        # 充值记录表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS recharge_records (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                amount REAL NOT NULL,
-                recharge_type TEXT NOT NULL,
-                payment_method TEXT,
-                status TEXT DEFAULT 'pending',
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                expires_at DATETIME,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
+            # 充值记录表
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS recharge_records (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    amount REAL NOT NULL,
+                    recharge_type TEXT NOT NULL,
+                    payment_method TEXT,
+                    status TEXT DEFAULT 'pending',
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    expires_at DATETIME,
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
+            ''')
         
-        # 会员状态表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS membership_status (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                membership_type TEXT NOT NULL DEFAULT 'basic',
-                start_date DATETIME,
-                end_date DATETIME,
-                is_active BOOLEAN DEFAULT 0,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
+            # 会员状态表
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS membership_status (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    membership_type TEXT NOT NULL DEFAULT 'basic',
+                    start_date DATETIME,
+                    end_date DATETIME,
+                    is_active BOOLEAN DEFAULT 0,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
+            ''')
+        
+            # 持仓表（每个用户每个标的一行）
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS positions (
+                    user_id INTEGER NOT NULL,
+                    symbol TEXT NOT NULL,
+                    quantity INTEGER NOT NULL,
+                    avg_price REAL NOT NULL,
+                    PRIMARY KEY (user_id, symbol),
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
+            ''')
+        
+            # 库存批次表（同一次买入的物品合并为一行）
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS inventory_lots (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    symbol TEXT NOT NULL,
+                    purchase_date TEXT NOT NULL,
+                    purchase_price REAL NOT NULL,
+                    quantity INTEGER NOT NULL,
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_inventory_lots_user_symbol
+                ON inventory_lots (user_id, symbol)
+            ''')
+        
+            # 交易记录表（账户交易历史和交易统计共用）。
+            # 旧版的trade_records表与user_accounts.trade_history重复记录了同样的交易，
+            # 后者已迁移到本表，trade_records不再读写
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS trades (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    trade_date TEXT NOT NULL,
+                    symbol TEXT NOT NULL,
+                    action TEXT NOT NULL,
+                    quantity INTEGER NOT NULL,
+                    price REAL NOT NULL,
+                    total REAL NOT NULL,
+                    cost REAL,
+                    pnl_amount REAL,
+                    pnl_percent REAL,
+                    trade_type TEXT,
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_trades_user_symbol
+                ON trades (user_id, symbol)
+            ''')
         
-        # 交易记录表
+            # 将旧版JSON字段中的数据迁移到上面的表
+            self.migrate_json_accounts(cursor)
+        
+            conn.commit()
+        finally:
+            # 出错时release会回滚未提交的建表和迁移
+            self.pool.release(conn)
+    
+    def migrate_json_accounts(self, cursor):
+        """
+        迁移user_accounts中JSON格式的positions/inventory/trade_history
+        
+        每个账户在同一事务中写入新表并清空JSON字段，重复执行不会重复迁移。
+        """
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS trade_records (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                symbol TEXT NOT NULL,
-                action TEXT NOT NULL,
-                quantity INTEGER NOT NULL,
-                price REAL NOT NULL,
-                total_amount REAL NOT NULL,
-                pnl_amount REAL DEFAULT 0,
-                pnl_percent REAL DEFAULT 0,
-                trade_date DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
+            SELECT user_id, positions, inventory, trade_history FROM user_accounts
+            WHERE positions NOT IN ('{}', '') OR inventory NOT IN ('{}', '') OR trade_history NOT IN ('[]', '')
         ''')
+        accounts = cursor.fetchall()
+        now = datetime.now()
         
-        conn.commit()
-        conn.close()
+        for user_id, positions_json, inventory_json, trades_json in accounts:
+            try:
+                positions = json.loads(positions_json) if positions_json else {}
+                inventory = json.loads(inventory_json) if inventory_json else {}
+                trade_history = json.loads(trades_json) if trades_json else []
+            except (TypeError, ValueError):
+                continue
+            
+            cursor.executemany('''
+                INSERT OR REPLACE INTO positions (user_id, symbol, quantity, avg_price) VALUES (?, ?, ?, ?)
+            ''', [(user_id, symbol, position['quantity'], position['avg_price'])
+                  for symbol, position in positions.items() if position.get('quantity', 0) > 0])
+            
+            for symbol, inv in inventory.items():
+                lots = group_lots(inv.get('locked_items', []))
+                # 旧版在物品解锁后会将其移出locked_items，这部分按持仓均价补为已解锁批次
+                missing = inv.get('total_quantity', 0) - sum(lot[2] for lot in lots)
+                if missing > 0:
+                    avg_price = positions.get(symbol, {}).get('avg_price', 0.0)
+                    unlocked_date = (now - timedelta(days=LOCK_DAYS)).isoformat()
+                    lots.insert(0, (unlocked_date, float(avg_price), missing))
+                cursor.executemany('''
+                    INSERT INTO inventory_lots (user_id, symbol, purchase_date, purchase_price, quantity)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', [(user_id, symbol) + lot for lot in lots])
+            
+            cursor.executemany(f'''
+                INSERT INTO trades (user_id, {', '.join(TRADE_COLUMNS)}) VALUES ({', '.join('?' * (len(TRADE_COLUMNS) + 1))})
+            ''', [_trade_to_row(user_id, trade) for trade in trade_history])
+            
+            cursor.execute('''
+                UPDATE user_accounts SET positions = '{}', inventory = '{}', trade_history = '[]' WHERE user_id = ?
+            ''', (user_id,))
     
     def hash_password(self, password: str) -> str:
         """密码哈希"""
@@ -101,7 +407,7 @@ class DatabaseManager:
     
     def register_user(self, username: str, email: str, password: str, display_name: str) -> Tuple[bool, str]:
         """用户注册"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
         
         try:
@@ -138,11 +444,11 @@ class DatabaseManager:
             conn.rollback()
             return False, f"注册失败: {str(e)}"
         finally:
-            conn.close()
+            self.pool.release(conn)
     
     def login_user(self, username: str, password: str) -> Tuple[bool, Optional[Dict]]:
         """用户登录"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
         
         try:
@@ -177,16 +483,16 @@ class DatabaseManager:
         except Exception as e:
             return False, None
         finally:
-            conn.close()
+            self.pool.release(conn)
     
     def get_user_account(self, user_id: int) -> Optional[Dict]:
         """获取用户账户信息"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
         
         try:
             cursor.execute('''
-                SELECT cash, total_value, positions, inventory, trade_history, max_items_per_symbol
+                SELECT cash, total_value, max_items_per_symbol
                 FROM user_accounts WHERE user_id = ?
             ''', (user_id,))
             
@@ -194,81 +500,320 @@ class DatabaseManager:
             if not account:
                 return None
             
+            cursor.execute('''
+                SELECT symbol, quantity, avg_price FROM positions WHERE user_id = ?
+            ''', (user_id,))
+            positions = {
+                symbol: {'quantity': quantity, 'avg_price': avg_price}
+                for symbol, quantity, avg_price in cursor.fetchall()
+            }
+            
+            inventory = {}
+            for symbol, lots in self._load_lots(cursor, user_id).items():
+                inventory[symbol] = build_inventory(lots)
+            
+            cursor.execute('SELECT COUNT(*) FROM trades WHERE user_id = ?', (user_id,))
+            trade_count = cursor.fetchone()[0]
+            
             return {
                 'cash': account[0],
                 'total_value': account[1],
-                'positions': json.loads(account[2]) if account[2] else {},
-                'inventory': json.loads(account[3]) if account[3] else {},
-                'trade_history': json.loads(account[4]) if account[4] else [],
-                'max_items_per_symbol': account[5]
+                'positions': positions,
+                'inventory': inventory,
+                'trade_history': TradeHistory(self.db_path, user_id, trade_count),
+                'max_items_per_symbol': account[2],
+                'dirty_symbols': set()
             }
             
         except Exception as e:
             return None
         finally:
-            conn.close()
+            self.pool.release(conn)
+    
+    def _load_lots(self, cursor, user_id: int) -> Dict[str, List[tuple]]:
+        """读取用户全部库存批次：symbol -> [(purchase_date, purchase_price, quantity), ...]"""
+        cursor.execute('''
+            SELECT symbol, purchase_date, purchase_price, quantity
+            FROM inventory_lots WHERE user_id = ? ORDER BY id
+        ''', (user_id,))
+        lots = {}
+        for symbol, purchase_date, purchase_price, quantity in cursor.fetchall():
+            lots.setdefault(symbol, []).append((purchase_date, purchase_price, quantity))
+        return lots
     
     def save_user_account(self, user_id: int, account_data: Dict) -> bool:
-        conn = sqlite3.connect(self.db_path)
+        """
+        保存用户账户（只写入总资产、mark_dirty 标记过的持仓和库存批次，以及新增的交易）
+
+        现金只在账户不存在时随新账户写入，之后只由 execute_trade_tx 修改，
+        其他会话中过期的账户副本保存时不会覆盖已提交的交易。
+        """
+        conn = self.pool.acquire()
         cursor = conn.cursor()
+        trade_history = account_data.get('trade_history', [])
+        dirty = set(account_data.get('dirty_symbols', ()))
         try:
             cursor.execute('''
                 UPDATE user_accounts 
-                SET cash = ?, total_value = ?, positions = ?, inventory = ?, 
-                    trade_history = ?, updated_at = CURRENT_TIMESTAMP
+                SET total_value = ?, updated_at = CURRENT_TIMESTAMP
                 WHERE user_id = ?
-            ''', (
-                account_data['cash'],
-                account_data['total_value'],
-                json.dumps(account_data['positions']),
-                json.dumps(account_data['inventory']),
-                json.dumps(account_data['trade_history']),
-                user_id
-            ))
+            ''', (account_data['total_value'], user_id))
             
             if cursor.rowcount == 0:
                 cursor.execute('''
-                    INSERT INTO user_accounts (user_id, cash, total_value, positions, inventory, trade_history, max_items_per_symbol)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    INSERT INTO user_accounts (user_id, cash, total_value, max_items_per_symbol)
+                    VALUES (?, ?, ?, ?)
                 ''', (
                     user_id,
                     account_data['cash'],
                     account_data['total_value'],
-                    json.dumps(account_data['positions']),
-                    json.dumps(account_data['inventory']),
-                    json.dumps(account_data['trade_history']),
                     account_data.get('max_items_per_symbol', 1000)
                 ))
+            
+            self._sync_positions(cursor, user_id, account_data.get('positions', {}), dirty)
+            self._sync_inventory(cursor, user_id, account_data.get('inventory', {}), dirty)
+            # 交易由 execute_trade_tx 写入；这里只写入通过 TradeHistory.append 添加的待保存交易
+            new_trades = list(trade_history.pending) if isinstance(trade_history, TradeHistory) else []
+            cursor.executemany(f'''
+                INSERT INTO trades (user_id, {', '.join(TRADE_COLUMNS)}) VALUES ({', '.join('?' * (len(TRADE_COLUMNS) + 1))})
+            ''', [_trade_to_row(user_id, trade) for trade in new_trades])
+            
             conn.commit()
+            if isinstance(trade_history, TradeHistory):
+                trade_history.mark_saved(len(new_trades))
+            account_data.get('dirty_symbols', set()).difference_update(dirty)
             return True
         except Exception as e:
             conn.rollback()
             return False
         finally:
-            # 确保连接正确关闭
-            if conn:
-                conn.close()
+            self.pool.release(conn)
     
-    def add_trade_record(self, user_id: int, trade_data: Dict) -> bool:
-        """添加交易记录"""
-        conn = sqlite3.connect(self.db_path)
+    def update_total_value(self, user_id: int, total_value: float) -> bool:
+        """只更新账户总资产（行情刷新时使用）"""
+        conn = self.pool.acquire()
+        try:
+            conn.execute('''
+                UPDATE user_accounts SET total_value = ?, updated_at = CURRENT_TIMESTAMP WHERE user_id = ?
+            ''', (total_value, user_id))
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            return False
+        finally:
+            self.pool.release(conn)
+    
+    def _sync_positions(self, cursor, user_id: int, positions: Dict, symbols):
+        """重写symbols中各标的的持仓，已清仓的标的删除"""
+        current = {
+            symbol: (positions[symbol]['quantity'], positions[symbol]['avg_price'])
+            for symbol in symbols if positions.get(symbol, {}).get('quantity', 0) > 0
+        }
+        cursor.executemany('''
+            INSERT OR REPLACE INTO positions (user_id, symbol, quantity, avg_price) VALUES (?, ?, ?, ?)
+        ''', [(user_id, symbol) + values for symbol, values in current.items()])
+        cursor.executemany('''
+            DELETE FROM positions WHERE user_id = ? AND symbol = ?
+        ''', [(user_id, symbol) for symbol in symbols if symbol not in current])
+    
+    def _sync_inventory(self, cursor, user_id: int, inventory: Dict, symbols):
+        """重写symbols中各标的的库存批次"""
+        cursor.executemany('''
+            DELETE FROM inventory_lots WHERE user_id = ? AND symbol = ?
+        ''', [(user_id, symbol) for symbol in symbols])
+        cursor.executemany('''
+            INSERT INTO inventory_lots (user_id, symbol, purchase_date, purchase_price, quantity)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(user_id, symbol) + lot for symbol in symbols if symbol in inventory
+                for lot in _inventory_lots(inventory[symbol])])
+    
+    def execute_trade_tx(self, user_id: int, portfolio: Dict, symbol: str, action: str, quantity: int,
+                         price: float, prices: Optional[Dict[str, float]] = None,
+                         now: Optional[datetime] = None) -> Tuple[bool, str, Dict]:
+        """
+        在一个事务中执行交易：更新现金、持仓和库存批次，写入交易记录
+        
+        校验以数据库中的账户为准并在写锁内完成，同一账户并发或重复提交的交易会按顺序执行，
+        不会超卖或透支。成功后直接更新并返回内存中的portfolio，无需重新加载账户。
+        事务内不获取行情，估值用的价格需在调用前取好快照传入。
+        
+        Args:
+            portfolio (dict): 会话中的账户数据，成功时原地更新
+            prices (dict): symbol -> 当前价格快照，用于计算总资产；缺失的标的按持仓均价计算
+            now (datetime): 成交时间，默认为当前时间
+        
+        Returns:
+            tuple: (是否成功, 提示信息, portfolio)
+        """
+        now = now or datetime.now()
+        prices = prices or {}
+        conn = self.pool.acquire()
         cursor = conn.cursor()
         
         try:
+            # 立即获取写锁，并发的交易在这里排队
+            cursor.execute('BEGIN IMMEDIATE')
             cursor.execute('''
-                INSERT INTO trade_records 
-                (user_id, symbol, action, quantity, price, total_amount, pnl_amount, pnl_percent)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                user_id,
-                trade_data['symbol'],
-                trade_data['action'],
-                trade_data['quantity'],
-                trade_data['price'],
-                trade_data['total'],
-                trade_data.get('pnl_amount', 0),
-                trade_data.get('pnl_percent', 0)
-            ))
+                SELECT cash, max_items_per_symbol FROM user_accounts WHERE user_id = ?
+            ''', (user_id,))
+            account = cursor.fetchone()
+            if not account:
+                conn.rollback()
+                return False, "账户不存在", portfolio
+            cash, max_items = account
+            
+            cursor.execute('SELECT symbol, quantity, avg_price FROM positions WHERE user_id = ?', (user_id,))
+            positions = {row[0]: {'quantity': row[1], 'avg_price': row[2]} for row in cursor.fetchall()}
+            lot_rows = self._load_symbol_lots(cursor, user_id, symbol)
+            lots = LotInventory.from_lots([row[1:] for row in lot_rows])
+            
+            total = quantity * price
+            if action == "买入":
+                current_total = lots.total_quantity
+                if current_total + quantity > max_items:
+                    conn.rollback()
+                    return False, f"超出库存限制！当前持有 {current_total} 个，最多可持有 {max_items} 个", portfolio
+                if cash < total:
+                    conn.rollback()
+                    return False, f"资金不足，需要 ¥{total:.2f}，可用资金 ¥{cash:.2f}", portfolio
+                
+                cash -= total
+                position = positions.get(symbol)
+                if position:
+                    new_qty = position['quantity'] + quantity
+                    position['avg_price'] = (position['quantity'] * position['avg_price'] + total) / new_qty
+                    position['quantity'] = new_qty
+                else:
+                    positions[symbol] = {'quantity': quantity, 'avg_price': price}
+                
+                lots.add(now, price, quantity)
+                cursor.execute('''
+                    INSERT INTO inventory_lots (user_id, symbol, purchase_date, purchase_price, quantity)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (user_id, symbol, now.isoformat(), float(price), quantity))
+                
+                trade = {
+                    'date': now.isoformat(),
+                    'symbol': symbol,
+                    'action': action,
+                    'quantity': quantity,
+                    'price': price,
+                    'total': total,
+                    'type': '买入'
+                }
+            elif action == "卖出":
+                if not lot_rows:
+                    conn.rollback()
+                    return False, f"未持有 {symbol}", portfolio
+                available_qty = lots.available_quantity(now)
+                if available_qty < quantity:
+                    locked_qty = lots.total_quantity - available_qty
+                    conn.rollback()
+                    return False, f"可卖数量不足！可卖: {available_qty} 个，锁定中: {locked_qty} 个（需等待7天）", portfolio
+                
+                cash += total
+                total_cost = lots.sell(quantity, now)
+                self._consume_lots(cursor, lot_rows, lots)
+                
+                position = positions.get(symbol, {'quantity': quantity, 'avg_price': 0.0})
+                position['quantity'] -= quantity
+                if position['quantity'] <= 0:
+                    positions.pop(symbol, None)
+                
+                pnl_amount = total - total_cost
+                trade = {
+                    'date': now.isoformat(),
+                    'symbol': symbol,
+                    'action': action,
+                    'quantity': quantity,
+                    'price': price,
+                    'total': total,
+                    'cost': total_cost,
+                    'pnl_amount': pnl_amount,
+                    'pnl_percent': (pnl_amount / total_cost) * 100 if total_cost > 0 else 0,
+                    'type': '卖出'
+                }
+            else:
+                conn.rollback()
+                return False, "未知交易类型", portfolio
+            
+            if symbol in positions:
+                cursor.execute('''
+                    INSERT OR REPLACE INTO positions (user_id, symbol, quantity, avg_price) VALUES (?, ?, ?, ?)
+                ''', (user_id, symbol, positions[symbol]['quantity'], positions[symbol]['avg_price']))
+            else:
+                cursor.execute('DELETE FROM positions WHERE user_id = ? AND symbol = ?', (user_id, symbol))
+            
+            total_value = cash + sum(
+                position['quantity'] * prices.get(sym, position['avg_price'])
+                for sym, position in positions.items()
+            )
+            cursor.execute('''
+                UPDATE user_accounts SET cash = ?, total_value = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE user_id = ?
+            ''', (cash, total_value, user_id))
+            
+            cursor.execute(f'''
+                INSERT INTO trades (user_id, {', '.join(TRADE_COLUMNS)}) VALUES ({', '.join('?' * (len(TRADE_COLUMNS) + 1))})
+            ''', _trade_to_row(user_id, trade))
+            trade_history = portfolio.get('trade_history')
+            if not isinstance(trade_history, TradeHistory):
+                cursor.execute('SELECT COUNT(*) FROM trades WHERE user_id = ?', (user_id,))
+                trade_count = cursor.fetchone()[0]
+            
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            return False, f"交易失败: {str(e)}", portfolio
+        finally:
+            self.pool.release(conn)
+        
+        # 用提交后的状态更新内存中的账户
+        portfolio['cash'] = cash
+        portfolio['total_value'] = total_value
+        portfolio['positions'] = positions
+        if lots.total_quantity > 0:
+            portfolio['inventory'][symbol] = build_inventory(lots, now)
+        else:
+            portfolio['inventory'].pop(symbol, None)
+        # 该标的已按数据库状态更新，之前的手动修改不再需要保存
+        portfolio.get('dirty_symbols', set()).discard(symbol)
+        if isinstance(trade_history, TradeHistory):
+            trade_history.add_saved(trade)
+        else:
+            # 普通列表无法区分哪些交易已写入数据库，换成按需读取的交易历史
+            portfolio['trade_history'] = TradeHistory(self.db_path, user_id, trade_count)
+        return True, "交易成功", portfolio
+    
+    def _load_symbol_lots(self, cursor, user_id: int, symbol: str) -> List[tuple]:
+        """读取单个标的的库存批次：[(id, purchase_date, purchase_price, quantity), ...]，按FIFO顺序"""
+        cursor.execute('''
+            SELECT id, purchase_date, purchase_price, quantity
+            FROM inventory_lots WHERE user_id = ? AND symbol = ? AND quantity > 0 ORDER BY id
+        ''', (user_id, symbol))
+        # 与 LotInventory.from_lots 相同的顺序（按买入时间稳定排序）
+        return sorted(cursor.fetchall(), key=lambda row: datetime.fromisoformat(row[1]))
+    
+    def _consume_lots(self, cursor, lot_rows: List[tuple], lots: LotInventory):
+        """FIFO卖出后：删除已卖空的批次行，更新被部分卖出的队首批次"""
+        remaining = lots.to_lots()
+        removed = len(lot_rows) - len(remaining)
+        cursor.executemany('DELETE FROM inventory_lots WHERE id = ?', [(row[0],) for row in lot_rows[:removed]])
+        if remaining and remaining[0][2] != lot_rows[removed][3]:
+            cursor.execute('UPDATE inventory_lots SET quantity = ? WHERE id = ?', (remaining[0][2], lot_rows[removed][0]))
+    
+    def add_trade_record(self, user_id: int, trade_data: Dict) -> bool:
+        """添加交易记录（trade_data 的键与交易历史相同，缺少date时使用当前时间）"""
+        conn = self.pool.acquire()
+        cursor = conn.cursor()
+        
+        try:
+            trade = dict(trade_data)
+            trade.setdefault('date', datetime.now().isoformat())
+            cursor.execute(f'''
+                INSERT INTO trades (user_id, {', '.join(TRADE_COLUMNS)}) VALUES ({', '.join('?' * (len(TRADE_COLUMNS) + 1))})
+            ''', _trade_to_row(user_id, trade))
             
             conn.commit()
             return True
@@ -277,11 +822,11 @@ class DatabaseManager:
             conn.rollback()
             return False
         finally:
-            conn.close()
+            self.pool.release(conn)
     
     def get_membership_status(self, user_id: int) -> Dict:
         """获取用户会员状态"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
         
         try:
@@ -339,11 +884,11 @@ class DatabaseManager:
                 'days_remaining': 0
             }
         finally:
-            conn.close()
+            self.pool.release(conn)
     
     def create_recharge_record(self, user_id: int, amount: float, recharge_type: str) -> Tuple[bool, str]:
         """创建充值记录"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
         
         try:
@@ -365,11 +910,11 @@ class DatabaseManager:
             conn.rollback()
             return False, f"创建充值订单失败: {str(e)}"
         finally:
-            conn.close()
+            self.pool.release(conn)
     
     def process_recharge(self, user_id: int, record_id: int) -> Tuple[bool, str]:
         """处理充值（模拟支付成功）"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
         
         try:
@@ -428,11 +973,11 @@ class DatabaseManager:
             conn.rollback()
             return False, f"充值处理失败: {str(e)}"
         finally:
-            conn.close()
+            self.pool.release(conn)
     
     def get_user_recharge_history(self, user_id: int) -> List[Dict]:
         """获取用户充值历史"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
         
         try:
@@ -459,11 +1004,11 @@ class DatabaseManager:
         except Exception as e:
             return []
         finally:
-            conn.close()
+            self.pool.release(conn)
     
     def get_user_stats(self, user_id: int) -> Dict:
         """获取用户统计信息"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
         
         try:
@@ -474,7 +1019,7 @@ class DatabaseManager:
                        SUM(CASE WHEN action = '卖出' THEN 1 ELSE 0 END) as sell_trades,
                        SUM(CASE WHEN action = '卖出' AND pnl_amount > 0 THEN 1 ELSE 0 END) as profitable_trades,
                        SUM(CASE WHEN action = '卖出' THEN pnl_amount ELSE 0 END) as total_pnl
-                FROM trade_records 
+                FROM trades 
                 WHERE user_id = ?
             ''', (user_id,))
             
@@ -506,4 +1051,4 @@ class DatabaseManager:
                 'win_rate': 0
             }
         finally:
-            conn.close()
\ No newline at end of file
+            self.pool.release(conn)
\ No newline at end of file
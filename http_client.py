@@ -0,0 +1,170 @@
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 每个主机保留的长连接数
+DEFAULT_POOL_SIZE = 8
+# 同一主机同时进行中的请求上限
+DEFAULT_PER_HOST_LIMIT = 8
+# 默认超时（秒）
+DEFAULT_TIMEOUT = 15
+# 默认重试次数（不含首次请求）
+DEFAULT_MAX_RETRIES = 2
+# 退避时间：第n次重试前等待 base * 2**n 秒（加抖动），不超过 max_delay
+DEFAULT_BACKOFF_BASE = 1.0
+DEFAULT_BACKOFF_MAX = 10.0
+# 需要重试的HTTP状态码
+RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+
+
+class RetryPolicy:
+    """
+    指数退避重试策略
+
+    第n次重试前等待 min(max_delay, base * 2**n) 秒；开启抖动时实际等待时间在其 [50%, 100%] 之间随机，
+    避免多个线程或进程在同一时刻集中重试。
+    """
+
+    def __init__(self, max_retries=DEFAULT_MAX_RETRIES, base=DEFAULT_BACKOFF_BASE,
+                 max_delay=DEFAULT_BACKOFF_MAX, jitter=True):
+        self.max_retries = max_retries
+        self.base = base
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def delay(self, retry):
+        """第retry次重试（从0开始）前的等待时间（秒）"""
+        delay = min(self.max_delay, self.base * (2 ** retry))
+        return random.uniform(delay / 2, delay) if self.jitter else delay
+
+    def sleep(self, retry):
+        time.sleep(self.delay(retry))
+
+
+class TokenBucket:
+    """
+    令牌桶限速器（线程安全）
+
+    令牌按 rate 个/秒匀速补充，最多积累 capacity 个；每次请求消耗一个令牌，没有令牌时阻塞等待。
+    长时间内的请求速率不超过 rate，capacity 决定允许的瞬时突发量。
+    """
+
+    def __init__(self, rate, capacity=1):
+        """
+        Args:
+            rate (float): 每秒补充的令牌数（请求数/秒）
+            capacity (float): 桶容量（允许的突发请求数）
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """取出令牌，不足时等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class HttpClient:
+    """
+    共享HTTP客户端
+
+    所有上游请求共用一个带连接池的 requests.Session（保持长连接，避免每次请求重新握手），
+    统一声明gzip压缩、超时和重试策略，并限制同一主机同时进行中的请求数。
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, per_host_limit=DEFAULT_PER_HOST_LIMIT,
+                 timeout=DEFAULT_TIMEOUT, retry=None):
+        """
+        Args:
+            pool_size (int): 每个主机的连接池大小
+            per_host_limit (int): 同一主机同时进行中的请求上限
+            timeout (float): 默认超时（秒）
+            retry (RetryPolicy): 重试策略，默认为 RetryPolicy()
+        """
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()
+        self.per_host_limit = per_host_limit
+        self._host_limits = {}
+        self._lock = threading.Lock()
+
+    def _host_limit(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            limit = self._host_limits.get(host)
+            if limit is None:
+                limit = self._host_limits[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return limit
+
+    def request(self, method, url, retries=None, limiter=None, **kwargs):
+        """
+        发送请求；超时、连接错误和 RETRY_STATUS 中的状态码按重试策略退避后重试
+
+        Args:
+            retries (int): 本次请求的重试次数，默认使用重试策略的 max_retries
+            limiter (TokenBucket): 限速器，每次发出请求（包括重试）前取一个令牌
+            **kwargs: 传给 requests.Session.request 的参数
+
+        Returns:
+            requests.Response: 重试用尽后返回最后一次的响应；网络错误在重试用尽后抛出
+        """
+        retries = self.retry.max_retries if retries is None else retries
+        kwargs.setdefault('timeout', self.timeout)
+        limit = self._host_limit(url)
+
+        for attempt in range(retries + 1):
+            if limiter is not None:
+                limiter.acquire()
+            try:
+                # 只在请求进行期间占用主机配额，退避等待时释放
+                with limit:
+                    response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+                if attempt == retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUS or attempt == retries:
+                    return response
+                response.close()
+            self.retry.sleep(attempt)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    获取进程内共享的HTTP客户端
+
+    Returns:
+        HttpClient: 共享客户端
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HttpClient()
+    return _client
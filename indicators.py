@@ -0,0 +1,1056 @@
+import math
+import threading
+import zlib
+from collections import OrderedDict, deque
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+NaN = float('nan')
+
+# calculate_technical_indicators 输出的指标列（顺序一致）
+INDICATOR_COLUMNS = (
+    'ma5', 'ma10', 'ma20', 'ma30', 'ma60',
+    'ema12', 'ema26',
+    'rsi',
+    'macd', 'macd_signal', 'macd_histogram',
+    'bb_middle', 'bb_upper', 'bb_lower', 'bb_position',
+    'k', 'd', 'j',
+    'obv',
+    'mfi',
+    'atr',
+    'volume_ma', 'volume_ratio',
+)
+MA_WINDOWS = (5, 10, 20, 30, 60)
+# 指标列在输出矩阵中的行号
+COLUMN_INDEX = {name: i for i, name in enumerate(INDICATOR_COLUMNS)}
+# 批量计算EMA时的分块长度
+EWM_BLOCK = 16
+# 指标算法或指标列变化时递增，使缓存中按旧版本计算的结果失效
+INDICATOR_VERSION = 1
+# 指标缓存的最大条目数（每个条目是一个完整的K线+指标DataFrame）
+DEFAULT_INDICATOR_CACHE_SIZE = 64
+
+
+def _div(a, b):
+    """与pandas/NumPy相同的除法语义：除以0得到±inf，0/0得到NaN"""
+    if b == 0:
+        if a == 0 or a != a:
+            return NaN
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+    return a / b
+
+
+class _RollingSum:
+    """
+    滑动窗口求和/均值（与 pandas rolling().sum()/mean() 的增量算法一致）
+
+    使用Kahan补偿求和；窗口内全部为同一个值时直接返回该值，避免浮点残差。
+    """
+
+    def __init__(self, window, mean=True):
+        self.window = window
+        self.mean = mean
+        self.values = deque()
+        self.nobs = 0
+        self.neg_ct = 0
+        self.sum_x = 0.0
+        self.comp_add = 0.0
+        self.comp_remove = 0.0
+        self.same_count = 0
+        self.prev_value = None
+
+    def clone(self):
+        other = _RollingSum.__new__(_RollingSum)
+        other.__dict__.update(self.__dict__)
+        other.values = deque(self.values)
+        return other
+
+    def push(self, val):
+        self.values.append(val)
+        if len(self.values) > self.window:
+            old = self.values.popleft()
+            if old == old:
+                self.nobs -= 1
+                y = -old - self.comp_remove
+                t = self.sum_x + y
+                self.comp_remove = t - self.sum_x - y
+                self.sum_x = t
+                if math.copysign(1.0, old) < 0:
+                    self.neg_ct -= 1
+        if val == val:
+            self.nobs += 1
+            y = val - self.comp_add
+            t = self.sum_x + y
+            self.comp_add = t - self.sum_x - y
+            self.sum_x = t
+            if math.copysign(1.0, val) < 0:
+                self.neg_ct += 1
+            self.same_count = self.same_count + 1 if val == self.prev_value else 1
+            self.prev_value = val
+
+        if self.nobs < self.window:
+            return NaN
+        if not self.mean:
+            return self.prev_value * self.nobs if self.same_count >= self.nobs else self.sum_x
+        if self.same_count >= self.nobs:
+            return self.prev_value
+        result = self.sum_x / self.nobs
+        if self.neg_ct == 0 and result < 0:
+            return 0.0
+        if self.neg_ct == self.nobs and result > 0:
+            return 0.0
+        return result
+
+
+class _RollingStd:
+    """滑动窗口样本标准差（与 pandas rolling().std() 的Welford增量算法一致）"""
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.nobs = 0
+        self.mean_x = 0.0
+        self.ssqdm_x = 0.0
+        self.comp_add = 0.0
+        self.comp_remove = 0.0
+        self.same_count = 0
+        self.prev_value = None
+
+    def clone(self):
+        other = _RollingStd.__new__(_RollingStd)
+        other.__dict__.update(self.__dict__)
+        other.values = deque(self.values)
+        return other
+
+    def push(self, val):
+        self.values.append(val)
+        if len(self.values) > self.window:
+            old = self.values.popleft()
+            if old == old:
+                self.nobs -= 1
+                if self.nobs:
+                    prev_mean = self.mean_x - self.comp_remove
+                    y = old - self.comp_remove
+                    t = y - self.mean_x
+                    self.comp_remove = t + self.mean_x - y
+                    self.mean_x = self.mean_x - t / self.nobs
+                    self.ssqdm_x = self.ssqdm_x - (old - prev_mean) * (old - self.mean_x)
+                else:
+                    self.mean_x = 0.0
+                    self.ssqdm_x = 0.0
+        if val == val:
+            self.nobs += 1
+            self.same_count = self.same_count + 1 if val == self.prev_value else 1
+            self.prev_value = val
+            prev_mean = self.mean_x - self.comp_add
+            y = val - self.comp_add
+            t = y - self.mean_x
+            self.comp_add = t + self.mean_x - y
+            self.mean_x = self.mean_x + t / self.nobs
+            self.ssqdm_x = self.ssqdm_x + (val - prev_mean) * (val - self.mean_x)
+
+        if self.nobs < self.window or self.nobs <= 1:
+            return NaN
+        if self.same_count >= self.nobs:
+            return 0.0
+        return math.sqrt(max(self.ssqdm_x / (self.nobs - 1), 0.0))
+
+
+class _RollingExtreme:
+    """滑动窗口最大/最小值（单调队列，每次更新均摊O(1)）"""
+
+    def __init__(self, window, is_max):
+        self.window = window
+        self.is_max = is_max
+        self.index = 0
+        self.nobs = deque()
+        # (位置, 值)，值单调递减（最大值）或递增（最小值）
+        self.candidates = deque()
+
+    def clone(self):
+        other = _RollingExtreme.__new__(_RollingExtreme)
+        other.__dict__.update(self.__dict__)
+        other.nobs = deque(self.nobs)
+        other.candidates = deque(self.candidates)
+        return other
+
+    def push(self, val):
+        index = self.index
+        self.index += 1
+        start = index - self.window + 1
+        while self.nobs and self.nobs[0] < start:
+            self.nobs.popleft()
+        while self.candidates and self.candidates[0][0] < start:
+            self.candidates.popleft()
+        if val == val:
+            self.nobs.append(index)
+            if self.is_max:
+                while self.candidates and self.candidates[-1][1] <= val:
+                    self.candidates.pop()
+            else:
+                while self.candidates and self.candidates[-1][1] >= val:
+                    self.candidates.pop()
+            self.candidates.append((index, val))
+        if len(self.nobs) < self.window:
+            return NaN
+        return self.candidates[0][1]
+
+
+class _Ewm:
+    """指数加权均值（与 pandas ewm(adjust=True).mean() 的递推一致）"""
+
+    def __init__(self, com):
+        alpha = 1.0 / (1.0 + com)
+        self.old_wt_factor = 1.0 - alpha
+        self.weighted = None
+        self.old_wt = 1.0
+
+    def clone(self):
+        other = _Ewm.__new__(_Ewm)
+        other.__dict__.update(self.__dict__)
+        return other
+
+    def push(self, cur):
+        weighted = self.weighted
+        if weighted is None:
+            self.weighted = cur
+            return cur
+        if weighted == weighted:
+            self.old_wt *= self.old_wt_factor
+            if cur == cur:
+                if weighted != cur:
+                    weighted = self.old_wt * weighted + cur
+                    weighted /= (self.old_wt + 1.0)
+                self.old_wt += 1.0
+        elif cur == cur:
+            weighted = cur
+        self.weighted = weighted
+        return weighted
+
+
+def _span_to_com(span):
+    return (span - 1) / 2.0
+
+
+class StreamingIndicators:
+    """
+    单个标的的增量技术指标
+
+    保存各指标的滑动和、EMA递推值和最大/最小值单调队列，每追加一根K线只做常数次更新，
+    输出与 calculate_technical_indicators 对同一序列批量计算的最后一行一致。
+    """
+
+    def __init__(self):
+        self._ma = {window: _RollingSum(window) for window in MA_WINDOWS}
+        self._ema12 = _Ewm(_span_to_com(12))
+        self._ema26 = _Ewm(_span_to_com(26))
+        self._macd_signal = _Ewm(_span_to_com(9))
+        self._gain = _RollingSum(14)
+        self._loss = _RollingSum(14)
+        self._bb_std = _RollingStd(20)
+        self._low_min = _RollingExtreme(9, is_max=False)
+        self._high_max = _RollingExtreme(9, is_max=True)
+        self._k = _Ewm(2)
+        self._d = _Ewm(2)
+        self._positive_flow = _RollingSum(14, mean=False)
+        self._negative_flow = _RollingSum(14, mean=False)
+        self._atr = _RollingSum(14)
+        self._volume_ma = _RollingSum(20)
+        self._obv = 0.0
+        self._prev_close = NaN
+        self._prev_typical = NaN
+        self.count = 0
+        # 追加最后一根K线之前的状态，用于替换盘中更新的最后一根K线
+        self._checkpoint = None
+        self.last = None
+
+    def _clone(self):
+        other = StreamingIndicators.__new__(StreamingIndicators)
+        for name, value in self.__dict__.items():
+            if name == '_ma':
+                value = {window: ma.clone() for window, ma in value.items()}
+            elif hasattr(value, 'clone'):
+                value = value.clone()
+            other.__dict__[name] = value
+        other._checkpoint = None
+        return other
+
+    def append(self, high, low, close, volume, checkpoint=True):
+        """
+        追加一根K线
+
+        Args:
+            checkpoint (bool): 是否保存追加前的状态，之后可用 replace_last 替换这根K线；
+                批量预热历史K线时可关闭
+
+        Returns:
+            dict: 该K线的全部指标值（列名同 INDICATOR_COLUMNS）
+        """
+        self._checkpoint = self._clone() if checkpoint else None
+        prev_close = self._prev_close
+        values = {f'ma{window}': ma.push(close) for window, ma in self._ma.items()}
+
+        ema12 = values['ema12'] = self._ema12.push(close)
+        ema26 = values['ema26'] = self._ema26.push(close)
+
+        # RSI：首根K线的涨跌记为0
+        delta = close - prev_close
+        gain = self._gain.push(delta if delta > 0 else 0.0)
+        loss = self._loss.push(-(delta if delta < 0 else 0.0))
+        values['rsi'] = 100 - _div(100, 1 + _div(gain, loss))
+
+        macd = values['macd'] = ema12 - ema26
+        macd_signal = values['macd_signal'] = self._macd_signal.push(macd)
+        values['macd_histogram'] = macd - macd_signal
+
+        bb_middle = values['bb_middle'] = values['ma20']
+        bb_std = self._bb_std.push(close)
+        bb_upper = values['bb_upper'] = bb_middle + bb_std * 2
+        bb_lower = values['bb_lower'] = bb_middle - bb_std * 2
+        values['bb_position'] = _div(close - bb_lower, bb_upper - bb_lower)
+
+        low_min = self._low_min.push(low)
+        high_max = self._high_max.push(high)
+        rsv = _div(close - low_min, high_max - low_min) * 100
+        k = values['k'] = self._k.push(rsv)
+        d = values['d'] = self._d.push(k)
+        values['j'] = 3 * k - 2 * d
+
+        # OBV：收盘价上涨计正，持平或下跌计负
+        if volume == volume:
+            self._obv += volume * (1 if close > prev_close else -1)
+            values['obv'] = self._obv
+        else:
+            values['obv'] = NaN
+
+        typical_price = (high + low + close) / 3
+        money_flow = typical_price * volume
+        positive_flow = self._positive_flow.push(money_flow if typical_price > self._prev_typical else 0.0)
+        negative_flow = self._negative_flow.push(money_flow if typical_price < self._prev_typical else 0.0)
+        values['mfi'] = 100 - _div(100, 1 + _div(positive_flow, negative_flow))
+
+        ranges = [high - low, abs(high - prev_close), abs(low - prev_close)]
+        ranges = [r for r in ranges if r == r]
+        values['atr'] = self._atr.push(max(ranges) if ranges else NaN)
+
+        volume_ma = values['volume_ma'] = self._volume_ma.push(volume)
+        values['volume_ratio'] = _div(volume, volume_ma)
+
+        self._prev_close = close
+        self._prev_typical = typical_price
+        self.count += 1
+        self.last = values
+        return values
+
+    def replace_last(self, high, low, close, volume):
+        """用新值替换最后一根K线（盘中同一根K线多次更新）"""
+        if self._checkpoint is None:
+            return self.append(high, low, close, volume)
+        checkpoint = self._checkpoint
+        self.__dict__.update(checkpoint._clone().__dict__)
+        values = self.append(high, low, close, volume, checkpoint=False)
+        # 保留同一个检查点，最后一根K线可以继续被替换
+        self._checkpoint = checkpoint
+        return values
+
+
+class IndicatorEngine:
+    """
+    多标的增量指标引擎
+
+    按标的保存 StreamingIndicators 和最后一根K线的时间，每次同步只处理新增的K线，
+    最后一根K线时间相同时视为盘中更新并替换。
+    """
+
+    def __init__(self, history=None):
+        """
+        Args:
+            history (callable): symbol -> 完整K线DataFrame，首次同步某标的时用于预热
+        """
+        self.history = history
+        self._states = {}
+        self._last_bar = {}
+        # symbol -> 最新一根K线的指标值，整体替换发布，读取方无需加锁
+        self._latest = {}
+
+    def _feed(self, symbol, kline_df):
+        state = self._states.get(symbol)
+        if state is None:
+            state = self._states[symbol] = StreamingIndicators()
+        last_bar = self._last_bar.get(symbol)
+        values = None
+        final_bar = kline_df.index[-1]
+        for bar_time, high, low, close, volume in zip(kline_df.index, kline_df['high'], kline_df['low'],
+                                                      kline_df['close'], kline_df['volume']):
+            if last_bar is not None and bar_time < last_bar:
+                continue
+            if last_bar is not None and bar_time == last_bar:
+                values = state.replace_last(high, low, close, volume)
+            else:
+                # 只有最后一根K线可能在盘中被更新，需要保存追加前的状态
+                values = state.append(high, low, close, volume, checkpoint=bar_time == final_bar)
+            last_bar = bar_time
+        self._last_bar[symbol] = last_bar
+        return values
+
+    def update(self, symbol, kline_df):
+        """
+        将K线同步到该标的的指标状态
+
+        Args:
+            symbol (str): 标的名称
+            kline_df (pd.DataFrame): 以date为索引的OHLCV数据，可以只包含最近的K线
+
+        Returns:
+            dict: 最新一根K线的指标值，没有数据时为None
+        """
+        if symbol not in self._states and self.history is not None:
+            history_df = self.history(symbol)
+            if history_df is not None and not history_df.empty:
+                self._feed(symbol, history_df)
+        if kline_df is not None and not kline_df.empty:
+            self._feed(symbol, kline_df)
+        state = self._states.get(symbol)
+        if state is None or state.last is None:
+            return None
+        self._latest = dict(self._latest, **{symbol: dict(state.last, close=state._prev_close)})
+        return self._latest[symbol]
+
+    def latest(self, symbol):
+        """获取标的最新一根K线的指标值，未同步过时返回None"""
+        return self._latest.get(symbol)
+
+    def reset(self, symbol=None):
+        """清除标的（默认全部）的指标状态"""
+        symbols = [symbol] if symbol is not None else list(self._states)
+        for name in symbols:
+            self._states.pop(name, None)
+            self._last_bar.pop(name, None)
+        self._latest = {name: value for name, value in self._latest.items() if name not in symbols}
+
+
+def _run_length(x):
+    """以每个位置结尾的连续相同值个数"""
+    n = x.shape[-1]
+    positions = np.arange(n)
+    starts = np.ones(x.shape, dtype=bool)
+    np.not_equal(x[..., 1:], x[..., :-1], out=starts[..., 1:])
+    run_start = np.maximum.accumulate(np.where(starts, positions, 0), axis=-1)
+    return positions - run_start + 1
+
+
+def _rolling_sum(x, window, out, run_length=None, mean=True):
+    """
+    滑动窗口求和/均值，结果写入out
+
+    前 window-1 个位置为NaN；窗口内全部为同一个值时与pandas一样直接取该值，
+    避免前缀和相减留下的浮点残差（例如全0窗口得到 1e-17 而不是 0）。
+    窗口内有NaN时结果为NaN（与 pandas rolling 的 min_periods=window 一致）。
+    """
+    if run_length is None:
+        run_length = _run_length(x)
+    same = run_length >= window
+    # out可以与x是同一个数组，先取出需要原样保留的值
+    same_values = x[same]
+    missing = np.isnan(x)
+    gaps = None
+    if missing.any():
+        counts = np.cumsum(missing, axis=-1)
+        gaps = counts[..., window - 1:].copy()
+        gaps[..., 1:] -= counts[..., :-window]
+        x = np.where(missing, 0.0, x)
+    cumsum = np.cumsum(x, axis=-1)
+    out[..., :window - 1] = np.nan
+    out[..., window - 1:] = cumsum[..., window - 1:]
+    out[..., window:] -= cumsum[..., :-window]
+    if mean:
+        out /= window
+    else:
+        same_values *= window
+    out[same] = same_values
+    if gaps is not None:
+        out[..., window - 1:][gaps > 0] = np.nan
+    return out
+
+
+def _rolling_extreme(x, window, out, is_max):
+    """滑动窗口最大/最小值，逐个偏移比较，结果写入out"""
+    n = x.shape[-1]
+    compare = np.maximum if is_max else np.minimum
+    out[..., :window - 1] = np.nan
+    if n < window:
+        return out
+    target = out[..., window - 1:]
+    np.copyto(target, x[..., window - 1:])
+    for offset in range(1, window):
+        compare(target, x[..., window - 1 - offset:n - offset], out=target)
+    return out
+
+
+def _rolling_std(x, mean, window, out, run_length, scratch):
+    """滑动窗口样本标准差（两遍法：先减去窗口均值再平方求和），结果写入out"""
+    n = x.shape[-1]
+    out[..., :window - 1] = np.nan
+    if n < window:
+        return out
+    target = out[..., window - 1:]
+    center = mean[..., window - 1:]
+    deviation = scratch[..., window - 1:]
+    target.fill(0.0)
+    for offset in range(window):
+        np.subtract(x[..., offset:n - window + 1 + offset], center, out=deviation)
+        np.multiply(deviation, deviation, out=deviation)
+        target += deviation
+    target /= window - 1
+    np.sqrt(target, out=target)
+    out[run_length >= window] = 0.0
+    return out
+
+
+def _decay_filter(x, decay):
+    """
+    线性递推 y[t] = decay * y[t-1] + x[t]（沿最后一维）
+
+    按 EWM_BLOCK 分块：块内用下三角权重矩阵一次矩阵乘法求出局部和；块末值之间满足同样的递推
+    （系数为 decay**EWM_BLOCK），递归求解后再加回各块。所有权重都是decay的非负次幂，不会溢出。
+    """
+    n = x.shape[-1]
+    block = min(EWM_BLOCK, n)
+    n_blocks = -(-n // block)
+    padded = np.zeros(x.shape[:-1] + (n_blocks * block,))
+    padded[..., :n] = x
+    padded = padded.reshape(x.shape[:-1] + (n_blocks, block))
+
+    k = np.arange(block)
+    lag = k[None, :] - k[:, None]
+    weights = np.where(lag >= 0, decay ** np.maximum(lag, 0), 0.0)
+    local = padded @ weights
+    if n_blocks > 1:
+        carry = _decay_filter(local[..., -1], decay ** block)
+        local[..., 1:, :] += carry[..., :-1, None] * (decay ** (k + 1))
+    return local.reshape(x.shape[:-1] + (n_blocks * block,))[..., :n]
+
+
+def _ewm_mean(x, com, out):
+    """
+    指数加权均值（等价于 pandas ewm(com=com, adjust=True).mean()），结果写入out
+
+    加权和与权重和分别递推后相除；NaN不参与加权但权重照常衰减，与pandas的 ignore_na=False 一致。
+    """
+    decay = 1.0 - 1.0 / (1.0 + com)
+    observed = ~np.isnan(x)
+    n = x.shape[-1]
+    leading = np.argmax(observed, axis=-1)
+    numerator = _decay_filter(np.where(observed, x, 0.0), decay)
+    if (observed.sum(axis=-1) == n - leading).all():
+        # 只有开头的NaN：权重和是等比数列 (1 - decay**(age+1)) / (1 - decay)，
+        # decay**age 小于机器精度之后权重和不再变化，只需计算前面一段
+        settled = min(n, int(math.log(np.finfo(np.float64).eps) / math.log(decay)) + 2) if decay > 0 else 1
+        partial = (1 - decay ** np.arange(1, settled + 1)) / (1 - decay)
+        age = np.arange(n) - leading[..., None]
+        denominator = np.where(age >= 0, partial[np.clip(age, 0, settled - 1)], 0.0)
+    else:
+        denominator = _decay_filter(observed.astype(np.float64), decay)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(numerator, denominator, out=out)
+    return out
+
+
+# 指标列和中间结果的计算方式：名称 -> (依赖的列, 计算函数)
+# 计算函数的参数为 (out, *依赖列的数组)，out是写入结果的float64数组，返回计算结果（可以是out本身）
+_COLUMNS = {}
+
+
+def _column(name, *dependencies):
+    def register(func):
+        _COLUMNS[name] = (dependencies, func)
+        return func
+    return register
+
+
+@_column('_close_run', 'close')
+def _close_run(out, close):
+    # close的连续相同值长度，各均线和布林带共用
+    return _run_length(close)
+
+
+def _register_ma(window):
+    @_column(f'ma{window}', 'close', '_close_run')
+    def ma(out, close, close_run):
+        return _rolling_sum(close, window, out, close_run)
+
+
+for _window in MA_WINDOWS:
+    _register_ma(_window)
+
+
+@_column('ema12', 'close')
+def _ema12(out, close):
+    return _ewm_mean(close, (12 - 1) / 2.0, out)
+
+
+@_column('ema26', 'close')
+def _ema26(out, close):
+    return _ewm_mean(close, (26 - 1) / 2.0, out)
+
+
+@_column('_prev_close', 'close')
+def _prev_close(out, close):
+    # 前一根K线的收盘价，首根为NaN
+    out[..., 0] = np.nan
+    out[..., 1:] = close[..., :-1]
+    return out
+
+
+@_column('_missing', 'close')
+def _missing(out, close):
+    # close为NaN的位置视为缺失的K线
+    return np.isnan(close)
+
+
+def _strength_index(gain, loss, missing, mean, out):
+    """100 - 100 / (1 + 14周期上涨合计 / 下跌合计)，缺失K线处的涨跌记为NaN；gain和loss会被覆盖"""
+    if missing.any():
+        gain[missing] = np.nan
+        loss[missing] = np.nan
+    _rolling_sum(gain, 14, gain, mean=mean)
+    _rolling_sum(loss, 14, loss, mean=mean)
+    np.divide(gain, loss, out=out)
+    out += 1
+    np.divide(100, out, out=out)
+    np.subtract(100, out, out=out)
+    return out
+
+
+@_column('rsi', 'close', '_prev_close', '_missing')
+def _rsi(out, close, prev_close, missing):
+    # 首根K线的涨跌记为0
+    change = close - prev_close
+    gain = np.where(change > 0, change, 0.0)
+    loss = -np.where(change < 0, change, 0.0)
+    return _strength_index(gain, loss, missing, True, out)
+
+
+@_column('macd', 'ema12', 'ema26')
+def _macd(out, ema12, ema26):
+    return np.subtract(ema12, ema26, out=out)
+
+
+@_column('macd_signal', 'macd')
+def _macd_signal(out, macd):
+    return _ewm_mean(macd, (9 - 1) / 2.0, out)
+
+
+@_column('macd_histogram', 'macd', 'macd_signal')
+def _macd_histogram(out, macd, macd_signal):
+    return np.subtract(macd, macd_signal, out=out)
+
+
+@_column('bb_middle', 'ma20')
+def _bb_middle(out, ma20):
+    # 布林带中轨即MA20
+    np.copyto(out, ma20)
+    return out
+
+
+@_column('_bb_width', 'close', 'ma20', '_close_run')
+def _bb_width(out, close, ma20, close_run):
+    # 两倍20周期标准差
+    _rolling_std(close, ma20, 20, out, close_run, np.empty_like(close))
+    out *= 2
+    return out
+
+
+@_column('bb_upper', 'bb_middle', '_bb_width')
+def _bb_upper(out, bb_middle, bb_width):
+    return np.add(bb_middle, bb_width, out=out)
+
+
+@_column('bb_lower', 'bb_middle', '_bb_width')
+def _bb_lower(out, bb_middle, bb_width):
+    return np.subtract(bb_middle, bb_width, out=out)
+
+
+@_column('bb_position', 'close', 'bb_upper', 'bb_lower')
+def _bb_position(out, close, bb_upper, bb_lower):
+    np.subtract(close, bb_lower, out=out)
+    out /= bb_upper - bb_lower
+    return out
+
+
+@_column('_rsv', 'high', 'low', 'close')
+def _rsv(out, high, low, close):
+    low_min = _rolling_extreme(low, 9, np.empty_like(low), is_max=False)
+    high_max = _rolling_extreme(high, 9, np.empty_like(high), is_max=True)
+    high_max -= low_min
+    np.subtract(close, low_min, out=out)
+    out /= high_max
+    out *= 100
+    return out
+
+
+@_column('k', '_rsv')
+def _k(out, rsv):
+    return _ewm_mean(rsv, 2, out)
+
+
+@_column('d', 'k')
+def _d(out, k):
+    return _ewm_mean(k, 2, out)
+
+
+@_column('j', 'k', 'd')
+def _j(out, k, d):
+    np.multiply(k, 3, out=out)
+    out -= 2 * d
+    return out
+
+
+@_column('obv', 'close', '_prev_close', 'volume')
+def _obv(out, close, prev_close, volume):
+    # 收盘价上涨计正，持平或下跌计负
+    np.multiply(volume, np.where(close > prev_close, 1.0, -1.0), out=out)
+    volume_missing = np.isnan(volume)
+    if volume_missing.any():
+        out[volume_missing] = 0.0
+        np.cumsum(out, axis=-1, out=out)
+        out[volume_missing] = np.nan
+    else:
+        np.cumsum(out, axis=-1, out=out)
+    return out
+
+
+@_column('_typical_price', 'high', 'low', 'close')
+def _typical_price(out, high, low, close):
+    np.add(high, low, out=out)
+    out += close
+    out /= 3
+    return out
+
+
+@_column('mfi', '_typical_price', 'volume', '_missing')
+def _mfi(out, typical_price, volume, missing):
+    money_flow = typical_price * volume
+    rising = np.zeros(typical_price.shape, dtype=bool)
+    falling = np.zeros(typical_price.shape, dtype=bool)
+    np.greater(typical_price[..., 1:], typical_price[..., :-1], out=rising[..., 1:])
+    np.less(typical_price[..., 1:], typical_price[..., :-1], out=falling[..., 1:])
+    positive_flow = np.where(rising, money_flow, 0.0)
+    negative_flow = np.where(falling, money_flow, 0.0)
+    return _strength_index(positive_flow, negative_flow, missing, False, out)
+
+
+@_column('atr', 'high', 'low', '_prev_close')
+def _atr(out, high, low, prev_close):
+    # 首根K线只有最高价与最低价之差
+    true_range = high - low
+    np.fmax(true_range, np.abs(high - prev_close), out=true_range)
+    np.fmax(true_range, np.abs(low - prev_close), out=true_range)
+    return _rolling_sum(true_range, 14, out)
+
+
+@_column('volume_ma', 'volume')
+def _volume_ma(out, volume):
+    return _rolling_sum(volume, 20, out)
+
+
+@_column('volume_ratio', 'volume', 'volume_ma')
+def _volume_ratio(out, volume, volume_ma):
+    return np.divide(volume, volume_ma, out=out)
+
+
+class IndicatorFrame:
+    """
+    按需计算的指标集合
+
+    各列的依赖和计算方式在 _COLUMNS 中声明，第一次读取某列时才计算它和尚未计算的依赖，
+    结果保留供之后读取，只用到几列的调用方不必计算全部指标。
+    输入可以是多个标的堆叠成的二维数组，沿最后一维计算（与 compute_indicators 相同）。
+    """
+
+    def __init__(self, high=None, low=None, close=None, volume=None, index=None, out=None):
+        """
+        Args:
+            high, low, close, volume (array-like): 形状相同的价格和成交量序列，
+                不需要的可以省略（读取依赖它的列时抛出KeyError）
+            index (pd.Index): 行索引，用于 series 和 to_frame
+            out (np.ndarray): 写入指标列的矩阵，形状为 (len(INDICATOR_COLUMNS),) + close.shape；
+                默认每列单独分配
+        """
+        self._values = {
+            name: np.asarray(values, dtype=np.float64)
+            for name, values in (('high', high), ('low', low), ('close', close), ('volume', volume))
+            if values is not None
+        }
+        self.shape = self._values['close'].shape
+        self.index = index
+        self.block = out
+
+    @classmethod
+    def from_frame(cls, df):
+        """由以date为索引的K线DataFrame创建（使用其中存在的 high、low、close、volume 列）"""
+        return cls(**{name: df[name].to_numpy() for name in ('high', 'low', 'close', 'volume') if name in df.columns},
+                   index=df.index)
+
+    def __getitem__(self, name):
+        value = self._values.get(name)
+        if value is None:
+            if name not in _COLUMNS:
+                raise KeyError(name)
+            dependencies, func = _COLUMNS[name]
+            args = [self[dependency] for dependency in dependencies]
+            row = COLUMN_INDEX.get(name)
+            out = self.block[row] if row is not None and self.block is not None else np.empty(self.shape)
+            if self.shape[-1] == 0:
+                value = out
+            else:
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    value = func(out, *args)
+            self._values[name] = value
+        return value
+
+    def __contains__(self, name):
+        return name in self._values or name in _COLUMNS
+
+    @property
+    def computed(self):
+        """已经计算过的指标列"""
+        return [name for name in INDICATOR_COLUMNS if name in self._values]
+
+    def compute(self, columns=INDICATOR_COLUMNS):
+        """计算指定的列（默认全部指标列）"""
+        for name in columns:
+            self[name]
+        return self
+
+    def series(self, name):
+        return pd.Series(self[name], index=self.index, name=name)
+
+    def to_frame(self, columns=INDICATOR_COLUMNS):
+        """指定列组成的DataFrame（仅适用于一维输入）"""
+        return pd.DataFrame({name: self[name] for name in columns}, index=self.index)
+
+
+def compute_indicators(high, low, close, volume, out=None):
+    """
+    一次性计算全部技术指标（与 calculate_technical_indicators 的结果一致）
+
+    按依赖顺序计算 IndicatorFrame 中的全部指标列，20周期均值、前一收盘价等中间结果在各指标间共用，
+    所有指标写入同一个预先分配的矩阵。输入可以是多个标的堆叠成的二维数组，沿最后一维计算；
+    close为NaN的位置视为缺失的K线（例如上市前的填充），不参与任何指标。
+
+    Args:
+        high, low, close, volume (array-like): 形状相同的价格和成交量序列，(n,) 或 (n_symbols, n)
+        out (np.ndarray): 写入结果的矩阵，默认新分配
+
+    Returns:
+        np.ndarray: 形状为 (len(INDICATOR_COLUMNS),) + close.shape 的float64矩阵，第一维顺序同 INDICATOR_COLUMNS
+    """
+    close = np.asarray(close, dtype=np.float64)
+    block = np.empty((len(INDICATOR_COLUMNS),) + close.shape) if out is None else out
+    IndicatorFrame(high, low, close, volume, out=block).compute()
+    return block
+
+
+def with_indicators(df):
+    """
+    在K线DataFrame上追加全部指标列
+
+    Args:
+        df (pd.DataFrame): 含 high、low、close、volume 列
+
+    Returns:
+        pd.DataFrame: 原有列加上 INDICATOR_COLUMNS（已存在的同名列会被覆盖）
+    """
+    base = df.drop(columns=[c for c in INDICATOR_COLUMNS if c in df.columns])
+    columns = list(base.columns) + list(INDICATOR_COLUMNS)
+    arrays = (df['high'].to_numpy(), df['low'].to_numpy(), df['close'].to_numpy(), df['volume'].to_numpy())
+
+    if all(dtype == np.float64 for dtype in base.dtypes):
+        # 原有列和指标列放进同一个矩阵，DataFrame直接引用该矩阵，不再整体复制
+        values = np.empty((len(columns), len(df)))
+        values[:base.shape[1]] = base.to_numpy().T
+        compute_indicators(*arrays, out=values[base.shape[1]:])
+        return pd.DataFrame(values.T, index=df.index, columns=columns)
+
+    block = compute_indicators(*arrays)
+    frame = pd.DataFrame(block.T, index=df.index, columns=list(INDICATOR_COLUMNS))
+    return pd.concat([base, frame], axis=1)
+
+
+# 面板中堆叠的K线列
+PANEL_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+
+class KlinePanel(NamedTuple):
+    """
+    多个标的右对齐堆叠的K线
+
+    每行是一个标的，最后一列是各标的最新的一根K线；历史较短的标的在左侧用NaN填充。
+    """
+    symbols: list
+    # 各标的的K线时间（不含填充），dates[i] 对应第i行的最后 len(dates[i]) 列
+    dates: list
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+
+def stack_klines(kline_dfs, n_bars=None):
+    """
+    将多个标的的K线右对齐堆叠为 (n_symbols, n_bars) 矩阵
+
+    Args:
+        kline_dfs (dict): symbol -> 以date为索引的OHLCV数据，空数据的标的会被跳过
+        n_bars (int): 每个标的保留的最近K线数，默认为最长的历史长度
+
+    Returns:
+        KlinePanel: 堆叠后的K线
+    """
+    frames = {symbol: df for symbol, df in kline_dfs.items() if df is not None and not df.empty}
+    if n_bars is None:
+        n_bars = max((len(df) for df in frames.values()), default=0)
+    shape = (len(frames), n_bars)
+    arrays = {name: np.full(shape, np.nan) for name in PANEL_COLUMNS}
+    dates = []
+    for i, df in enumerate(frames.values()):
+        df = df.iloc[-n_bars:] if n_bars else df.iloc[:0]
+        for name, array in arrays.items():
+            array[i, n_bars - len(df):] = df[name].to_numpy(dtype=np.float64)
+        dates.append(df.index)
+    return KlinePanel(list(frames), dates, **arrays)
+
+
+def compute_panel(panel):
+    """
+    一次计算面板中所有标的的全部指标
+
+    Returns:
+        np.ndarray: 形状为 (len(INDICATOR_COLUMNS), n_symbols, n_bars) 的矩阵
+    """
+    return compute_indicators(panel.high, panel.low, panel.close, panel.volume)
+
+
+def panel_frames(panel, block=None):
+    """
+    拆分为各标的的K线+指标DataFrame（去掉左侧填充，与对单个标的调用 with_indicators 的结果一致）
+
+    Returns:
+        dict: symbol -> pd.DataFrame
+    """
+    if block is None:
+        block = compute_panel(panel)
+    n_bars = panel.close.shape[-1]
+    frames = {}
+    for i, (symbol, dates) in enumerate(zip(panel.symbols, panel.dates)):
+        start = n_bars - len(dates)
+        values = np.empty((len(PANEL_COLUMNS) + len(INDICATOR_COLUMNS), len(dates)))
+        for j, name in enumerate(PANEL_COLUMNS):
+            values[j] = getattr(panel, name)[i, start:]
+        values[len(PANEL_COLUMNS):] = block[:, i, start:]
+        frames[symbol] = pd.DataFrame(values.T, index=dates, columns=list(PANEL_COLUMNS) + list(INDICATOR_COLUMNS))
+    return frames
+
+
+def latest_indicators(panel, block=None):
+    """
+    各标的最新一根K线的收盘价和全部指标，用于全市场筛选和排序
+
+    Returns:
+        pd.DataFrame: 以symbol为索引，列为 close 和 INDICATOR_COLUMNS
+    """
+    if block is None:
+        block = compute_panel(panel)
+    latest = pd.DataFrame(block[:, :, -1].T, index=panel.symbols, columns=list(INDICATOR_COLUMNS))
+    latest.insert(0, 'close', panel.close[:, -1])
+    return latest
+
+
+_MISSING = object()
+
+
+class IndicatorCache:
+    """指标结果缓存：K线数据指纹 -> 已计算指标的DataFrame，超过容量时淘汰最久未使用的条目"""
+
+    def __init__(self, max_entries=DEFAULT_INDICATOR_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# 进程内共享的指标缓存（Streamlit重跑脚本时保留）
+INDICATOR_CACHE = IndicatorCache()
+
+
+def frame_key(df, symbol=None, kind='indicators'):
+    """
+    K线数据的缓存键：(symbol, 首尾K线时间, K线数, 指标版本, 计算方式, 列名, OHLCV数据的CRC32)
+
+    任意一根K线（包括盘中更新的最后一根和被修正的历史K线）的数值变化都会得到新的键；
+    CRC32 比 SHA-1 快数倍，对缓存键足够。
+    """
+    digest = 0
+    for name in PANEL_COLUMNS:
+        if name in df.columns:
+            digest = zlib.crc32(np.ascontiguousarray(df[name].to_numpy(dtype=np.float64)).data, digest)
+    return (symbol, df.index[0], df.index[-1], len(df), INDICATOR_VERSION, kind, tuple(df.columns), digest)
+
+
+def cached_frame(df, compute, symbol=None, kind='indicators', cache=None):
+    """
+    按K线数据指纹缓存 compute(df) 的结果
+
+    Args:
+        df (pd.DataFrame): 以date为索引的OHLCV数据
+        compute (callable): df -> 计算结果DataFrame
+        symbol (str): 标的名称，用于区分数据相同的不同标的
+        kind (str): 计算方式，不同的 compute 必须使用不同的kind
+        cache (IndicatorCache): 默认为 INDICATOR_CACHE
+
+    Returns:
+        pd.DataFrame: 计算结果的副本（调用方修改它不会影响缓存）
+    """
+    if df.empty:
+        return compute(df)
+    cache = INDICATOR_CACHE if cache is None else cache
+    key = frame_key(df, symbol, kind)
+    frame = cache.get(key)
+    if frame is None:
+        frame = compute(df)
+        cache.put(key, frame)
+    return frame.copy()
+
+
+def cached_indicators(df, symbol=None, cache=None):
+    """带缓存的 with_indicators"""
+    return cached_frame(df, with_indicators, symbol, cache=cache)
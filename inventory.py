@@ -0,0 +1,199 @@
+from datetime import datetime
+
+import numpy as np
+
+# T+7：买入后需等待的天数
+LOCK_DAYS = 7
+LOCK_PERIOD = np.timedelta64(LOCK_DAYS, 'D')
+# 批次缓冲区的初始容量
+INITIAL_CAPACITY = 16
+
+
+def _to_datetime64(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return np.datetime64(value, 'us')
+
+
+class LotInventory:
+    """
+    单个标的的库存批次队列
+
+    每次买入记为一个批次，按买入时间顺序保存在NumPy缓冲区中，并预先计算解锁时间以及
+    数量和成本的前缀和。先买入的批次先解锁，已解锁的批次总是队列的前缀：可卖数量是对
+    解锁时间的二分查找，FIFO卖出只移动队首位置，两者都是 O(log n)。
+    内存占用和保存的数据量与交易次数成正比，与持有件数无关。
+    """
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self._unlock = np.empty(capacity, dtype='datetime64[us]')
+        self._prices = np.empty(capacity, dtype=np.float64)
+        # 数量和成本的前缀和（包含当前批次）
+        self._cum_qty = np.empty(capacity, dtype=np.int64)
+        self._cum_cost = np.empty(capacity, dtype=np.float64)
+        self._size = 0
+        # 队首（第一个尚有剩余的批次）位置，以及从队列开头起累计卖出的数量
+        self._head = 0
+        self._sold = 0
+
+    @classmethod
+    def from_lots(cls, lots):
+        """
+        Args:
+            lots (list): [(purchase_date, purchase_price, quantity), ...]，purchase_date 为ISO字符串或datetime
+        """
+        lots = [lot for lot in lots if lot[2] > 0]
+        inventory = cls(max(INITIAL_CAPACITY, len(lots)))
+        if not lots:
+            return inventory
+
+        dates = np.array([_to_datetime64(lot[0]) for lot in lots], dtype='datetime64[us]')
+        prices = np.array([lot[1] for lot in lots], dtype=np.float64)
+        quantities = np.array([lot[2] for lot in lots], dtype=np.int64)
+        order = np.argsort(dates, kind='stable')
+
+        n = len(lots)
+        inventory._unlock[:n] = dates[order] + LOCK_PERIOD
+        inventory._prices[:n] = prices[order]
+        inventory._cum_qty[:n] = np.cumsum(quantities[order])
+        inventory._cum_cost[:n] = np.cumsum(prices[order] * quantities[order])
+        inventory._size = n
+        return inventory
+
+    def to_lots(self):
+        """导出剩余批次 [(purchase_date, purchase_price, quantity), ...]，purchase_date 为ISO字符串"""
+        live = slice(self._head, self._size)
+        dates = (self._unlock[live] - LOCK_PERIOD).tolist()
+        # 队首批次可能已被部分卖出
+        quantities = np.diff(self._cum_qty[live], prepend=self._sold).tolist()
+        return [(date.isoformat(), price, quantity)
+                for date, price, quantity in zip(dates, self._prices[live].tolist(), quantities)]
+
+    def to_records(self):
+        """导出为可JSON序列化的字典列表"""
+        return [{'purchase_date': date, 'purchase_price': price, 'quantity': quantity}
+                for date, price, quantity in self.to_lots()]
+
+    def __len__(self):
+        return self._size - self._head
+
+    @property
+    def total_quantity(self):
+        return int(self._cum_qty[self._size - 1] - self._sold) if self._size else 0
+
+    @property
+    def total_cost(self):
+        if not self._size:
+            return 0.0
+        return float(self._cum_cost[self._size - 1]) - self._cost_of(self._sold)
+
+    def avg_cost(self, default=0.0):
+        total = self.total_quantity
+        return self.total_cost / total if total else default
+
+    def add(self, purchase_date, price, quantity):
+        """买入：在队尾追加一个批次"""
+        if quantity <= 0:
+            return
+        unlock = _to_datetime64(purchase_date) + LOCK_PERIOD
+        if len(self) and unlock < self._unlock[self._size - 1]:
+            # 早于队尾的批次（正常买入按时间顺序，不会出现）需要重建队列以保持有序
+            rebuilt = LotInventory.from_lots(self.to_lots() + [(purchase_date, price, quantity)])
+            self.__dict__.update(rebuilt.__dict__)
+            return
+
+        if self._size == len(self._unlock):
+            self._grow()
+        prev_qty = self._cum_qty[self._size - 1] if self._size else 0
+        prev_cost = self._cum_cost[self._size - 1] if self._size else 0.0
+        self._unlock[self._size] = unlock
+        self._prices[self._size] = price
+        self._cum_qty[self._size] = prev_qty + int(quantity)
+        self._cum_cost[self._size] = prev_cost + float(price) * int(quantity)
+        self._size += 1
+
+    def _grow(self):
+        """缓冲区已满：先丢弃已卖空的批次，仍不够时容量翻倍"""
+        head = self._head
+        if head:
+            base_qty = self._cum_qty[head - 1]
+            base_cost = self._cum_cost[head - 1]
+            n = self._size - head
+            self._unlock[:n] = self._unlock[head:self._size]
+            self._prices[:n] = self._prices[head:self._size]
+            self._cum_qty[:n] = self._cum_qty[head:self._size] - base_qty
+            self._cum_cost[:n] = self._cum_cost[head:self._size] - base_cost
+            self._size = n
+            self._head = 0
+            self._sold -= int(base_qty)
+        if self._size * 2 > len(self._unlock):
+            capacity = max(INITIAL_CAPACITY, len(self._unlock) * 2)
+            for name in ('_unlock', '_prices', '_cum_qty', '_cum_cost'):
+                old = getattr(self, name)
+                buffer = np.empty(capacity, dtype=old.dtype)
+                buffer[:self._size] = old[:self._size]
+                setattr(self, name, buffer)
+
+    def _cost_of(self, units):
+        """队列开头起前units件的买入成本"""
+        if units <= 0:
+            return 0.0
+        index = int(np.searchsorted(self._cum_qty[:self._size], units, side='left'))
+        prev_qty = self._cum_qty[index - 1] if index else 0
+        prev_cost = self._cum_cost[index - 1] if index else 0.0
+        return float(prev_cost + (units - prev_qty) * self._prices[index])
+
+    def _unlocked_end(self, now):
+        """已解锁批次的结束位置（解锁时间 <= now 的批次个数）"""
+        now = _to_datetime64(now or datetime.now())
+        return int(np.searchsorted(self._unlock[:self._size], now, side='right'))
+
+    def available_quantity(self, now=None):
+        """已过T+7、可卖出的数量"""
+        end = self._unlocked_end(now)
+        if end <= self._head:
+            return 0
+        return int(self._cum_qty[end - 1] - self._sold)
+
+    def next_unlock(self, now=None):
+        """最近一个尚未解锁批次的解锁时间，没有锁定批次时返回None"""
+        index = max(self._head, self._unlocked_end(now))
+        if index >= self._size:
+            return None
+        return self._unlock[index].astype(datetime)
+
+    def sell(self, quantity, now=None):
+        """
+        按FIFO从已解锁的批次中卖出
+
+        Args:
+            quantity (int): 卖出数量，超过可卖数量时只卖出可卖部分
+
+        Returns:
+            float: 卖出部分的买入成本
+        """
+        quantity = min(int(quantity), self.available_quantity(now))
+        if quantity <= 0:
+            return 0.0
+        cost = self._cost_of(self._sold + quantity) - self._cost_of(self._sold)
+        self._sold += quantity
+        self._head = int(np.searchsorted(self._cum_qty[:self._size], self._sold, side='right'))
+        return cost
+
+
+def build_inventory(lots, now=None):
+    """
+    由批次构造库存字典
+
+    Args:
+        lots (list): [(purchase_date, purchase_price, quantity), ...]
+
+    Returns:
+        dict: {'total_quantity', 'available_quantity', 'lots': LotInventory}
+    """
+    lot_inventory = lots if isinstance(lots, LotInventory) else LotInventory.from_lots(lots)
+    return {
+        'total_quantity': lot_inventory.total_quantity,
+        'available_quantity': lot_inventory.available_quantity(now),
+        'lots': lot_inventory
+    }
@@ -0,0 +1,280 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import pandas as pd
+import requests
+
+import http_client
+
+KLINE_COLUMNS = ['date', 'open', 'high', 'low', 'close', 'volume']
+
+# 批量获取的默认并发数
+DEFAULT_MAX_WORKERS = http_client.DEFAULT_PER_HOST_LIMIT
+
+
+def empty_kline_frame():
+    """返回空的K线DataFrame（以date为索引）"""
+    return pd.DataFrame(columns=KLINE_COLUMNS).set_index('date')
+
+
+def _failure(message, level='error', latency=0.0, attempts=0):
+    return {
+        'success': False,
+        'data': empty_kline_frame(),
+        'error': message,
+        'level': level,
+        'latency': latency,
+        'attempts': attempts
+    }
+
+
+def parse_kline_data(kline_ls, start_date=None, end_date=None):
+    """
+    将接口返回的K线列表解析为DataFrame
+
+    Args:
+        kline_ls (list): 接口返回的原始K线数据
+        start_date (str): 开始日期 'YYYY-MM-DD'
+        end_date (str): 结束日期 'YYYY-MM-DD'
+
+    Returns:
+        tuple: (DataFrame, 错误信息, 错误级别)，成功时错误信息为None
+    """
+    kline_df = pd.DataFrame(kline_ls)
+
+    # 检查数据是否为空
+    if kline_df.empty:
+        return empty_kline_frame(), "⚠️ 获取的数据为空，请尝试调整时间范围", 'warning'
+
+    # 检查列数
+    if len(kline_df.columns) < 6:
+        return empty_kline_frame(), f"❌ 数据格式错误，期望6列，实际{len(kline_df.columns)}列", 'error'
+
+    # 提取完整的OHLCV数据：时间戳、开盘价、最高价、最低价、收盘价、成交量
+    kline_df = kline_df.iloc[:, [0, 1, 2, 3, 4, 5]]
+    kline_df.columns = KLINE_COLUMNS
+
+    # 处理时间戳
+    try:
+        kline_df['date'] = kline_df['date'].apply(lambda x: datetime.fromtimestamp(int(x) / 1000 if int(x) > 1e10 else int(x)))
+    except Exception as e:
+        return empty_kline_frame(), f"❌ 时间戳处理错误: {str(e)}", 'error'
+
+    # 转换数据类型
+    for col in ['open', 'high', 'low', 'close', 'volume']:
+        kline_df[col] = pd.to_numeric(kline_df[col], errors='coerce')
+
+    # 删除无效数据
+    kline_df = kline_df.dropna(subset=['close'])
+
+    if kline_df.empty:
+        return empty_kline_frame(), "⚠️ 数据处理后为空，可能数据质量有问题", 'warning'
+
+    # 应用时间范围筛选
+    if start_date or end_date:
+        mask = pd.Series([True] * len(kline_df), index=kline_df.index)
+        if start_date:
+            start_datetime = datetime.strptime(start_date, '%Y-%m-%d')
+            mask = mask & (kline_df['date'] >= start_datetime)
+        if end_date:
+            end_datetime = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
+            mask = mask & (kline_df['date'] < end_datetime)
+        kline_df = kline_df[mask]
+
+        if len(kline_df) == 0:
+            return empty_kline_frame(), "⚠️ 指定时间范围内无数据，请调整时间范围", 'warning'
+
+    # 设置索引并排序
+    kline_df = kline_df.set_index('date').sort_index()
+
+    return kline_df, None, None
+
+
+def filter_by_date(kline_df, start_date=None, end_date=None):
+    """
+    按日期截取已获取的K线（与接口获取时的时间范围筛选规则一致）
+
+    Args:
+        kline_df (pd.DataFrame): 以date为索引的K线数据
+        start_date (str): 开始日期 'YYYY-MM-DD'
+        end_date (str): 结束日期 'YYYY-MM-DD'（包含当天）
+
+    Returns:
+        pd.DataFrame: 截取后的K线数据
+    """
+    mask = pd.Series(True, index=kline_df.index)
+    if start_date:
+        mask &= kline_df.index >= datetime.strptime(start_date, '%Y-%m-%d')
+    if end_date:
+        mask &= kline_df.index < datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
+    return kline_df[mask.to_numpy()]
+
+
+def fetch_kline(url, start_date=None, end_date=None, max_retries=3, client=None):
+    """
+    获取K线数据（不依赖Streamlit，可在后台线程中调用）
+
+    Args:
+        url (str): DATA_SOURCES中的K线URL模板
+        start_date (str): 开始日期 'YYYY-MM-DD'
+        end_date (str): 结束日期 'YYYY-MM-DD'
+        max_retries (int): 最大尝试次数
+        client (HttpClient): 使用的HTTP客户端，默认为共享客户端
+
+    Returns:
+        dict: {'success', 'data', 'error', 'level', 'latency', 'attempts'}
+    """
+    client = client or http_client.get_client()
+    started = time.perf_counter()
+
+    # 处理时间范围
+    end_ts = int(datetime.now().timestamp()) if end_date is None else int(datetime.strptime(end_date, '%Y-%m-%d').timestamp())
+
+    kline_ls = []
+    attempts = 0
+    for retry in range(max_retries):
+        attempts += 1
+        last_try = retry == max_retries - 1
+        try:
+            ts = int(datetime.now().timestamp() * 1000)
+            request_url = url.format(ts, end_ts)
+
+            # 重试由本循环控制（接口返回空数据时也需要重试），退避时间使用客户端的重试策略
+            response = client.get(request_url, timeout=15, retries=0)
+
+            if response.status_code != 200:
+                if not last_try:
+                    client.retry.sleep(retry)
+                    continue
+                return _failure(f"❌ 数据获取失败: HTTP {response.status_code}",
+                                latency=time.perf_counter() - started, attempts=attempts)
+
+            data = response.json()
+            if 'data' not in data:
+                if not last_try:
+                    client.retry.sleep(retry)
+                    continue
+                return _failure("❌ 数据格式错误", latency=time.perf_counter() - started, attempts=attempts)
+
+            kline_data = data['data']
+            if not kline_data:
+                if not last_try:
+                    client.retry.sleep(retry)
+                    continue
+                return _failure("⚠️ 该时间段内无数据，请尝试调整时间范围或选择其他标的", level='warning',
+                                latency=time.perf_counter() - started, attempts=attempts)
+
+            kline_ls = kline_data
+            break
+
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            if not last_try:
+                client.retry.sleep(retry + 1)  # 网络问题等待更长时间
+                continue
+            return _failure("❌ 网络连接失败，请检查网络或稍后重试",
+                            latency=time.perf_counter() - started, attempts=attempts)
+        except Exception as e:
+            if not last_try:
+                client.retry.sleep(retry)
+                continue
+            return _failure(f"❌ 数据获取出错: {str(e)}", latency=time.perf_counter() - started, attempts=attempts)
+
+    try:
+        kline_df, error, level = parse_kline_data(kline_ls, start_date, end_date)
+    except Exception as e:
+        kline_df, error, level = empty_kline_frame(), f"❌ 数据处理出错: {str(e)}", 'error'
+
+    latency = time.perf_counter() - started
+    if error:
+        return _failure(error, level=level, latency=latency, attempts=attempts)
+
+    return {
+        'success': True,
+        'data': kline_df,
+        'error': None,
+        'level': None,
+        'latency': latency,
+        'attempts': attempts
+    }
+
+
+class KlineBatch(dict):
+    """
+    批量K线结果：symbol -> DataFrame
+
+    额外属性:
+        latency (dict): symbol -> 单次请求耗时（秒）
+        errors (dict): symbol -> 错误信息（仅失败的标的）
+        elapsed (float): 整批耗时（秒）
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.latency = {}
+        self.errors = {}
+        self.elapsed = 0.0
+
+    def summary(self):
+        """返回耗时摘要，便于对比串行与并发的加速比"""
+        latencies = list(self.latency.values())
+        total = sum(latencies)
+        return {
+            'count': len(latencies),
+            'failed': len(self.errors),
+            'elapsed': self.elapsed,
+            'serial_estimate': total,
+            'avg_latency': total / len(latencies) if latencies else 0.0,
+            'max_latency': max(latencies) if latencies else 0.0,
+            'speedup': total / self.elapsed if self.elapsed > 0 else 0.0
+        }
+
+
+def get_klines_bulk(symbols, start_date=None, end_date=None, max_workers=DEFAULT_MAX_WORKERS, client=None, fetch=None):
+    """
+    并发批量获取多个标的的K线数据
+
+    Args:
+        symbols (dict): symbol -> K线URL模板
+        start_date (str): 开始日期 'YYYY-MM-DD'
+        end_date (str): 结束日期 'YYYY-MM-DD'
+        max_workers (int): 最大并发数
+        client (HttpClient): 使用的HTTP客户端，默认为共享客户端
+        fetch (callable): 单标的获取函数 fetch(url, start_date, end_date)，默认直接请求接口
+
+    Returns:
+        KlineBatch: symbol -> DataFrame（失败的标的为空DataFrame），按 symbols 的顺序排列
+    """
+    if fetch is None:
+        client = client or http_client.get_client()
+
+        def fetch(url, start, end):
+            return fetch_kline(url, start, end, client=client)
+
+    batch = KlineBatch()
+    started = time.perf_counter()
+
+    if not symbols:
+        return batch
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(symbols)))) as executor:
+        futures = {
+            executor.submit(fetch, url, start_date, end_date): symbol
+            for symbol, url in symbols.items()
+        }
+        results = {}
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                results[futures[future]] = _failure(f"❌ 数据获取出错: {str(e)}")
+
+    for symbol in symbols:
+        result = results[symbol]
+        batch[symbol] = result['data']
+        batch.latency[symbol] = result['latency']
+        if not result['success']:
+            batch.errors[symbol] = result['error']
+
+    batch.elapsed = time.perf_counter() - started
+    return batch
@@ -0,0 +1,241 @@
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import kline_data
+from symbol_registry import TYPE_VAL_BY_URL, parse_type_val
+
+# 尾部数据的默认有效期（秒）。必须小于实时价格的最短刷新间隔
+# （price_service 的60秒周期减去10%抖动为54秒），否则部分定时刷新会直接读取本地数据而不访问接口
+DEFAULT_MAX_AGE = 30
+
+
+def get_type_val(url):
+    """
+    从DATA_SOURCES的K线URL中提取typeVal
+
+    Args:
+        url (str): K线URL模板
+
+    Returns:
+        str: typeVal，未找到时返回原URL
+    """
+    type_val = TYPE_VAL_BY_URL.get(url) or parse_type_val(url)
+    return type_val or url
+
+
+def _day_start_ts(date_str):
+    return int(datetime.strptime(date_str, '%Y-%m-%d').timestamp())
+
+
+def _day_end_ts(date_str):
+    return int((datetime.strptime(date_str, '%Y-%m-%d') + timedelta(days=1)).timestamp())
+
+
+def _range_end_ts(end_date, now):
+    """请求区间的结束时间：end_date当天结束，不晚于当前时间；未指定end_date时为当前时间"""
+    return min(_day_end_ts(end_date), now) if end_date else now
+
+
+class KlineStore:
+    """本地K线存储：以(typeVal, ts)为主键，增量合并新K线"""
+
+    def __init__(self, db_path: str = "kline_cache.db", max_age: int = DEFAULT_MAX_AGE):
+        self.db_path = db_path
+        self.max_age = max_age
+        self.init_database()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def init_database(self):
+        """初始化K线缓存表"""
+        conn = self._connect()
+        cursor = conn.cursor()
+
+        # K线数据表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS kline_bars (
+                type_val TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                open REAL,
+                high REAL,
+                low REAL,
+                close REAL NOT NULL,
+                volume REAL,
+                PRIMARY KEY (type_val, ts)
+            ) WITHOUT ROWID
+        ''')
+
+        # 同步状态表（记录每个标的最后一次从接口同步的时间，以及本地数据已同步到的时间点）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS kline_sync (
+                type_val TEXT PRIMARY KEY,
+                last_sync INTEGER NOT NULL,
+                synced_end INTEGER
+            )
+        ''')
+        # 旧版本的同步状态表没有synced_end列，这些标的在下次请求时重新同步
+        columns = [row[1] for row in cursor.execute('PRAGMA table_info(kline_sync)')]
+        if 'synced_end' not in columns:
+            cursor.execute('ALTER TABLE kline_sync ADD COLUMN synced_end INTEGER')
+
+        conn.commit()
+        conn.close()
+
+    def get_sync_state(self, type_val):
+        """
+        获取标的的同步状态
+
+        Returns:
+            tuple: (已同步到的时间点, 最后一根K线时间戳)，未同步过时为 (None, None)
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('SELECT synced_end FROM kline_sync WHERE type_val = ?', (type_val,))
+            row = cursor.fetchone()
+            synced_end = row[0] if row else None
+            cursor.execute('SELECT MAX(ts) FROM kline_bars WHERE type_val = ?', (type_val,))
+            last_ts = cursor.fetchone()[0]
+            return synced_end, last_ts
+        finally:
+            conn.close()
+
+    def load(self, type_val, start_date=None, end_date=None):
+        """
+        从本地读取K线
+
+        Args:
+            type_val (str): 标的typeVal
+            start_date (str): 开始日期 'YYYY-MM-DD'
+            end_date (str): 结束日期 'YYYY-MM-DD'（包含当天）
+
+        Returns:
+            pd.DataFrame: 以date为索引的OHLCV数据
+        """
+        start_ts = _day_start_ts(start_date) if start_date else 0
+        end_ts = _day_end_ts(end_date) if end_date else 2 ** 62
+
+        conn = self._connect()
+        try:
+            rows = conn.execute('''
+                SELECT ts, open, high, low, close, volume
+                FROM kline_bars
+                WHERE type_val = ? AND ts >= ? AND ts < ?
+                ORDER BY ts
+            ''', (type_val, start_ts, end_ts)).fetchall()
+        finally:
+            conn.close()
+
+        if not rows:
+            return kline_data.empty_kline_frame()
+
+        kline_df = pd.DataFrame(rows, columns=['ts', 'open', 'high', 'low', 'close', 'volume'])
+        kline_df['date'] = kline_df['ts'].apply(datetime.fromtimestamp)
+        return kline_df.drop(columns='ts').set_index('date')
+
+    def merge(self, type_val, kline_df, since_ts=None, synced_end=None):
+        """
+        将新获取的K线合并进本地存储
+
+        Args:
+            type_val (str): 标的typeVal
+            kline_df (pd.DataFrame): 以date为索引的OHLCV数据
+            since_ts (int): 只写入该时间戳及之后的K线（最后一根K线可能在盘中被更新）
+            synced_end (int): 这次获取覆盖到的时间点，记录后不会倒退
+
+        Returns:
+            int: 写入的K线数量
+        """
+        if kline_df.empty:
+            rows = []
+        else:
+            ts = [int(d.timestamp()) for d in kline_df.index]
+            rows = [
+                (type_val, t, o, h, l, c, v)
+                for t, o, h, l, c, v in zip(ts, kline_df['open'], kline_df['high'], kline_df['low'],
+                                            kline_df['close'], kline_df['volume'])
+                if since_ts is None or t >= since_ts
+            ]
+
+        conn = self._connect()
+        try:
+            conn.executemany('''
+                INSERT OR REPLACE INTO kline_bars (type_val, ts, open, high, low, close, volume)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            conn.execute('''
+                INSERT INTO kline_sync (type_val, last_sync, synced_end) VALUES (?, ?, ?)
+                ON CONFLICT (type_val) DO UPDATE SET
+                    last_sync = excluded.last_sync,
+                    synced_end = MAX(COALESCE(kline_sync.synced_end, 0), COALESCE(excluded.synced_end, 0))
+            ''', (type_val, int(time.time()), synced_end))
+            conn.commit()
+            return len(rows)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def is_covered(self, synced_end, end_date=None, max_age=None, now=None):
+        """
+        判断本地数据是否已覆盖请求的时间范围，无需访问接口
+
+        历史区间要求已同步到区间结束；包含最新数据的区间允许本地数据落后不超过 max_age 秒。
+        """
+        if synced_end is None:
+            return False
+        max_age = self.max_age if max_age is None else max_age
+        now = int(time.time()) if now is None else now
+        return synced_end >= min(_range_end_ts(end_date, now), now - max_age)
+
+    def fetch_kline(self, url, start_date=None, end_date=None, max_age=None):
+        """
+        通过本地存储获取K线：覆盖时直接读取，否则只把更新的K线合并进来
+
+        返回结构与 kline_data.fetch_kline 相同，可直接替换使用。
+        """
+        started = time.perf_counter()
+        type_val = get_type_val(url)
+        synced_end, last_ts = self.get_sync_state(type_val)
+
+        attempts = 0
+        if not self.is_covered(synced_end, end_date, max_age):
+            # 接口只支持按maxTime截止获取，一次返回截止时间前的完整序列；
+            # 本地已有数据时只解析最后一根K线当天及之后的部分（最后一根K线可能在盘中被更新）
+            fetch_started = int(time.time())
+            since_date = datetime.fromtimestamp(last_ts).strftime('%Y-%m-%d') if last_ts is not None else None
+            result = kline_data.fetch_kline(url, since_date, end_date)
+            attempts = result['attempts']
+            if not result['success']:
+                if last_ts is None:
+                    return result
+                # 接口失败时退回本地已有数据
+            else:
+                self.merge(type_val, result['data'], since_ts=last_ts,
+                           synced_end=_range_end_ts(end_date, fetch_started))
+
+        kline_df = self.load(type_val, start_date, end_date)
+        latency = time.perf_counter() - started
+        if kline_df.empty:
+            return {
+                'success': False,
+                'data': kline_df,
+                'error': "⚠️ 指定时间范围内无数据，请调整时间范围",
+                'level': 'warning',
+                'latency': latency,
+                'attempts': attempts
+            }
+
+        return {
+            'success': True,
+            'data': kline_df,
+            'error': None,
+            'level': None,
+            'latency': latency,
+            'attempts': attempts
+        }
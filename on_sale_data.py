@@ -2,7 +2,14 @@ import requests
 import json
 from datetime import datetime
 import pandas as pd
-import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import http_client
+from symbol_registry import ITEM_ID_MAP, ON_SALE_URL_MAP
+
+# 批量获取在售数据的默认速率上限（请求/秒）和并发数
+DEFAULT_RATE_LIMIT = 10.0
+DEFAULT_MAX_WORKERS = http_client.DEFAULT_PER_HOST_LIMIT
 
 def get_on_sale_data(item_id):
     """
@@ -20,7 +27,7 @@ def get_on_sale_data(item_id):
         url = f"https://sdt-api.ok-skins.com/user/skin/v1/current-sell?timestamp={timestamp}&itemId={item_id}"
         
         # 发送请求
-        response = requests.get(url, timeout=10)
+        response = http_client.get_client().get(url, timeout=10)
         response.raise_for_status()
         
         data = response.json()
@@ -156,34 +163,13 @@ def get_trading_recommendation(supply_score):
     else:
         return "供应过剩，建议避免买入，价格可能下跌"
 
-# 物品ID映射表（从on-sale-data.txt更新）
-ITEM_ID_MAP = {
-    "树篱迷宫（久经沙场）": "525873303",
-    "克拉考": "1315936965627445248", 
-    "怪兽在b": "1315999843394654208",
-    "水栽竹": "26422",
-    "tyloo": "925497374167523328",
-    "出逃的萨利": "808803044176429056",
-    # 保留原有的示例映射
-    "Lynn Vision (Gold)": "1244761416324870144",
-}
-
-# 在售数据URL映射表（从on-sale-data.txt提取）
-ON_SALE_URL_MAP = {
-    "树篱迷宫（久经沙场）": "https://sdt-api.ok-skins.com/user/skin/v1/current-sell?timestamp=1749039724950&itemId=525873303",
-    "克拉考": "https://sdt-api.ok-skins.com/user/skin/v1/current-sell?timestamp=1749039969883&itemId=1315936965627445248",
-    "怪兽在b": "https://sdt-api.ok-skins.com/user/skin/v1/current-sell?timestamp=1749039994465&itemId=1315999843394654208",
-    "水栽竹": "https://sdt-api.ok-skins.com/user/skin/v1/current-sell?timestamp=1749040017058&itemId=26422",
-    "tyloo": "https://sdt-api.ok-skins.com/user/skin/v1/current-sell?timestamp=1749040047017&itemId=925497374167523328",
-    "出逃的萨利": "https://sdt-api.ok-skins.com/user/skin/v1/current-sell?timestamp=1749040067008&itemId=808803044176429056"
-}
-
-def get_on_sale_data_by_url(item_name):
+def get_on_sale_data_by_url(item_name, limiter=None):
     """
     根据物品名称使用预设URL获取在售量数据
     
     Args:
         item_name (str): 物品名称
+        limiter (TokenBucket): 限速器，每次发出请求（包括重试）前取一个令牌
         
     Returns:
         dict: 在售量数据
@@ -197,7 +183,7 @@ def get_on_sale_data_by_url(item_name):
     
     try:
         # 发送请求
-        response = requests.get(url, timeout=10)
+        response = http_client.get_client().get(url, timeout=10, limiter=limiter)
         response.raise_for_status()
         
         data = response.json()
@@ -230,26 +216,62 @@ def get_all_available_items():
     """
     return list(ON_SALE_URL_MAP.keys())
 
-def batch_get_on_sale_data(item_names=None):
+def iter_on_sale_data(item_names=None, rate=DEFAULT_RATE_LIMIT, max_workers=DEFAULT_MAX_WORKERS, burst=1,
+                      fetch=None):
+    """
+    并发获取在售量数据，按完成顺序逐个返回
+    
+    请求速率由令牌桶限制在 rate 次/秒以内（429等重试同样计入），接口响应快时吞吐量接近上限，
+    响应慢时由并发数补足。
+    
+    Args:
+        item_names (list): 物品名称列表，如果为None则获取所有物品
+        rate (float): 每秒最多发起的请求数
+        max_workers (int): 最大并发数
+        burst (int): 允许的瞬时突发请求数
+        fetch (callable): 单个物品的获取函数 fetch(item_name, limiter)，默认为 get_on_sale_data_by_url；
+            需在每次发出请求前调用 limiter.acquire()
+        
+    Yields:
+        tuple: (物品名称, 在售量数据)
+    """
+    if item_names is None:
+        item_names = get_all_available_items()
+    if not item_names:
+        return
+    fetch = fetch or get_on_sale_data_by_url
+    bucket = http_client.TokenBucket(rate, burst)
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(item_names)))) as executor:
+        futures = {executor.submit(fetch, item_name, bucket): item_name for item_name in item_names}
+        for future in as_completed(futures):
+            item_name = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {
+                    'success': False,
+                    'error': f"数据获取失败: {str(e)}"
+                }
+            yield item_name, result
+
+def batch_get_on_sale_data(item_names=None, rate=DEFAULT_RATE_LIMIT, max_workers=DEFAULT_MAX_WORKERS):
     """
-    批量获取在售量数据
+    批量获取在售量数据（并发请求，速率不超过 rate 次/秒）
     
     Args:
         item_names (list): 物品名称列表，如果为None则获取所有物品
+        rate (float): 每秒最多发起的请求数
+        max_workers (int): 最大并发数
         
     Returns:
-        dict: 批量在售量数据
+        dict: 批量在售量数据，按 item_names 的顺序排列
     """
     if item_names is None:
         item_names = get_all_available_items()
-    
-    results = {}
-    for item_name in item_names:
-        results[item_name] = get_on_sale_data_by_url(item_name)
-        # 添加小延迟避免请求过于频繁
-        time.sleep(0.1)
-    
-    return results 
+    results = dict(iter_on_sale_data(item_names, rate=rate, max_workers=max_workers))
+    return {item_name: results[item_name] for item_name in item_names}
+
 
 def get_item_id(item_name):
     """
@@ -839,45 +861,3 @@ def calculate_volatility(data):
     volatility = variance ** 0.5
     
     return volatility
-
-def simulate_historical_data(item_name, days=7):
-    """
-    模拟历史数据（用于演示，实际应用中需要真实的历史数据）
-    
-    Args:
-        item_name (str): 物品名称
-        days (int): 模拟天数
-        
-    Returns:
-        list: 模拟的历史数据
-    """
-    import random
-    from datetime import datetime, timedelta
-    
-    # 获取当前数据作为基准
-    current_data = get_on_sale_data_by_url(item_name)
-    if not current_data.get('success'):
-        return []
-    
-    base_count = current_data['total_on_sale']
-    base_price = min([p['min_price'] for p in current_data['platforms'] if p['min_price'] > 0], default=1000)
-    
-    historical_data = []
-    
-    for i in range(days):
-        date = (datetime.now() - timedelta(days=days-i-1)).strftime('%Y-%m-%d')
-        
-        # 模拟数据变化
-        count_variation = random.uniform(-0.2, 0.2)  # ±20%变化
-        price_variation = random.uniform(-0.1, 0.1)  # ±10%变化
-        
-        simulated_count = int(base_count * (1 + count_variation))
-        simulated_price = base_price * (1 + price_variation)
-        
-        historical_data.append({
-            'date': date,
-            'on_sale_count': simulated_count,
-            'min_price': simulated_price
-        })
-    
-    return historical_data 
\ No newline at end of file
@@ -2,6 +2,7 @@ import streamlit as st
 from datetime import datetime, timedelta
 import on_sale_data
 import market_data_integration
+from on_sale_store import OnSaleStore
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
@@ -123,7 +124,7 @@ def market_behavior_analysis():
     - **行情阶段判断：** 判断行情的启动、加速、顶部、结束等阶段
     - **交易信号提示：** 基于分析结果提供交易建议和风险提示
     
-    **📊 数据来源：** 实时在售量数据
+    **📊 数据来源：** 本地记录的在售量历史快照
     """)
     
     # 分析参数设置
@@ -159,8 +160,8 @@ def market_behavior_analysis():
     
     with col4:
         st.markdown("**📈 数据来源**")
-        st.info("实时API数据")
-        st.caption("数据更新频率：实时")
+        st.info("本地历史快照")
+        st.caption("数据更新频率：每小时")
     
     with col5:
         # 分析按钮
@@ -183,11 +184,15 @@ def market_behavior_analysis():
 
 def perform_market_behavior_analysis(item_name, days):
     """执行主力行为分析"""
-    # 获取历史数据（这里使用模拟数据，实际应用中需要真实历史数据）
-    historical_data = on_sale_data.simulate_historical_data(item_name, days)
+    # 从本地快照读取历史数据（由应用启动时开始的后台采集写入），页面渲染时不请求接口
+    store = OnSaleStore()
+    historical_data = store.get_history(item_name, days)
+    if len(historical_data) < 3:
+        # 记录天数不足时按每次采集分析
+        historical_data = store.get_history(item_name, days, granularity='snapshot')
     
     if not historical_data:
-        st.error("❌ 无法获取历史数据")
+        st.error("❌ 暂无历史快照数据，后台每小时采集一次，请稍后再试")
         return
     
     # 进行主力行为分析
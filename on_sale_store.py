@@ -0,0 +1,196 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import on_sale_data
+
+# 快照的默认采集周期（秒）
+DEFAULT_RECORD_INTERVAL = 3600
+# 采集时的请求速率上限（请求/秒）
+DEFAULT_RECORD_RATE = 2.0
+
+
+class OnSaleStore:
+    """
+    本地在售量快照存储
+
+    每次采集把各平台的在售量(sellCount)和最低价(price)按 (物品, 采集时间, 平台) 追加写入，
+    已有记录不会被修改。按 (物品, 时间) 的主键范围查询，读取N天历史不需要访问接口。
+    """
+
+    def __init__(self, db_path: str = "on_sale_snapshots.db"):
+        self.db_path = db_path
+        self.init_database()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def init_database(self):
+        """初始化快照表"""
+        conn = self._connect()
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS on_sale_snapshots (
+                item_name TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                platform TEXT NOT NULL,
+                sell_count INTEGER NOT NULL,
+                price REAL,
+                PRIMARY KEY (item_name, ts, platform)
+            ) WITHOUT ROWID
+        ''')
+
+        conn.commit()
+        conn.close()
+
+    def record(self, item_name, on_sale_result, ts=None):
+        """
+        写入一次采集结果
+
+        Args:
+            item_name (str): 物品名称
+            on_sale_result (dict): on_sale_data.get_on_sale_data_by_url 的返回值
+            ts (int): 采集时间戳，默认为当前时间
+
+        Returns:
+            int: 写入的平台记录数，采集失败时为0
+        """
+        if not on_sale_result.get('success'):
+            return 0
+        ts = int(time.time()) if ts is None else int(ts)
+        rows = [
+            (item_name, ts, p['platform'], int(p['on_sale_count'] or 0), p['min_price'])
+            for p in on_sale_result.get('platforms', [])
+        ]
+
+        conn = self._connect()
+        try:
+            conn.executemany('''
+                INSERT OR IGNORE INTO on_sale_snapshots (item_name, ts, platform, sell_count, price)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows)
+            conn.commit()
+            return len(rows)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def record_all(self, item_names=None, rate=DEFAULT_RECORD_RATE):
+        """
+        采集并写入一批物品的在售量快照（同一批使用相同的采集时间）
+
+        Returns:
+            dict: {'recorded': 成功的物品数, 'failed': {物品名称: 错误信息}}
+        """
+        ts = int(time.time())
+        recorded = 0
+        failed = {}
+        for item_name, result in on_sale_data.iter_on_sale_data(item_names, rate=rate):
+            if result.get('success'):
+                self.record(item_name, result, ts)
+                recorded += 1
+            else:
+                failed[item_name] = result.get('error', '未知错误')
+        return {'recorded': recorded, 'failed': failed}
+
+    def get_snapshots(self, item_name, start_ts=0, end_ts=2 ** 62):
+        """
+        读取各次采集的汇总值
+
+        Returns:
+            list: [(ts, 各平台在售量合计, 各平台最低价), ...]，按时间升序
+        """
+        conn = self._connect()
+        try:
+            return conn.execute('''
+                SELECT ts, SUM(sell_count), MIN(CASE WHEN price > 0 THEN price END)
+                FROM on_sale_snapshots
+                WHERE item_name = ? AND ts >= ? AND ts < ?
+                GROUP BY ts
+                ORDER BY ts
+            ''', (item_name, start_ts, end_ts)).fetchall()
+        finally:
+            conn.close()
+
+    def get_history(self, item_name, days=7, granularity='day', now=None):
+        """
+        获取最近N天的在售量和价格历史
+
+        Args:
+            item_name (str): 物品名称
+            days (int): 天数（包含今天）
+            granularity (str): 'day' 每天取当天最后一次采集，'snapshot' 返回每次采集
+            now (datetime): 当前时间，默认为 datetime.now()
+
+        Returns:
+            list: [{'date', 'on_sale_count', 'min_price'}, ...]，格式与 analyze_market_behavior 的输入一致
+        """
+        now = now or datetime.now()
+        start = datetime(now.year, now.month, now.day) - timedelta(days=days - 1)
+        date_format = '%Y-%m-%d' if granularity == 'day' else '%Y-%m-%d %H:%M'
+
+        history = {}
+        for ts, on_sale_count, min_price in self.get_snapshots(item_name, int(start.timestamp())):
+            date = datetime.fromtimestamp(ts).strftime(date_format)
+            # 按时间升序遍历，同一天后面的采集覆盖前面的
+            history[date] = {
+                'date': date,
+                'on_sale_count': on_sale_count,
+                'min_price': min_price or 0
+            }
+        return list(history.values())
+
+
+class SnapshotRecorder:
+    """后台定时采集在售量快照"""
+
+    def __init__(self, store, item_names=None, interval=DEFAULT_RECORD_INTERVAL, rate=DEFAULT_RECORD_RATE):
+        """
+        Args:
+            store (OnSaleStore): 快照存储
+            item_names (list): 采集的物品，默认为全部可用物品
+            interval (int): 采集周期（秒）
+            rate (float): 采集时的请求速率上限（请求/秒）
+        """
+        self.store = store
+        self.item_names = item_names
+        self.interval = interval
+        self.rate = rate
+        self.last_record = None
+        self.last_stats = {}
+        self._stop_event = threading.Event()
+        self._worker = None
+
+    def record_once(self):
+        self.last_stats = self.store.record_all(self.item_names, rate=self.rate)
+        self.last_record = datetime.now()
+        return self.last_stats
+
+    def start(self):
+        """启动后台采集线程（重复调用无副作用）"""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._stop_event.clear()
+        self._worker = threading.Thread(target=self._run, name='on-sale-recorder', daemon=True)
+        self._worker.start()
+
+    def stop(self, timeout=None):
+        """停止后台采集线程"""
+        self._stop_event.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+
+    def is_running(self):
+        return self._worker is not None and self._worker.is_alive()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.record_once()
+            except Exception as e:
+                print(f"在售量快照采集失败: {str(e)}")
+            self._stop_event.wait(self.interval)
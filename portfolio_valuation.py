@@ -0,0 +1,117 @@
+import math
+
+
+class PortfolioValuation:
+    """
+    投资组合估值（增量维护）
+
+    按标的保存持仓数量、持仓均价、最新价格、市值、成本和盈亏，并维护整个组合的市值和成本合计。
+    价格变动（on_price）和成交（on_fill）只调整对应标的对合计值的贡献，
+    页面读取 total_value、total_pnl 等合计值都是 O(1)。
+    增量加减的浮点误差会逐渐累积，重建（from_portfolio）和 resync 时按各标的重新精确求和。
+    """
+
+    def __init__(self, cash=0.0, source=None):
+        """
+        Args:
+            cash (float): 现金
+            source (dict): 估值对应的账户数据（session_state.portfolio），用于判断账户是否已重新加载
+        """
+        self.cash = cash
+        self.source = source
+        # symbol -> {'quantity', 'avg_price', 'price', 'market_value', 'cost_value', 'pnl_amount', 'pnl_percent'}
+        self.positions = {}
+        self.market_value = 0.0
+        self.cost_value = 0.0
+        # 最近一次应用的价格快照版本
+        self.price_version = None
+
+    @classmethod
+    def from_portfolio(cls, portfolio, price_of):
+        """
+        Args:
+            portfolio (dict): 账户数据
+            price_of (callable): symbol -> 当前价格
+        """
+        valuation = cls(portfolio.get('cash', 0.0), source=portfolio)
+        for symbol, position in portfolio.get('positions', {}).items():
+            valuation.on_fill(symbol, position['quantity'], position['avg_price'], price_of(symbol))
+        valuation.resync()
+        return valuation
+
+    def resync(self):
+        """按各标的的市值和成本重新求和，消除增量更新累积的浮点误差"""
+        self.market_value = math.fsum(entry['market_value'] for entry in self.positions.values())
+        self.cost_value = math.fsum(entry['cost_value'] for entry in self.positions.values())
+
+    def _remove(self, symbol):
+        entry = self.positions.pop(symbol, None)
+        if entry is not None:
+            self.market_value -= entry['market_value']
+            self.cost_value -= entry['cost_value']
+        return entry
+
+    def _put(self, symbol, quantity, avg_price, price):
+        market_value = quantity * price
+        cost_value = quantity * avg_price
+        pnl_amount = market_value - cost_value
+        self.positions[symbol] = {
+            'quantity': quantity,
+            'avg_price': avg_price,
+            'price': price,
+            'market_value': market_value,
+            'cost_value': cost_value,
+            'pnl_amount': pnl_amount,
+            'pnl_percent': (pnl_amount / cost_value) * 100 if cost_value > 0 else 0
+        }
+        self.market_value += market_value
+        self.cost_value += cost_value
+
+    def on_price(self, symbol, price):
+        """价格变动：只更新该标的的市值和盈亏"""
+        entry = self.positions.get(symbol)
+        if entry is None or entry['price'] == price:
+            return
+        self._remove(symbol)
+        self._put(symbol, entry['quantity'], entry['avg_price'], price)
+
+    def on_fill(self, symbol, quantity, avg_price, price=None, cash=None):
+        """
+        成交后更新该标的的持仓
+
+        Args:
+            quantity (int): 成交后的持仓数量，为0时移除该标的
+            avg_price (float): 成交后的持仓均价
+            price (float): 当前价格，默认沿用已有价格（新标的使用持仓均价）
+            cash (float): 成交后的现金
+        """
+        entry = self._remove(symbol)
+        if price is None:
+            price = entry['price'] if entry is not None else avg_price
+        if quantity > 0:
+            self._put(symbol, quantity, avg_price, price)
+        if cash is not None:
+            self.cash = cash
+
+    @property
+    def total_value(self):
+        return self.cash + self.market_value
+
+    @property
+    def total_pnl(self):
+        """持仓浮动盈亏"""
+        return self.market_value - self.cost_value
+
+    @property
+    def total_pnl_percent(self):
+        return (self.total_pnl / self.cost_value) * 100 if self.cost_value > 0 else 0
+
+    def position(self, symbol):
+        """
+        Returns:
+            tuple: (market_value, pnl_amount, pnl_percent)，未持有时为 (0, 0, 0)
+        """
+        entry = self.positions.get(symbol)
+        if entry is None:
+            return 0, 0, 0
+        return entry['market_value'], entry['pnl_amount'], entry['pnl_percent']
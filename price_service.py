@@ -0,0 +1,188 @@
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+import kline_data
+
+# 默认刷新周期（秒）
+DEFAULT_INTERVAL = 60
+# 超过该时长未更新的价格视为过期（秒）
+DEFAULT_TTL = 180
+# 未获取到价格时使用的默认价格
+DEFAULT_PRICE = 100.0
+# 刷新周期的随机抖动比例，避免多个进程同时请求上游
+DEFAULT_JITTER = 0.1
+# 单个标的连续失败后的最长退避时间（秒）
+MAX_BACKOFF = 600
+
+
+class PriceService:
+    """
+    进程级共享价格服务
+
+    所有Streamlit会话共用同一份价格快照，每个刷新周期最多请求一次上游接口，
+    上游请求量与在线用户数无关。调用 start() 后由后台线程定时刷新，
+    页面渲染只读取已发布的快照，不会阻塞在网络请求上。
+    """
+
+    def __init__(self, symbols, fetch=None, interval=DEFAULT_INTERVAL, ttl=DEFAULT_TTL,
+                 jitter=DEFAULT_JITTER, max_backoff=MAX_BACKOFF, indicators=None, clock=time.time):
+        """
+        Args:
+            symbols (dict): symbol -> K线URL模板
+            fetch (callable): 单标的获取函数，默认直接请求接口
+            interval (int): 刷新周期（秒）
+            ttl (int): 价格有效期（秒），超过后标记为过期
+            jitter (float): 刷新周期的随机抖动比例
+            max_backoff (int): 单个标的失败后的最长退避时间（秒）
+            indicators (IndicatorEngine): 增量指标引擎，刷新价格时同步更新各标的的最新指标
+            clock (callable): 返回当前Unix时间戳（秒）的函数
+        """
+        self.symbols = dict(symbols)
+        self.fetch = fetch
+        self.interval = interval
+        self.ttl = ttl
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.indicators = indicators
+        self.clock = clock
+        self.last_refresh = None
+        self.last_stats = {}
+        self.refresh_count = 0
+        # 快照整体替换发布，读取方无需加锁
+        self._prices = {}
+        self._refresh_lock = threading.Lock()
+        # 单个标的的失败次数和下次允许请求的时间
+        self._failures = {}
+        self._retry_at = {}
+        self._stop_event = threading.Event()
+        self._worker = None
+
+    def refresh(self):
+        """
+        立即从上游刷新全部价格
+
+        Returns:
+            int: 成功更新的标的数量
+        """
+        now_ts = self.clock()
+        current_time = datetime.fromtimestamp(now_ts)
+        end_date = current_time.strftime('%Y-%m-%d')
+        start_date = (current_time - timedelta(days=1)).strftime('%Y-%m-%d')
+
+        # 处于退避期的标的本轮跳过，沿用上一次的价格
+        due_symbols = {symbol: url for symbol, url in self.symbols.items()
+                       if self._retry_at.get(symbol, 0) <= now_ts}
+        batch = kline_data.get_klines_bulk(due_symbols, start_date, end_date, fetch=self.fetch)
+
+        prices = dict(self._prices)
+        updated_count = 0
+        for symbol, kline_df in batch.items():
+            if not kline_df.empty:
+                prices[symbol] = {
+                    'price': kline_df['close'].iloc[-1],
+                    'update_time': current_time,
+                    'status': 'success'
+                }
+                updated_count += 1
+                self._failures.pop(symbol, None)
+                self._retry_at.pop(symbol, None)
+                if self.indicators is not None:
+                    try:
+                        self.indicators.update(symbol, kline_df)
+                    except Exception as e:
+                        print(f"{symbol} 指标更新失败: {str(e)}")
+                continue
+
+            if symbol in batch.errors:
+                self._backoff(symbol, now_ts)
+            if symbol in prices:
+                # 保留上一次的价格，仅标记状态
+                prices[symbol] = dict(prices[symbol], status='error' if symbol in batch.errors else 'no_data')
+            else:
+                prices[symbol] = {
+                    'price': DEFAULT_PRICE,
+                    'update_time': current_time,
+                    'status': 'error' if symbol in batch.errors else 'no_data'
+                }
+
+        self._prices = prices
+        self.last_stats = batch.summary()
+        self.last_refresh = current_time
+        self.refresh_count += 1
+        return updated_count
+
+    def _backoff(self, symbol, now_ts):
+        """记录失败并按指数退避推迟该标的的下次请求"""
+        failures = self._failures.get(symbol, 0) + 1
+        self._failures[symbol] = failures
+        delay = min(self.max_backoff, self.interval * (2 ** (failures - 1)))
+        self._retry_at[symbol] = now_ts + delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def next_delay(self):
+        """下一次刷新前的等待时间（带随机抖动）"""
+        return self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def start(self):
+        """启动后台刷新线程（重复调用无副作用）"""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._stop_event.clear()
+        self._worker = threading.Thread(target=self._run, name='price-refresh', daemon=True)
+        self._worker.start()
+
+    def stop(self, timeout=None):
+        """停止后台刷新线程"""
+        self._stop_event.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+
+    def is_running(self):
+        return self._worker is not None and self._worker.is_alive()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                with self._refresh_lock:
+                    self.refresh()
+            except Exception as e:
+                print(f"价格刷新失败: {str(e)}")
+            self._stop_event.wait(self.next_delay())
+
+    def _with_staleness(self, entry, now):
+        age = (now - entry['update_time']).total_seconds()
+        return dict(entry, age=age, stale=entry['status'] != 'success' or age > self.ttl)
+
+    def get_price(self, symbol):
+        """
+        获取单个标的的价格信息
+
+        Returns:
+            dict: {'price', 'update_time', 'status', 'age', 'stale'}，未知标的返回None
+        """
+        entry = self._prices.get(symbol)
+        if entry is None:
+            return None
+        return self._with_staleness(entry, datetime.fromtimestamp(self.clock()))
+
+    def get_indicators(self, symbol):
+        """获取标的最新一根K线的指标值，未启用指标引擎或尚未同步时返回None"""
+        if self.indicators is None:
+            return None
+        return self.indicators.latest(symbol)
+
+    def get_current_price(self, symbol):
+        """获取单个标的的价格，未知标的返回None"""
+        entry = self._prices.get(symbol)
+        return entry['price'] if entry else None
+
+    def snapshot(self):
+        """
+        获取全部价格的快照
+
+        Returns:
+            dict: symbol -> {'price', 'update_time', 'status', 'age', 'stale'}
+        """
+        now = datetime.fromtimestamp(self.clock())
+        return {symbol: self._with_staleness(entry, now) for symbol, entry in self._prices.items()}
@@ -0,0 +1,815 @@
+import hashlib
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+import backtest_engine
+
+# 每个进程任务包含的参数组合数（任务内批量回测）
+DEFAULT_CHUNK_SIZE = 1024
+# 待计算组合数少于该值时直接在当前进程计算（进程调度开销大于收益）
+MIN_PARALLEL_COMBOS = 4096
+# 回测结果需超过该K线数才计入优化结果
+MIN_RESULT_BARS = 10
+# 结果缓存的最大条目数
+DEFAULT_CACHE_SIZE = 200000
+
+PARAM_NAMES = ('k0', 'bias_th', 'sell_days', 'sell_drop_th')
+
+# 搜索方式：key -> 页面显示名称
+SEARCH_MODES = {
+    'grid': '网格搜索（全部组合）',
+    'random': '随机搜索',
+    'halving': '逐次减半',
+    'tpe': 'TPE贝叶斯优化',
+    'coordinate': '坐标下降',
+}
+# 非网格搜索的默认回测次数预算
+DEFAULT_BUDGET = 300
+# 连续多少轮没有提升时提前停止
+DEFAULT_PATIENCE = 4
+# Sharpe提升超过该值才算有效提升
+MIN_IMPROVEMENT = 1e-3
+# 随机搜索和TPE每轮评估的组合数
+ROUND_SIZE = 32
+# 逐次减半：每轮保留 1/HALVING_ETA 的候选，K线窗口扩大 HALVING_ETA 倍
+HALVING_ETA = 3
+HALVING_ROUNDS = 3
+# TPE：好结果的比例、每轮采样的候选数、先验权重
+TPE_GAMMA = 0.25
+TPE_CANDIDATES = 256
+TPE_PRIOR_WEIGHT = 1.0
+
+_MISSING = object()
+
+
+class ResultCache:
+    """回测结果缓存：(symbol, 数据哈希, 指标哈希, 参数) -> 绩效记录，超过容量时淘汰最久未使用的条目"""
+
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# 进程内共享的结果缓存（Streamlit重跑脚本时保留）
+RESULT_CACHE = ResultCache()
+
+_executor = None
+_executor_workers = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(max_workers=None):
+    """
+    获取共享的进程池（重复调用复用同一个进程池）
+
+    工作进程用spawn方式启动：Streamlit进程中有价格刷新、快照采集等后台线程，
+    fork会把其他线程持有的锁原样复制到子进程，可能导致子进程死锁。
+
+    Args:
+        max_workers (int): 进程数，默认为CPU核数
+
+    Returns:
+        ProcessPoolExecutor: 进程池
+    """
+    global _executor, _executor_workers
+    max_workers = max_workers or os.cpu_count() or 1
+    with _executor_lock:
+        if _executor is None or _executor_workers != max_workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+            _executor_workers = max_workers
+        return _executor
+
+
+def _reset_executor():
+    """进程池损坏后丢弃，下次调用时重建"""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = None
+        _executor_workers = None
+
+
+def data_hash(kline_df):
+    """计算K线数据的哈希（收盘价及其时间索引）"""
+    hashed = pd.util.hash_pandas_object(kline_df['close'], index=True)
+    return hashlib.sha1(hashed.to_numpy().tobytes()).hexdigest()
+
+
+def indicators_hash(indicators):
+    """
+    计算预计算指标的哈希
+
+    同一段K线的指标可能来自更长的历史（开头的均线已有效）或单独计算（开头为NaN），两者的结果不能共用缓存。
+    """
+    digest = hashlib.sha1()
+    for key in sorted(indicators):
+        digest.update(key.encode())
+        digest.update(np.ascontiguousarray(indicators[key], dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def build_param_axes(k0_range, bias_th_range, sell_days_range, sell_drop_range):
+    """
+    按页面设置的参数范围生成每个参数的取值
+
+    Args:
+        k0_range (tuple): K因子范围，步长0.5
+        bias_th_range (tuple): 偏离阈值范围，步长0.01
+        sell_days_range (tuple): 观察天数范围，步长1
+        sell_drop_range (tuple): 止损阈值范围，步长0.01
+
+    Returns:
+        tuple: 按 PARAM_NAMES 顺序的四个取值列表
+    """
+    k0_values = np.arange(k0_range[0], k0_range[1] + 0.5, 0.5)
+    bias_th_values = np.arange(bias_th_range[0], bias_th_range[1] + 0.01, 0.01)
+    sell_days_values = range(int(sell_days_range[0]), int(sell_days_range[1]) + 1)
+    sell_drop_values = np.arange(sell_drop_range[0], sell_drop_range[1] + 0.01, 0.01)
+
+    return (
+        [float(k0) for k0 in k0_values],
+        [float(bias_th) for bias_th in bias_th_values],
+        [int(sell_days) for sell_days in sell_days_values],
+        [float(sell_drop_th) for sell_drop_th in sell_drop_values],
+    )
+
+
+def build_param_grid(k0_range, bias_th_range, sell_days_range, sell_drop_range):
+    """
+    按页面设置的参数范围生成完整的参数网格（不做采样）
+
+    Returns:
+        list: (k0, bias_th, sell_days, sell_drop_th) 元组列表
+    """
+    axes = build_param_axes(k0_range, bias_th_range, sell_days_range, sell_drop_range)
+    return list(itertools.product(*axes))
+
+
+def _make_record(params, metrics):
+    record = dict(zip(PARAM_NAMES, params))
+    record.update({
+        'sharpe': metrics.get('Sharpe', -999),
+        'total_return': metrics.get('总收益率', 0),
+        'annual_return': metrics.get('年化收益', 0),
+        'max_drawdown': metrics.get('最大回撤', 0),
+        'metrics': metrics
+    })
+    return record
+
+
+def evaluate_params(indicators, params):
+    """
+    在预计算指标上回测一组参数
+
+    Returns:
+        dict: 优化结果记录（参数、sharpe、收益、回撤及完整metrics），出错时返回None
+    """
+    try:
+        result = backtest_engine.run_backtest(indicators, *params)
+        metrics = backtest_engine.get_risk_metrics_array(result['ret'])
+    except Exception:
+        return None  # 忽略单个参数组合的错误
+    return _make_record(params, metrics)
+
+
+def _evaluate_chunk(indicators, chunk):
+    """进程池任务：一次批量回测一组参数组合"""
+    try:
+        result = backtest_engine.run_backtest_batch(indicators, chunk)
+        metrics = backtest_engine.get_risk_metrics_array(result['ret'])
+    except Exception:
+        # 批量计算出错时逐组回测，只丢弃出错的组合
+        return [evaluate_params(indicators, params) for params in chunk]
+
+    return [
+        _make_record(params, {key: values[row] for key, values in metrics.items()})
+        for row, params in enumerate(chunk)
+    ]
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _sharpe_key(record):
+    """用于排序的Sharpe（失败或无效的结果排在最后）"""
+    if record is None or not np.isfinite(record['sharpe']):
+        return -np.inf
+    return record['sharpe']
+
+
+def _best_params(records):
+    """按顺序选出Sharpe最高的参数（Sharpe相同时保留先出现的组合）"""
+    best_params = None
+    best_sharpe = -999
+    for record in records:
+        if record is not None and record['sharpe'] > best_sharpe:
+            best_sharpe = record['sharpe']
+            best_params = {name: record[name] for name in PARAM_NAMES}
+            best_params['metrics'] = record['metrics']
+    return best_params
+
+
+class Evaluator:
+    """
+    在一份K线数据上批量评估参数组合
+
+    指标只计算一次；结果按(symbol, 数据哈希, 指标哈希, 参数)缓存；待计算组合较多时分批交给进程池。
+    """
+
+    def __init__(self, kline_df, symbol=None, cache=None, max_workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 indicators=None):
+        """
+        Args:
+            indicators (dict): 与kline_df对应的预计算指标（如从完整历史截取的一段），默认重新计算
+        """
+        self.cache = RESULT_CACHE if cache is None else cache
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.evaluated = 0
+        self.cached = 0
+        # K线数量不足时所有组合都没有有效结果
+        self.usable = len(kline_df) - backtest_engine.START_INDEX > MIN_RESULT_BARS
+        self.indicators = None
+        if self.usable:
+            if indicators is None:
+                indicators = backtest_engine.prepare_indicators(kline_df['close'])
+            self.indicators = indicators
+            self.prefix = (symbol, data_hash(kline_df), indicators_hash(indicators))
+
+    def evaluate(self, param_list, report=None):
+        """
+        评估一组参数
+
+        Args:
+            param_list (list): (k0, bias_th, sell_days, sell_drop_th) 元组列表
+            report (callable): 每完成一批时调用 report(本批组合数)
+
+        Returns:
+            list: 与param_list一一对应的优化结果记录，出错的组合为None
+        """
+        records = [None] * len(param_list)
+        if not self.usable:
+            if report is not None:
+                report(len(param_list))
+            return records
+
+        pending = []
+        for idx, params in enumerate(param_list):
+            cached = self.cache.get(self.prefix + (params,), _MISSING)
+            if cached is _MISSING:
+                pending.append(idx)
+            else:
+                records[idx] = cached
+        self.cached += len(param_list) - len(pending)
+        self.evaluated += len(pending)
+        if report is not None:
+            report(len(param_list) - len(pending))
+
+        def store(indices, chunk_records):
+            for idx, record in zip(indices, chunk_records):
+                records[idx] = record
+                self.cache.put(self.prefix + (param_list[idx],), record)
+            if report is not None:
+                report(len(indices))
+
+        remaining = pending
+        if len(pending) >= MIN_PARALLEL_COMBOS and self.max_workers > 1:
+            finished = set()
+            try:
+                executor = get_executor(self.max_workers)
+                futures = {}
+                for indices in _chunks(pending, self.chunk_size):
+                    chunk = [param_list[idx] for idx in indices]
+                    futures[executor.submit(_evaluate_chunk, self.indicators, chunk)] = indices
+                for future in as_completed(futures):
+                    store(futures[future], future.result())
+                    finished.update(futures[future])
+                remaining = []
+            except (BrokenProcessPool, OSError):
+                # 进程池不可用时退回当前进程计算未完成的组合
+                _reset_executor()
+                remaining = [idx for idx in pending if idx not in finished]
+
+        for indices in _chunks(remaining, self.chunk_size):
+            store(indices, _evaluate_chunk(self.indicators, [param_list[idx] for idx in indices]))
+        return records
+
+
+def optimize(kline_df, param_grid, symbol=None, progress=None, max_workers=None,
+             chunk_size=DEFAULT_CHUNK_SIZE, cache=None):
+    """
+    并行搜索参数网格，返回Sharpe最高的参数
+
+    均线等指标只计算一次，参数组合分批交给进程池，每批在一次向量化回测中完成；结果按(symbol, 数据哈希, 指标哈希, 参数)缓存，
+    同一份数据再次优化时只计算新增的组合。
+
+    Args:
+        kline_df (pd.DataFrame): 优化用的K线数据
+        param_grid (list): (k0, bias_th, sell_days, sell_drop_th) 元组列表
+        symbol (str): 标的名称（缓存键的一部分）
+        progress (callable): 进度回调 progress(已完成数, 总数)，在调用线程中执行
+        max_workers (int): 进程数，默认为CPU核数，1表示不使用进程池
+        chunk_size (int): 每个进程任务包含的参数组合数
+        cache (ResultCache): 结果缓存，默认为进程内共享缓存
+
+    Returns:
+        dict: {'best_params', 'results', 'evaluated', 'cached', 'elapsed'}
+              best_params 与页面使用的结构相同，无有效结果时为None
+    """
+    started = time.perf_counter()
+    total = len(param_grid)
+    done = 0
+
+    def report(count):
+        nonlocal done
+        done += count
+        if progress is not None:
+            progress(done, total)
+
+    evaluator = Evaluator(kline_df, symbol, cache, max_workers, chunk_size)
+    records = evaluator.evaluate(param_grid, report)
+
+    return {
+        'best_params': _best_params(records),
+        'results': [record for record in records if record is not None],
+        'evaluated': evaluator.evaluated,
+        'cached': evaluator.cached,
+        'elapsed': time.perf_counter() - started
+    }
+
+
+class _SearchTracker:
+    """记录搜索过程：回测预算、已评估的组合、最佳结果及连续未提升的轮数"""
+
+    def __init__(self, evaluator, axes, budget, progress=None):
+        self.evaluator = evaluator
+        self.axes = axes
+        self.budget = budget
+        self.progress = progress
+        self.spent = 0
+        self.records = {}
+        self.best_index = None
+        self.best_sharpe = -np.inf
+        self.stall = 0
+
+    def remaining(self):
+        return self.budget - self.spent
+
+    def stalled(self, patience):
+        return self.stall >= patience
+
+    def params_at(self, index):
+        return tuple(axis[i] for axis, i in zip(self.axes, index))
+
+    def _report(self, count):
+        self.spent += count
+        if self.progress is not None:
+            self.progress(min(self.spent, self.budget), self.budget)
+
+    def evaluate(self, indices, evaluator=None):
+        """
+        评估一批网格下标（超出预算的部分不评估）
+
+        Args:
+            indices (list): 网格下标元组列表
+            evaluator (Evaluator): 低精度评估用的评估器，默认为完整数据
+
+        Returns:
+            dict: 网格下标 -> 优化结果记录（包括之前已评估过的）
+        """
+        indices = list(dict.fromkeys(indices))
+        if evaluator is not None:
+            indices = indices[:max(0, self.remaining())]
+            records = evaluator.evaluate([self.params_at(index) for index in indices], self._report)
+            return dict(zip(indices, records))
+
+        new = [index for index in indices if index not in self.records][:max(0, self.remaining())]
+        previous_best = self.best_sharpe
+        records = self.evaluator.evaluate([self.params_at(index) for index in new], self._report)
+        for index, record in zip(new, records):
+            self.records[index] = record
+            if _sharpe_key(record) > self.best_sharpe:
+                self.best_sharpe = _sharpe_key(record)
+                self.best_index = index
+
+        if self.best_sharpe > previous_best + MIN_IMPROVEMENT:
+            self.stall = 0
+        else:
+            self.stall += 1
+        return {index: self.records[index] for index in indices if index in self.records}
+
+
+def _random_indices(rng, sizes, count, exclude=()):
+    """从网格中无放回地随机抽取下标"""
+    total = int(np.prod(sizes))
+    exclude = set(exclude)
+    indices = []
+    for flat in rng.permutation(total):
+        index = tuple(int(i) for i in np.unravel_index(flat, sizes))
+        if index not in exclude:
+            indices.append(index)
+            if len(indices) >= count:
+                break
+    return indices
+
+
+def _random_search(tracker, sizes, rng, patience):
+    """随机搜索：按轮随机抽样，连续patience轮无提升时停止"""
+    candidates = _random_indices(rng, sizes, tracker.budget)
+    for chunk in _chunks(candidates, ROUND_SIZE):
+        tracker.evaluate(chunk)
+        if tracker.remaining() <= 0 or tracker.stalled(patience):
+            break
+
+
+def _successive_halving(tracker, sizes, rng, kline_df, symbol, cache, max_workers):
+    """
+    逐次减半：先用最近一小段K线评估大量候选，每轮保留表现最好的 1/HALVING_ETA，
+    同时把K线窗口扩大 HALVING_ETA 倍，最后一轮在完整数据上评估（各轮截取完整数据的指标，不重新计算）
+    """
+    n_bars = len(kline_df)
+    min_bars = backtest_engine.START_INDEX + MIN_RESULT_BARS + 1
+    rounds = HALVING_ROUNDS
+    while rounds > 1 and n_bars // HALVING_ETA ** (rounds - 1) < min_bars:
+        rounds -= 1
+
+    # 各轮评估数之和不超过预算
+    weight = sum(HALVING_ETA ** -r for r in range(rounds))
+    candidates = _random_indices(rng, sizes, max(1, int(tracker.budget / weight)))
+
+    for r in range(rounds):
+        if r == rounds - 1:
+            tracker.evaluate(candidates)
+            break
+        window = n_bars // HALVING_ETA ** (rounds - 1 - r)
+        evaluator = Evaluator(kline_df.iloc[-window:], symbol, cache, max_workers,
+                              indicators=backtest_engine.slice_indicators(tracker.evaluator.indicators,
+                                                                          n_bars - window, n_bars))
+        records = tracker.evaluate(candidates, evaluator)
+        ranked = sorted(records, key=lambda index: _sharpe_key(records[index]), reverse=True)
+        candidates = ranked[:max(1, len(ranked) // HALVING_ETA)]
+
+
+def _parzen(points, size):
+    """离散取值上的Parzen密度估计（相邻取值分享一半权重，加均匀先验）"""
+    weights = np.full(size, TPE_PRIOR_WEIGHT / size)
+    for offset, weight in ((0, 1.0), (-1, 0.5), (1, 0.5)):
+        shifted = points + offset
+        valid = (shifted >= 0) & (shifted < size)
+        np.add.at(weights, shifted[valid], weight)
+    return weights / weights.sum()
+
+
+def _tpe_search(tracker, sizes, rng, patience):
+    """
+    TPE：把已评估的组合按Sharpe分为好/差两组，对每个参数分别估计两组的分布，
+    从好组分布中采样候选，按 l(x)/g(x) 选出最有希望的组合评估
+    """
+    n_startup = min(tracker.budget, max(ROUND_SIZE, tracker.budget // 5))
+    tracker.evaluate(_random_indices(rng, sizes, n_startup))
+
+    while tracker.remaining() > 0 and not tracker.stalled(patience):
+        indices = np.array(list(tracker.records), dtype=np.int64)
+        scores = np.array([_sharpe_key(record) for record in tracker.records.values()])
+        order = np.argsort(-scores, kind='stable')
+        n_good = max(1, int(np.ceil(TPE_GAMMA * len(order))))
+        good, bad = indices[order[:n_good]], indices[order[n_good:]]
+
+        candidates = np.empty((TPE_CANDIDATES, len(sizes)), dtype=np.int64)
+        log_ratio = np.zeros(TPE_CANDIDATES)
+        for dim, size in enumerate(sizes):
+            l_density = _parzen(good[:, dim], size)
+            g_density = _parzen(bad[:, dim], size)
+            candidates[:, dim] = rng.choice(size, TPE_CANDIDATES, p=l_density)
+            log_ratio += np.log(l_density[candidates[:, dim]]) - np.log(g_density[candidates[:, dim]])
+
+        picked = []
+        for row in np.argsort(-log_ratio, kind='stable'):
+            index = tuple(int(i) for i in candidates[row])
+            if index not in tracker.records and index not in picked:
+                picked.append(index)
+                if len(picked) >= ROUND_SIZE:
+                    break
+        if not picked:
+            # 候选都已评估过时随机补充
+            picked = _random_indices(rng, sizes, ROUND_SIZE, exclude=tracker.records)
+            if not picked:
+                break
+        tracker.evaluate(picked)
+
+
+def _coordinate_descent(tracker, sizes, rng, patience):
+    """
+    坐标下降：依次沿每个参数评估整条取值线并移动到最优点，一整轮没有移动即视为收敛；
+    收敛后从随机点重新开始，连续patience次重启没有找到更好的结果时停止
+    """
+    current = tuple(size // 2 for size in sizes)
+    current_sharpe = _sharpe_key(tracker.evaluate([current]).get(current))
+    best_at_restart = -np.inf
+    restarts_without_gain = 0
+
+    while tracker.remaining() > 0:
+        moved = False
+        for dim, size in enumerate(sizes):
+            line = [current[:dim] + (i,) + current[dim + 1:] for i in range(size)]
+            for index, record in tracker.evaluate(line).items():
+                if _sharpe_key(record) > current_sharpe + MIN_IMPROVEMENT:
+                    current, current_sharpe = index, _sharpe_key(record)
+                    moved = True
+            if tracker.remaining() <= 0:
+                return
+        if moved:
+            continue
+
+        # 已收敛：判断本次下降是否带来提升，再从未评估过的随机点重新开始
+        if tracker.best_sharpe > best_at_restart + MIN_IMPROVEMENT:
+            restarts_without_gain = 0
+        else:
+            restarts_without_gain += 1
+        if restarts_without_gain >= patience:
+            break
+        best_at_restart = tracker.best_sharpe
+
+        restart = _random_indices(rng, sizes, 1, exclude=tracker.records)
+        if not restart:
+            break
+        current = restart[0]
+        current_sharpe = _sharpe_key(tracker.evaluate([current]).get(current))
+
+
+def search(kline_df, param_axes, mode='random', budget=DEFAULT_BUDGET, symbol=None, progress=None,
+           patience=DEFAULT_PATIENCE, seed=None, max_workers=None, cache=None, indicators=None):
+    """
+    按指定方式搜索参数，回测次数不超过预算，连续多轮无提升时提前停止
+
+    Args:
+        kline_df (pd.DataFrame): 优化用的K线数据
+        param_axes (tuple): build_param_axes 的结果
+        mode (str): SEARCH_MODES 中的搜索方式，'grid' 为完整网格（忽略预算）
+        budget (int): 最多回测的参数组合数
+        symbol (str): 标的名称（缓存键的一部分）
+        progress (callable): 进度回调 progress(已完成数, 总数)
+        patience (int): 连续多少轮无提升时停止
+        seed (int): 随机种子
+        max_workers (int): 进程数
+        cache (ResultCache): 结果缓存，默认为进程内共享缓存
+        indicators (dict): 与kline_df对应的预计算指标，默认重新计算
+
+    Returns:
+        dict: 与 optimize 相同，另含 'mode' 和 'spent'（消耗的回测预算）
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"未知的搜索方式: {mode}")
+
+    started = time.perf_counter()
+    evaluator = Evaluator(kline_df, symbol, cache, max_workers, indicators=indicators)
+
+    if mode == 'grid':
+        param_grid = list(itertools.product(*param_axes))
+        done = 0
+
+        def report(count):
+            nonlocal done
+            done += count
+            if progress is not None:
+                progress(done, len(param_grid))
+
+        records = evaluator.evaluate(param_grid, report)
+        return {
+            'best_params': _best_params(records),
+            'results': [record for record in records if record is not None],
+            'evaluated': evaluator.evaluated,
+            'cached': evaluator.cached,
+            'elapsed': time.perf_counter() - started,
+            'mode': mode,
+            'spent': len(param_grid)
+        }
+
+    sizes = tuple(len(axis) for axis in param_axes)
+    budget = max(1, min(int(budget), int(np.prod(sizes))))
+    rng = np.random.default_rng(seed)
+    tracker = _SearchTracker(evaluator, param_axes, budget, progress)
+
+    if mode == 'random':
+        _random_search(tracker, sizes, rng, patience)
+    elif mode == 'halving':
+        _successive_halving(tracker, sizes, rng, kline_df, symbol, cache, max_workers)
+    elif mode == 'tpe':
+        _tpe_search(tracker, sizes, rng, patience)
+    elif mode == 'coordinate':
+        _coordinate_descent(tracker, sizes, rng, patience)
+
+    if progress is not None:
+        progress(budget, budget)
+
+    records = list(tracker.records.values())
+    return {
+        'best_params': _best_params(records),
+        'results': [record for record in records if record is not None],
+        'evaluated': evaluator.evaluated,
+        'cached': evaluator.cached,
+        'elapsed': time.perf_counter() - started,
+        'mode': mode,
+        'spent': tracker.spent
+    }
+
+
+def plan_folds(n_bars, train_bars, test_bars, step_bars=None, anchored=False):
+    """
+    生成滚动验证的训练/测试区间
+
+    Args:
+        n_bars (int): K线总数
+        train_bars (int): 训练窗口K线数
+        test_bars (int): 测试窗口K线数
+        step_bars (int): 每次滑动的K线数，默认等于测试窗口（测试区间首尾相接）
+        anchored (bool): 训练窗口起点是否固定在第一根K线（扩展窗口）
+
+    Returns:
+        list: (train_start, train_end, test_start, test_end) 下标元组，区间左闭右开
+    """
+    step_bars = step_bars or test_bars
+    folds = []
+    start = 0
+    while start + train_bars + test_bars <= n_bars:
+        train_start = 0 if anchored else start
+        train_end = start + train_bars
+        folds.append((train_start, train_end, train_end, train_end + test_bars))
+        start += step_bars
+    return folds
+
+
+def _warm_start(start):
+    """截取区间时向前多取START_INDEX根K线作为均线预热，使回测结果从区间起点开始"""
+    return max(0, start - backtest_engine.START_INDEX)
+
+
+def _run_fold(fold_no, fold, close, indicators, param_axes, mode, budget, symbol, seed, max_workers, cache):
+    """
+    执行一个滚动验证区间：在训练段上搜索参数，再用最佳参数回测测试段
+
+    Returns:
+        dict: 区间结果（区间日期、最佳参数、样本内/样本外指标、样本外每日收益）
+    """
+    train_start, train_end, test_start, test_end = fold
+    warm = _warm_start(train_start)
+    train_df = close.iloc[warm:train_end].to_frame()
+    optimization = search(
+        train_df, param_axes, mode=mode, budget=budget, symbol=symbol, seed=seed,
+        max_workers=max_workers, cache=cache,
+        indicators=backtest_engine.slice_indicators(indicators, warm, train_end)
+    )
+
+    result = {
+        'fold': fold_no,
+        'train_start': close.index[train_start],
+        'train_end': close.index[train_end - 1],
+        'test_start': close.index[test_start],
+        'test_end': close.index[test_end - 1],
+        'best_params': optimization['best_params'],
+        'train_sharpe': np.nan,
+        'test_sharpe': np.nan,
+        'test_return': np.nan,
+        'test_max_drawdown': np.nan,
+        'test_metrics': {},
+        'test_ret': np.zeros(0)
+    }
+    best_params = optimization['best_params']
+    if best_params is None:
+        return result
+
+    params = tuple(best_params[name] for name in PARAM_NAMES)
+    test = backtest_engine.run_backtest(
+        backtest_engine.slice_indicators(indicators, _warm_start(test_start), test_end), *params
+    )
+    metrics = backtest_engine.get_risk_metrics_array(test['ret'])
+    result.update({
+        'train_sharpe': best_params['metrics'].get('Sharpe', np.nan),
+        'test_sharpe': metrics.get('Sharpe', np.nan),
+        'test_return': metrics.get('总收益率', np.nan),
+        'test_max_drawdown': metrics.get('最大回撤', np.nan),
+        'test_metrics': metrics,
+        'test_ret': test['ret']
+    })
+    return result
+
+
+def walk_forward(kline_df, param_axes, train_bars, test_bars, step_bars=None, anchored=False,
+                 mode='grid', budget=DEFAULT_BUDGET, symbol=None, progress=None, seed=None,
+                 max_workers=None, cache=None):
+    """
+    滚动验证（Walk-forward）：在完整历史上滑动训练/测试窗口，逐段优化参数并统计样本外表现
+
+    均线等指标在完整历史上只计算一次，各区间直接截取使用；测试段前面的K线作为均线预热，
+    测试段从第一根K线开始交易。区间较多时分配到进程池并行执行（区间内部串行批量回测）。
+
+    Args:
+        kline_df (pd.DataFrame): 完整历史K线（只需获取一次）
+        param_axes (tuple): build_param_axes 的结果
+        train_bars (int): 训练窗口K线数
+        test_bars (int): 测试窗口K线数
+        step_bars (int): 每次滑动的K线数，默认等于测试窗口
+        anchored (bool): 是否使用扩展窗口（训练起点固定）
+        mode (str): 每个区间内的搜索方式，见 SEARCH_MODES
+        budget (int): 每个区间的回测次数预算（网格搜索时忽略）
+        symbol (str): 标的名称（缓存键的一部分）
+        progress (callable): 进度回调 progress(已完成区间数, 区间总数)
+        seed (int): 随机种子
+        max_workers (int): 进程数，默认为CPU核数，1表示不使用进程池
+        cache (ResultCache): 当前进程执行区间时使用的结果缓存，默认为进程内共享缓存
+
+    Returns:
+        dict: {'folds': 各区间结果列表, 'oos_metrics': 拼接全部测试段收益后的指标,
+               'mean_oos_sharpe', 'elapsed'}
+    """
+    started = time.perf_counter()
+    folds = plan_folds(len(kline_df), train_bars, test_bars, step_bars, anchored)
+    total = len(folds)
+    results = [None] * total
+
+    def report(done):
+        if progress is not None:
+            progress(done, total)
+
+    report(0)
+    close = kline_df['close']
+    indicators = backtest_engine.prepare_indicators(close)
+    max_workers = max_workers or os.cpu_count() or 1
+
+    finished = set()
+    if total > 1 and max_workers > 1:
+        try:
+            executor = get_executor(max_workers)
+            futures = {
+                # 子进程使用各自进程内的结果缓存
+                executor.submit(_run_fold, fold_no, fold, close, indicators, param_axes, mode, budget,
+                                symbol, seed, 1, None): fold_no
+                for fold_no, fold in enumerate(folds)
+            }
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                finished.add(futures[future])
+                report(len(finished))
+        except (BrokenProcessPool, OSError):
+            # 进程池不可用时退回当前进程执行剩余区间
+            _reset_executor()
+
+    for fold_no, fold in enumerate(folds):
+        if fold_no in finished:
+            continue
+        results[fold_no] = _run_fold(fold_no, fold, close, indicators, param_axes, mode, budget,
+                                     symbol, seed, 1, cache)
+        finished.add(fold_no)
+        report(len(finished))
+
+    test_ret = [fold['test_ret'] for fold in results if len(fold['test_ret'])]
+    oos_metrics = backtest_engine.get_risk_metrics_array(np.concatenate(test_ret)) if test_ret else {}
+    sharpes = [fold['test_sharpe'] for fold in results if np.isfinite(fold['test_sharpe'])]
+
+    return {
+        'folds': results,
+        'oos_metrics': oos_metrics,
+        'mean_oos_sharpe': float(np.mean(sharpes)) if sharpes else np.nan,
+        'elapsed': time.perf_counter() - started
+    }
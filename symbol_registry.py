@@ -0,0 +1,152 @@
+from types import MappingProxyType
+from typing import NamedTuple, Optional
+from urllib.parse import parse_qs, urlparse
+
+
+# 数据源库（分组结构）
+_DATA_SOURCES = {
+    "龙头大件": {
+        "树篱迷宫（久经沙场）": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=525873303&platform=YOUPIN&specialStyle",
+        "薄荷（久经沙场）": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=489477781&platform=YOUPIN&specialStyle",
+        "超导体（久经沙场）": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=553370575&platform=YOUPIN&specialStyle",
+        "深红和服（久经沙场）": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=339340704&platform=YOUPIN&specialStyle",
+        "潘多拉之盒（久经沙场）": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=495302338&platform=YOUPIN&specialStyle",
+        "蝴蝶刀伽马多普勒": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=914710920195035136&platform=YOUPIN&specialStyle",
+        "爪子刀伽马多普勒":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=5534979&platform=YOUPIN&specialStyle",
+        "m9刺刀伽马多普勒":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=50942855&platform=YOUPIN&specialStyle"
+    },
+    "收藏品": {
+        "水栽竹": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=26422&platform=YOUPIN&specialStyle",
+        "赤红新星": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=24693&platform=YOUPIN&specialStyle",
+        "九头金蛇": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=914680597258567680&platform=YOUPIN&specialStyle",
+        "X射线":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=814309374440767488&platform=YOUPIN&specialStyle",
+        "火蛇":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=26664&platform=YOUPIN&specialStyle",
+        "黄金藤蔓":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=915059323698278400&platform=YOUPIN&specialStyle",
+        "澜磷":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=808842805052440576&platform=YOUPIN&specialStyle",
+    },
+    "千战ak": {
+        "血腥运动": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=553370749&platform=YOUPIN&specialStyle",
+        "燃料喷射器": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=27166&platform=YOUPIN&specialStyle",
+        "火神": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=24281&platform=YOUPIN&specialStyle",
+        "抽象派":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=914726163117477888&platform=YOUPIN&specialStyle",
+        "霓虹骑士":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=553468213&platform=YOUPIN&specialStyle",
+        "二西莫夫":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=553480796&platform=YOUPIN&specialStyle",
+        "皇后":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=553454872&platform=YOUPIN&specialStyle",
+        "红线":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=24339&platform=YOUPIN&specialStyle",
+        "传承":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=1229264305591787520&platform=YOUPIN&specialStyle",
+        "深海复仇":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=24721&platform=YOUPIN&specialStyle",
+        "霓虹革命":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=87809662&platform=YOUPIN&specialStyle",
+    },
+    "武库":{
+        "怪兽在b": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=1315999843394654208&platform=YOUPIN&specialStyle",
+        "m4a1渐变之色": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=1315817295203307520&platform=YOUPIN&specialStyle",
+        "m4a1蒸汽波":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=1316060605966323712&platform=YOUPIN&specialStyle",
+        "awp克拉考": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=1315936965627445248&platform=YOUPIN&specialStyle",
+    },
+    "贴纸": {
+        "21tyloo": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=925497374167523328&platform=YOUPIN&specialStyle",
+        "22C9": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=995815251158949888&platform=YOUPIN&specialStyle",
+        "金贴lvg": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=1244761416324870144&platform=YOUPIN&specialStyle",
+        "24上海金zywoo":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=1336126932723073024&platform=YOUPIN&specialStyle"
+    },
+    "探员": {
+        "出逃的萨利": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=808803044176429056&platform=YOUPIN&specialStyle",
+        "迈阿密人士": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=808805648347430912&platform=YOUPIN&specialStyle",
+        "红苍蝇":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=914706546146541568&platform=YOUPIN&specialStyle",
+        "蛙人":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=914672680855793664&platform=YOUPIN&specialStyle",
+        "老K":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=808792879539683328&platform=YOUPIN&specialStyle",
+        "薇帕姐":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=914664236297879552&platform=YOUPIN&specialStyle",
+    }
+
+}
+
+# 物品ID映射表（从on-sale-data.txt更新）
+_ITEM_IDS = {
+    "树篱迷宫（久经沙场）": "525873303",
+    "克拉考": "1315936965627445248", 
+    "怪兽在b": "1315999843394654208",
+    "水栽竹": "26422",
+    "tyloo": "925497374167523328",
+    "出逃的萨利": "808803044176429056",
+    # 保留原有的示例映射
+    "Lynn Vision (Gold)": "1244761416324870144",
+}
+
+# 在售数据URL映射表（从on-sale-data.txt提取）
+_ON_SALE_URLS = {
+    "树篱迷宫（久经沙场）": "https://sdt-api.ok-skins.com/user/skin/v1/current-sell?timestamp=1749039724950&itemId=525873303",
+    "克拉考": "https://sdt-api.ok-skins.com/user/skin/v1/current-sell?timestamp=1749039969883&itemId=1315936965627445248",
+    "怪兽在b": "https://sdt-api.ok-skins.com/user/skin/v1/current-sell?timestamp=1749039994465&itemId=1315999843394654208",
+    "水栽竹": "https://sdt-api.ok-skins.com/user/skin/v1/current-sell?timestamp=1749040017058&itemId=26422",
+    "tyloo": "https://sdt-api.ok-skins.com/user/skin/v1/current-sell?timestamp=1749040047017&itemId=925497374167523328",
+    "出逃的萨利": "https://sdt-api.ok-skins.com/user/skin/v1/current-sell?timestamp=1749040067008&itemId=808803044176429056"
+}
+
+
+class SymbolInfo(NamedTuple):
+    """单个标的的全部元数据（不可变）"""
+    name: str
+    # 所属分类，仅有在售数据的物品为None
+    category: Optional[str]
+    type_val: Optional[str]
+    # K线URL模板
+    kline_url: Optional[str]
+    # 在售数据的物品ID和URL
+    item_id: Optional[str]
+    on_sale_url: Optional[str]
+
+
+def parse_type_val(url):
+    """从K线URL中解析typeVal，未找到时返回None"""
+    values = parse_qs(urlparse(url).query).get('typeVal')
+    return values[0] if values else None
+
+
+def _build_registry():
+    symbols = {}
+    for category, items in _DATA_SOURCES.items():
+        for name, url in items.items():
+            symbols[name] = SymbolInfo(name, category, parse_type_val(url), url, None, None)
+
+    for name in list(_ITEM_IDS) + [name for name in _ON_SALE_URLS if name not in _ITEM_IDS]:
+        info = symbols.get(name) or SymbolInfo(name, None, None, None, None, None)
+        symbols[name] = info._replace(item_id=_ITEM_IDS.get(name), on_sale_url=_ON_SALE_URLS.get(name))
+    return symbols
+
+
+# 名称 -> SymbolInfo
+SYMBOLS = MappingProxyType(_build_registry())
+# 分类 -> 该分类下的标的名称（保持定义顺序）
+CATEGORIES = MappingProxyType({category: tuple(items) for category, items in _DATA_SOURCES.items()})
+# 有K线数据源的标的：名称 -> K线URL模板
+KLINE_URLS = MappingProxyType({info.name: info.kline_url for info in SYMBOLS.values() if info.kline_url})
+# 分类 -> {名称: K线URL模板}，与原 DATA_SOURCES 结构相同
+DATA_SOURCES = MappingProxyType({
+    category: MappingProxyType({name: KLINE_URLS[name] for name in names})
+    for category, names in CATEGORIES.items()
+})
+# K线URL模板 -> typeVal
+TYPE_VAL_BY_URL = MappingProxyType({info.kline_url: info.type_val for info in SYMBOLS.values() if info.kline_url})
+# 在售数据：名称 -> 物品ID / 在售数据URL
+ITEM_ID_MAP = MappingProxyType({name: SYMBOLS[name].item_id for name in _ITEM_IDS})
+ON_SALE_URL_MAP = MappingProxyType({name: SYMBOLS[name].on_sale_url for name in _ON_SALE_URLS})
+
+
+def get(name):
+    """按名称查找标的，未知标的返回None"""
+    return SYMBOLS.get(name)
+
+
+def is_tradable(name):
+    """是否为有K线数据源（可交易）的标的"""
+    return name in KLINE_URLS
+
+
+def category_of(name, default=None):
+    info = SYMBOLS.get(name)
+    return info.category if info is not None and info.category else default
+
+
+def kline_url(name):
+    """标的的K线URL模板，未知标的返回None"""
+    return KLINE_URLS.get(name)
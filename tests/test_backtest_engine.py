@@ -0,0 +1,150 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import backtest_engine
+
+PARAM_GRID = list(itertools.product((2.0, 6.7, 15.0), (0.02, 0.07), (1, 3, 5), (-0.08, -0.02)))
+
+
+def random_klines(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.002, 0.03, n)))
+    return pd.DataFrame({'close': close}, index=pd.date_range('2024-01-01', periods=n, freq='D'))
+
+
+def max_lots_klines(n=160, jumps=(30, 38)):
+    """
+    稳步上涨中夹两次跳涨：上涨时每根K线加仓，跳涨日止盈卖出首仓，
+    之后继续加仓，默认参数下同时持有的批次数达到上限11批
+    """
+    returns = np.full(n, 0.005)
+    returns[list(jumps)] = 0.12
+    close = 100 * np.cumprod(1 + returns)
+    return pd.DataFrame({'close': close}, index=pd.date_range('2024-01-01', periods=n, freq='D'))
+
+
+def open_lots(result):
+    """由买卖记录还原每根K线收盘后持有的批次数（卖出按买入顺序进行）"""
+    lots = []
+    counts = []
+    for buy, sell in zip(result['buy'], result['sell']):
+        if buy:
+            lots.append(buy)
+        sold = 0.0
+        while sell and lots and sold < sell - 1e-12:
+            sold += lots.pop(0)
+        counts.append(len(lots))
+    return counts
+
+
+@pytest.mark.parametrize('kline_df', [random_klines(seed=seed) for seed in range(3)] + [max_lots_klines()],
+                         ids=['random0', 'random1', 'random2', 'max_lots'])
+def test_batch_matches_single_runs(kline_df):
+    indicators = backtest_engine.prepare_indicators(kline_df['close'])
+
+    batch = backtest_engine.run_backtest_batch(indicators, PARAM_GRID)
+
+    for row, params in enumerate(PARAM_GRID):
+        single = backtest_engine.run_backtest(indicators, *params)
+        for col in ('pos', 'ret', 'buy', 'sell'):
+            np.testing.assert_array_equal(batch[col][row], single[col], err_msg=f'{params} {col}')
+
+
+def test_max_lots_case_reaches_the_bound():
+    indicators = backtest_engine.prepare_indicators(max_lots_klines()['close'])
+
+    single = backtest_engine.run_backtest(indicators)
+
+    assert max(open_lots(single)) == 11 < backtest_engine.MAX_LOTS
+
+
+def loop_backtest_strategy(kline_df, k0=6.7, bias_th=0.07, sell_days=3, sell_drop_th=-0.05):
+    """改为数组引擎之前的逐行pandas回测（对照实现）"""
+    ret = kline_df['close'].pct_change()
+    ma5 = kline_df['close'].rolling(5).mean()
+    ma10 = kline_df['close'].rolling(10).mean()
+    ma20 = kline_df['close'].rolling(20).mean()
+
+    pos = {}
+    ret_ls = []
+    for i in range(19, len(kline_df)):
+        close = kline_df['close'].iloc[i]
+        bias = close / ma5.iloc[i] - 1
+
+        price_drop = 0
+        ma10_break = False
+        if i >= sell_days:
+            drop_cal = kline_df['close'].iloc[i - sell_days]
+            price_drop = close / drop_cal - 1
+            ma10_break = close < ma10.iloc[i]
+
+        current_pos = sum(list(pos.values()))
+        buy = 0
+        sell = 0
+        sold_pos = 0
+
+        if ma5.iloc[i] > ma20.iloc[i] and close > ma10.iloc[i] and bias < bias_th:
+            if not pos:
+                pos[i] = 0.3
+                buy = 0.3
+            elif current_pos < 1:
+                pos[i] = 0.1
+                buy = 0.1
+        else:
+            if i >= sell_days and price_drop < sell_drop_th and ma10_break:
+                for k in list(pos.keys()):
+                    sold_pos += pos[k]
+                    del pos[k]
+            else:
+                sell_pos = current_pos * (1 - np.exp(-k0 * bias_th)) if bias >= bias_th else 0
+                for k in list(pos.keys()):
+                    if i - k >= 7:
+                        sold_pos += pos[k]
+                        del pos[k]
+                        if sold_pos >= sell_pos:
+                            break
+            sell = sold_pos
+
+        ret_ls.append({
+            'date': kline_df.index[i],
+            'pos': current_pos + buy - sell,
+            'ret': (current_pos + buy - sell) * ret.iloc[i],
+            'buy': buy,
+            'sell': sell,
+            'price': close,
+            'ma5': ma5.iloc[i],
+            'ma10': ma10.iloc[i],
+            'ma20': ma20.iloc[i],
+            'bias': bias
+        })
+    return pd.DataFrame(ret_ls).set_index('date')
+
+
+def falling_klines(n=80):
+    close = 100 * np.cumprod(np.full(n, 0.99))
+    return pd.DataFrame({'close': close}, index=pd.date_range('2024-01-01', periods=n, freq='D'))
+
+
+@pytest.mark.parametrize('params', [(6.7, 0.07, 3, -0.05), (2.0, 0.02, 1, -0.02), (15.0, 0.07, 5, -0.08)])
+@pytest.mark.parametrize('kline_df', [random_klines(seed=seed) for seed in range(3)]
+                         + [max_lots_klines(), falling_klines(), random_klines(n=20)],
+                         ids=['random0', 'random1', 'random2', 'max_lots', 'no_trades', 'one_bar'])
+def test_backtest_strategy_matches_loop(kline_df, params):
+    expected = loop_backtest_strategy(kline_df, *params)
+
+    result = backtest_engine.backtest_strategy(kline_df, *params)
+
+    # 列、索引和列类型（从未成交时仓位列为整数）都与逐行实现一致；
+    # 接口K线的索引没有freq，这里不比较测试数据自带的freq
+    pd.testing.assert_frame_equal(result, expected, check_exact=True, check_freq=False)
+
+
+def test_backtest_strategy_too_short():
+    result = backtest_engine.backtest_strategy(random_klines(n=19))
+
+    assert result.empty
+    assert list(result.columns) == backtest_engine.RESULT_COLUMNS
+    assert result.index.name == 'date'
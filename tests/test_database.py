@@ -0,0 +1,161 @@
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('streamlit')
+
+import database  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = database.DatabaseManager(str(tmp_path / 'trading.db'))
+    ok, _ = manager.register_user('alice', 'alice@example.com', 'secret123', 'Alice')
+    assert ok
+    return manager
+
+
+def user_id(db):
+    with database.get_connection(db.db_path) as conn:
+        return conn.execute("SELECT id FROM users WHERE username = 'alice'").fetchone()[0]
+
+
+def count_trades(db, uid):
+    with database.get_connection(db.db_path) as conn:
+        return conn.execute('SELECT COUNT(*) FROM trades WHERE user_id = ?', (uid,)).fetchone()[0]
+
+
+def test_each_fill_is_written_once(db):
+    uid = user_id(db)
+    portfolio = db.get_user_account(uid)
+    bought = datetime(2024, 1, 1)
+
+    ok, _, portfolio = db.execute_trade_tx(uid, portfolio, 'AK', '买入', 3, 10.0, now=bought)
+    assert ok
+    ok, _, portfolio = db.execute_trade_tx(uid, portfolio, 'AK', '卖出', 2, 12.0, now=datetime(2024, 1, 10))
+    assert ok
+
+    assert count_trades(db, uid) == 2
+    assert [trade['action'] for trade in db.get_user_account(uid)['trade_history']] == ['买入', '卖出']
+    stats = db.get_user_stats(uid)
+    assert (stats['total_trades'], stats['buy_trades'], stats['sell_trades']) == (2, 1, 1)
+    assert stats['total_pnl'] == pytest.approx(4.0)
+
+
+def test_plain_list_history_is_not_resaved(db):
+    uid = user_id(db)
+    portfolio = dict(db.get_user_account(uid), trade_history=[])
+
+    ok, _, portfolio = db.execute_trade_tx(uid, portfolio, 'AK', '买入', 1, 10.0)
+    assert ok
+    assert isinstance(portfolio['trade_history'], database.TradeHistory)
+    assert len(portfolio['trade_history']) == 1
+
+    assert db.save_user_account(uid, portfolio)
+    assert db.save_user_account(uid, dict(portfolio, trade_history=[{'symbol': 'AK'}] * 5))
+    assert count_trades(db, uid) == 1
+
+
+def test_pending_trades_are_saved(db):
+    uid = user_id(db)
+    portfolio = db.get_user_account(uid)
+    portfolio['trade_history'].append({'date': '2024-01-01T00:00:00', 'symbol': 'AK', 'action': '买入',
+                                       'quantity': 1, 'price': 10.0, 'total': 10.0, 'type': '买入'})
+
+    assert db.save_user_account(uid, portfolio)
+    assert db.save_user_account(uid, portfolio)
+    assert count_trades(db, uid) == 1
+
+
+def test_total_value_uses_price_snapshot(db):
+    uid = user_id(db)
+    portfolio = db.get_user_account(uid)
+    cash = portfolio['cash']
+
+    ok, _, portfolio = db.execute_trade_tx(uid, portfolio, 'AK', '买入', 2, 10.0, prices={'AK': 15.0})
+    assert ok
+    ok, _, portfolio = db.execute_trade_tx(uid, portfolio, 'BK', '买入', 1, 4.0, prices={'BK': 5.0})
+    assert ok
+
+    with database.get_connection(db.db_path) as conn:
+        total_value = conn.execute('SELECT total_value FROM user_accounts WHERE user_id = ?',
+                                   (uid,)).fetchone()[0]
+    # 快照中没有AK时按持仓均价估值
+    assert total_value == pytest.approx(cash - 24.0 + 2 * 10.0 + 5.0)
+
+
+def traced_statements(db, monkeypatch):
+    """记录之后通过连接池执行的SQL语句"""
+    statements = []
+    acquire = db.pool.acquire
+
+    def traced_acquire():
+        conn = acquire()
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    monkeypatch.setattr(db.pool, 'acquire', traced_acquire)
+    return statements
+
+
+def lot_ids(db, uid):
+    with database.get_connection(db.db_path) as conn:
+        return conn.execute('SELECT id FROM inventory_lots WHERE user_id = ? ORDER BY id', (uid,)).fetchall()
+
+
+def test_unchanged_save_does_not_touch_lots(db, monkeypatch):
+    uid = user_id(db)
+    portfolio = db.get_user_account(uid)
+    ok, _, portfolio = db.execute_trade_tx(uid, portfolio, 'AK', '买入', 3, 10.0)
+    assert ok
+    before = lot_ids(db, uid)
+
+    statements = traced_statements(db, monkeypatch)
+    assert db.save_user_account(uid, portfolio)
+
+    assert not [sql for sql in statements if 'inventory_lots' in sql or 'positions' in sql]
+    assert lot_ids(db, uid) == before
+
+
+def test_closed_position_is_deleted(db):
+    uid = user_id(db)
+    portfolio = db.get_user_account(uid)
+    for symbol in ('AK', 'M4'):
+        ok, _, portfolio = db.execute_trade_tx(uid, portfolio, symbol, '买入', 2, 10.0)
+        assert ok
+
+    portfolio['positions'].pop('AK')
+    portfolio['inventory'].pop('AK')
+    database.mark_dirty(portfolio, 'AK')
+    assert db.save_user_account(uid, portfolio)
+
+    account = db.get_user_account(uid)
+    assert set(account['positions']) == set(account['inventory']) == {'M4'}
+    assert not portfolio['dirty_symbols']
+
+
+def test_stale_save_does_not_revert_trade(db):
+    uid = user_id(db)
+    stale = db.get_user_account(uid)
+    other = db.get_user_account(uid)
+
+    ok, _, other = db.execute_trade_tx(uid, other, 'AK', '买入', 3, 10.0)
+    assert ok
+    stale['total_value'] = 123.0
+    assert db.save_user_account(uid, stale)
+
+    account = db.get_user_account(uid)
+    assert account['cash'] == pytest.approx(other['cash'])
+    assert account['positions'] == {'AK': {'quantity': 3, 'avg_price': 10.0}}
+    assert account['inventory']['AK']['lots'].total_quantity == 3
+    assert account['total_value'] == 123.0
+
+
+def test_update_total_value_only(db):
+    uid = user_id(db)
+    cash = db.get_user_account(uid)['cash']
+
+    assert db.update_total_value(uid, 42.0)
+
+    account = db.get_user_account(uid)
+    assert (account['cash'], account['total_value']) == (cash, 42.0)
@@ -0,0 +1,217 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import indicators
+
+
+def make_klines(n, seed=0, plateaus=True):
+    """随机K线；plateaus 时加入收盘价持平、零成交量的区段"""
+    rng = np.random.default_rng(seed)
+    close = np.round(100 * np.exp(np.cumsum(rng.normal(0, 0.02, n))), 2)
+    high = close * (1 + rng.uniform(0, 0.02, n))
+    low = close * (1 - rng.uniform(0, 0.02, n))
+    volume = rng.integers(0, 1000, n).astype(float)
+    if plateaus:
+        for start, length in ((50, 30), (200, 5)):
+            if start < n:
+                close[start:start + length] = close[start]
+                high[start:start + length] = close[start]
+                low[start:start + length] = close[start]
+        volume[100:130] = 0
+    index = pd.date_range('2024-01-01', periods=n, freq='D')
+    return pd.DataFrame({'open': close, 'high': high, 'low': low, 'close': close, 'volume': volume},
+                        index=index)
+
+
+def batch_rows(df):
+    """compute_indicators 的结果，按行转成 {列名: 值}"""
+    block = indicators.compute_indicators(*(df[col].to_numpy() for col in ('high', 'low', 'close', 'volume')))
+    return [dict(zip(indicators.INDICATOR_COLUMNS, block[:, i])) for i in range(block.shape[1])]
+
+
+def assert_row_equal(actual, expected):
+    for col in indicators.INDICATOR_COLUMNS:
+        assert actual[col] == pytest.approx(expected[col], rel=1e-9, abs=1e-9, nan_ok=True), col
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_streaming_matches_batch_row_by_row(seed):
+    df = make_klines(320, seed)
+    expected = batch_rows(df)
+    state = indicators.StreamingIndicators()
+
+    for i, bar in enumerate(df[['high', 'low', 'close', 'volume']].itertuples(index=False)):
+        assert_row_equal(state.append(*bar), expected[i])
+
+
+def test_streaming_replace_last_matches_batch():
+    df = make_klines(120, 1)
+    expected = batch_rows(df)
+    state = indicators.StreamingIndicators()
+    bars = list(df[['high', 'low', 'close', 'volume']].itertuples(index=False))
+
+    for bar in bars[:-1]:
+        state.append(*bar)
+    state.append(1.0, 1.0, 1.0, 1.0)
+    state.replace_last(*bars[-1][:3], 5.0)
+    values = state.replace_last(*bars[-1])
+
+    assert_row_equal(values, expected[-1])
+
+
+def test_engine_history_seeding_matches_batch():
+    df = make_klines(300, 2)
+    expected = batch_rows(df)
+    engine = indicators.IndicatorEngine(history=lambda symbol: df.iloc[:200])
+
+    # 首次同步用历史预热，重叠部分不重复计算
+    assert_row_equal(engine.update('x', df.iloc[190:201]), expected[200])
+    for i in range(201, len(df)):
+        assert_row_equal(engine.update('x', df.iloc[i - 2:i + 1]), expected[i])
+    assert_row_equal(engine.latest('x'), expected[-1])
+
+
+def per_symbol_block(df):
+    return indicators.compute_indicators(*(df[col].to_numpy() for col in ('high', 'low', 'close', 'volume')))
+
+
+def test_panel_matches_per_symbol_computation():
+    # 长度不等的标的：短的在面板左侧用NaN填充，其中一个短于最长的指标窗口
+    kline_dfs = {
+        'long': make_klines(300, 0),
+        'medium': make_klines(120, 1),
+        'short': make_klines(40, 2, plateaus=False),
+        'one_bar': make_klines(1, 3, plateaus=False),
+        'empty': make_klines(0, 4),
+    }
+    panel = indicators.stack_klines(kline_dfs)
+    assert panel.symbols == ['long', 'medium', 'short', 'one_bar']
+    assert np.isnan(panel.close[1, :180]).all()
+
+    block = indicators.compute_panel(panel)
+    frames = indicators.panel_frames(panel, block)
+
+    for symbol in panel.symbols:
+        df = kline_dfs[symbol]
+        expected = indicators.with_indicators(df)
+        pd.testing.assert_frame_equal(frames[symbol], expected[frames[symbol].columns],
+                                      check_freq=False, rtol=1e-12, atol=1e-12)
+        np.testing.assert_allclose(block[:, panel.symbols.index(symbol), 300 - len(df):], per_symbol_block(df),
+                                   rtol=1e-12, atol=1e-12, equal_nan=True)
+
+    latest = indicators.latest_indicators(panel, block)
+    for symbol in panel.symbols:
+        np.testing.assert_allclose(latest.loc[symbol, list(indicators.INDICATOR_COLUMNS)].to_numpy(float),
+                                   per_symbol_block(kline_dfs[symbol])[:, -1], rtol=1e-12, equal_nan=True)
+
+
+def test_panel_truncated_to_recent_bars():
+    kline_dfs = {'a': make_klines(300, 0), 'b': make_klines(90, 1)}
+    panel = indicators.stack_klines(kline_dfs, n_bars=100)
+
+    frames = indicators.panel_frames(panel)
+
+    for symbol, df in kline_dfs.items():
+        recent = df.iloc[-100:]
+        assert frames[symbol].index.equals(recent.index)
+        np.testing.assert_allclose(frames[symbol][list(indicators.INDICATOR_COLUMNS)].to_numpy().T,
+                                   per_symbol_block(recent), rtol=1e-12, atol=1e-12, equal_nan=True)
+
+
+def test_cache_hits_misses_and_lru_eviction():
+    cache = indicators.IndicatorCache(max_entries=2)
+
+    assert cache.get('a') is None
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    # 'a' 刚被访问过，容量已满时淘汰最久未使用的 'b'
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (3, 2)
+
+
+def test_frame_key_changes_with_data():
+    df = make_klines(100)
+    key = indicators.frame_key(df, 'x')
+    assert indicators.frame_key(df.copy(), 'x') == key
+
+    new_bar = make_klines(101).iloc[-1:].set_axis([df.index[-1] + pd.Timedelta(days=1)])
+    intraday = df.copy()
+    intraday.iloc[-1, intraday.columns.get_loc('close')] += 0.01
+    corrected = df.copy()
+    corrected.iloc[10, corrected.columns.get_loc('close')] += 0.01
+    corrected_volume = df.copy()
+    corrected_volume.iloc[10, corrected_volume.columns.get_loc('volume')] += 1
+    changed = [pd.concat([df, new_bar]), df.iloc[1:], intraday, corrected, corrected_volume]
+
+    keys = {key} | {indicators.frame_key(frame, 'x') for frame in changed}
+    assert len(keys) == len(changed) + 1
+    assert indicators.frame_key(df, 'y') != key
+    assert indicators.frame_key(df, 'x', kind='signals') != key
+    assert indicators.frame_key(df) != indicators.frame_key(corrected)
+
+
+def test_cached_indicators_recompute_after_edit():
+    cache = indicators.IndicatorCache()
+    df = make_klines(100)
+
+    first = indicators.cached_indicators(df, 'x', cache=cache)
+    first['rsi'] = 0.0
+    again = indicators.cached_indicators(df, 'x', cache=cache)
+    edited = df.copy()
+    edited.iloc[50, edited.columns.get_loc('close')] *= 1.5
+    recomputed = indicators.cached_indicators(edited, 'x', cache=cache)
+
+    assert (cache.hits, cache.misses) == (1, 2)
+    # 返回的是副本，调用方修改不影响缓存
+    pd.testing.assert_frame_equal(again, indicators.with_indicators(df))
+    pd.testing.assert_frame_equal(recomputed, indicators.with_indicators(edited))
+
+
+def dependency_closure(name):
+    """_COLUMNS 中声明的 name 及其全部（间接）依赖"""
+    names = {name}
+    for dependency in indicators._COLUMNS.get(name, ((), None))[0]:
+        names |= dependency_closure(dependency)
+    return names
+
+
+def test_lazy_column_computes_only_its_dependencies():
+    df = make_klines(200)
+    frame = indicators.IndicatorFrame.from_frame(df)
+
+    histogram = frame['macd_histogram']
+
+    assert frame.computed == ['ema12', 'ema26', 'macd', 'macd_signal', 'macd_histogram']
+    eager = indicators.with_indicators(df)
+    np.testing.assert_array_equal(histogram, eager['macd_histogram'].to_numpy())
+    # 已计算的列直接复用
+    assert frame['macd'] is frame['macd']
+
+
+@pytest.mark.parametrize('name', indicators.INDICATOR_COLUMNS)
+def test_each_lazy_column_matches_eager(name):
+    df = make_klines(200)
+    frame = indicators.IndicatorFrame.from_frame(df)
+
+    value = frame[name]
+
+    expected_columns = dependency_closure(name) & set(indicators.INDICATOR_COLUMNS)
+    assert set(frame.computed) == expected_columns
+    np.testing.assert_array_equal(value, indicators.with_indicators(df)[name].to_numpy())
+
+
+def test_lazy_frame_without_unused_inputs():
+    df = make_klines(100)
+    frame = indicators.IndicatorFrame(close=df['close'], index=df.index)
+
+    pd.testing.assert_series_equal(frame.series('rsi'), indicators.with_indicators(df)['rsi'], check_freq=False)
+    with pytest.raises(KeyError):
+        frame['atr']
+    with pytest.raises(KeyError):
+        frame['not_a_column']
@@ -0,0 +1,141 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from inventory import INITIAL_CAPACITY, LOCK_DAYS, LotInventory, build_inventory
+
+T0 = datetime(2024, 1, 1)
+
+
+def day(n, hours=0):
+    return T0 + timedelta(days=n, hours=hours)
+
+
+def test_fifo_sell_spans_several_lots():
+    inv = LotInventory()
+    inv.add(day(0), 10.0, 2)
+    inv.add(day(1), 20.0, 3)
+    inv.add(day(2), 30.0, 4)
+
+    cost = inv.sell(6, day(20))
+
+    assert cost == pytest.approx(2 * 10.0 + 3 * 20.0 + 1 * 30.0)
+    assert inv.to_lots() == [(day(2).isoformat(), 30.0, 3)]
+    assert (len(inv), inv.total_quantity) == (1, 3)
+
+
+def test_sell_is_limited_to_unlocked_lots():
+    inv = LotInventory()
+    inv.add(day(0), 10.0, 2)
+    inv.add(day(3), 20.0, 5)
+
+    # 第二批在 day(3 + LOCK_DAYS) 才解锁
+    now = day(LOCK_DAYS + 1)
+    assert inv.available_quantity(now) == 2
+    assert inv.available_quantity(day(LOCK_DAYS, hours=-1)) == 0
+    assert inv.next_unlock(now) == day(3 + LOCK_DAYS)
+
+    assert inv.sell(4, now) == pytest.approx(20.0)
+    assert inv.sell(1, now) == 0.0
+    assert inv.total_quantity == 5
+    assert inv.available_quantity(day(3 + LOCK_DAYS)) == 5
+    assert inv.next_unlock(day(3 + LOCK_DAYS)) is None
+
+
+def test_avg_cost_after_partial_consume():
+    inv = LotInventory.from_lots([(day(0), 10.0, 4), (day(1), 16.0, 2)])
+
+    inv.sell(3, day(30))
+
+    # 剩余：第一批1件（10.0）和第二批2件（16.0）
+    assert inv.total_quantity == 3
+    assert inv.total_cost == pytest.approx(10.0 + 32.0)
+    assert inv.avg_cost() == pytest.approx(14.0)
+    assert inv.to_lots() == [(day(0).isoformat(), 10.0, 1), (day(1).isoformat(), 16.0, 2)]
+    inv.sell(3, day(30))
+    assert inv.avg_cost(default=-1.0) == -1.0
+
+
+def test_grow_after_head_moved():
+    inv = LotInventory()
+    for i in range(INITIAL_CAPACITY):
+        inv.add(day(i), float(i + 1), 2)
+    # 卖空前10批并部分卖出第11批，队首后移
+    inv.sell(21, day(100))
+    assert inv._head == 10
+    capacity = len(inv._unlock)
+
+    # 缓冲区已满，追加时先丢弃已卖空的批次，剩余不到一半容量时不扩容
+    inv.add(day(50), 99.0, 3)
+    assert len(inv._unlock) == capacity
+    assert inv._head == 0
+    remaining = [(day(10).isoformat(), 11.0, 1)] + [(day(i).isoformat(), float(i + 1), 2)
+                                                    for i in range(11, INITIAL_CAPACITY)]
+    assert inv.to_lots() == remaining + [(day(50).isoformat(), 99.0, 3)]
+    assert inv.total_cost == pytest.approx(11.0 + sum(2 * (i + 1) for i in range(11, INITIAL_CAPACITY)) + 297.0)
+    assert inv.sell(2, day(100)) == pytest.approx(11.0 + 12.0)
+
+    # 继续追加直到缓冲区再次写满时扩容
+    for i in range(INITIAL_CAPACITY):
+        inv.add(day(60 + i), 1.0, 1)
+    assert len(inv._unlock) == 2 * capacity
+    assert inv.total_quantity == 1 + 2 * (INITIAL_CAPACITY - 12) + 3 + INITIAL_CAPACITY
+    total_cost = inv.total_cost
+    assert inv.sell(inv.total_quantity, day(200)) == pytest.approx(total_cost)
+    assert inv.total_quantity == 0 and len(inv) == 0
+
+
+def test_from_lots_to_lots_round_trip():
+    lots = [(day(3).isoformat(), 12.5, 2), (day(1).isoformat(), 10.0, 1), (day(2), 11.0, 0),
+            (day(1, hours=5).isoformat(), 10.5, 4)]
+
+    inv = LotInventory.from_lots(lots)
+
+    # 数量为0的批次被丢弃，其余按买入时间排序
+    expected = [(day(1).isoformat(), 10.0, 1), (day(1, hours=5).isoformat(), 10.5, 4), (day(3).isoformat(), 12.5, 2)]
+    assert inv.to_lots() == expected
+    assert LotInventory.from_lots(inv.to_lots()).to_lots() == expected
+    assert inv.to_records()[0] == {'purchase_date': expected[0][0], 'purchase_price': 10.0, 'quantity': 1}
+    inventory = build_inventory(lots, now=day(1 + LOCK_DAYS))
+    assert (inventory['total_quantity'], inventory['available_quantity']) == (7, 1)
+
+
+def test_out_of_order_add_keeps_queue_sorted():
+    inv = LotInventory.from_lots([(day(5), 5.0, 1)])
+
+    inv.add(day(2), 2.0, 1)
+
+    assert [lot[0] for lot in inv.to_lots()] == [day(2).isoformat(), day(5).isoformat()]
+    assert inv.sell(1, day(30)) == 2.0
+
+
+def test_matches_reference_queue():
+    """随机买卖与逐批列表实现对照"""
+    rng = random.Random(7)
+    inv = LotInventory()
+    reference = []  # [purchase_date, price, quantity]
+    now = T0
+    for step in range(3000):
+        now += timedelta(minutes=rng.randint(1, 600))
+        if rng.random() < 0.55:
+            price, quantity = round(rng.uniform(1, 50), 2), rng.randint(1, 30)
+            inv.add(now, price, quantity)
+            reference.append([now, price, quantity])
+            continue
+        available = sum(lot[2] for lot in reference if now - lot[0] >= timedelta(days=LOCK_DAYS))
+        assert inv.available_quantity(now) == available
+        quantity = rng.randint(1, available + 5)
+        left, cost = min(quantity, available), 0.0
+        for lot in reference:
+            if not left:
+                break
+            sold = min(left, lot[2])
+            cost += sold * lot[1]
+            lot[2] -= sold
+            left -= sold
+        reference = [lot for lot in reference if lot[2] > 0]
+        assert inv.sell(quantity, now) == pytest.approx(cost)
+        if step % 97 == 0:
+            assert inv.to_lots() == [(lot[0].isoformat(), lot[1], lot[2]) for lot in reference]
+            assert inv.total_cost == pytest.approx(sum(lot[1] * lot[2] for lot in reference))
@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pandas as pd
+
+import kline_data
+
+
+def fake_fetch(delays, fail=(), raise_for=()):
+    """替换单标的获取：url 即标的名称，按 delays 等待后返回只含一根K线的结果"""
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def fetch(url, start_date=None, end_date=None):
+        with lock:
+            active.append(url)
+            peak.append(len(active))
+        try:
+            time.sleep(delays.get(url, 0.0))
+            if url in raise_for:
+                raise RuntimeError('boom')
+            if url in fail:
+                return kline_data._failure(f'failed {url}', latency=delays.get(url, 0.0), attempts=1)
+            frame = pd.DataFrame({'close': [float(len(url))]}, index=pd.DatetimeIndex(['2024-01-01'], name='date'))
+            return {'success': True, 'data': frame.assign(url=url), 'error': None, 'level': None,
+                    'latency': delays.get(url, 0.0), 'attempts': 1}
+        finally:
+            with lock:
+                active.remove(url)
+
+    fetch.peak = peak
+    return fetch
+
+
+def test_results_keep_symbol_order_and_mapping():
+    # 靠前的标的响应更慢，完成顺序与请求顺序相反
+    symbols = {f'sym{i}': f'url{i}' for i in range(6)}
+    fetch = fake_fetch({f'url{i}': 0.05 * (6 - i) for i in range(6)})
+
+    batch = kline_data.get_klines_bulk(symbols, fetch=fetch, max_workers=6)
+
+    assert list(batch) == list(symbols)
+    assert list(batch.latency) == list(symbols)
+    for symbol, url in symbols.items():
+        assert batch[symbol]['url'].iloc[0] == url
+    assert not batch.errors
+
+
+def test_failures_are_recorded_without_losing_others():
+    symbols = {'a': 'ok-a', 'b': 'bad', 'c': 'raises', 'd': 'ok-d'}
+    fetch = fake_fetch({}, fail={'bad'}, raise_for={'raises'})
+
+    batch = kline_data.get_klines_bulk(symbols, fetch=fetch)
+
+    assert list(batch) == ['a', 'b', 'c', 'd']
+    assert set(batch.errors) == {'b', 'c'}
+    assert batch.errors['b'] == 'failed bad'
+    assert 'boom' in batch.errors['c']
+    assert batch['b'].empty and batch['c'].empty
+    assert batch['a']['url'].iloc[0] == 'ok-a' and batch['d']['url'].iloc[0] == 'ok-d'
+    assert batch.summary()['failed'] == 2
+
+
+def test_requests_run_concurrently():
+    symbols = {f'sym{i}': f'url{i}' for i in range(8)}
+    fetch = fake_fetch({url: 0.1 for url in symbols.values()})
+
+    batch = kline_data.get_klines_bulk(symbols, fetch=fetch, max_workers=4)
+
+    assert max(fetch.peak) == 4
+    assert batch.elapsed < 0.5
+    assert batch.summary()['speedup'] > 2
+
+
+def test_empty_symbols():
+    batch = kline_data.get_klines_bulk({}, fetch=fake_fetch({}))
+    assert dict(batch) == {} and batch.errors == {}
@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+import kline_data
+import kline_store
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """替换接口：返回截止到end_date（默认今天）的30根日K线（按start_date过滤），并记录每次请求的(start_date, end_date)"""
+    calls = []
+
+    def fetch_kline(url, start_date=None, end_date=None):
+        calls.append((start_date, end_date))
+        end = datetime.now() if end_date is None else datetime.strptime(end_date, '%Y-%m-%d')
+        dates = pd.date_range(end=end.replace(hour=0, minute=0, second=0, microsecond=0), periods=30, freq='D')
+        kline_df = pd.DataFrame({'open': 1.0, 'high': 1.0, 'low': 1.0, 'close': 1.0, 'volume': 1.0}, index=dates)
+        kline_df.index.name = 'date'
+        if start_date:
+            kline_df = kline_df[kline_df.index >= pd.Timestamp(start_date)]
+        return {'success': True, 'data': kline_df, 'error': None, 'level': None, 'latency': 0.0, 'attempts': 1}
+
+    monkeypatch.setattr(kline_data, 'fetch_kline', fetch_kline)
+    return calls
+
+
+def test_history_sync_does_not_cover_latest(tmp_path, upstream):
+    store = kline_store.KlineStore(str(tmp_path / 'kline.db'))
+    today = datetime.now().date()
+
+    store.fetch_kline('x', None, str(today - timedelta(days=7)))
+    result = store.fetch_kline('x')
+
+    assert len(upstream) == 2
+    assert result['data'].index[-1].date() == today
+
+
+def test_covered_requests_are_served_locally(tmp_path, upstream):
+    store = kline_store.KlineStore(str(tmp_path / 'kline.db'))
+    today = datetime.now().date()
+
+    store.fetch_kline('x')
+    store.fetch_kline('x')
+    store.fetch_kline('x', None, str(today))
+    store.fetch_kline('x', None, str(today - timedelta(days=10)))
+
+    assert len(upstream) == 1
+
+
+def test_latest_data_expires_after_max_age(tmp_path, upstream):
+    store = kline_store.KlineStore(str(tmp_path / 'kline.db'))
+    store.fetch_kline('x')
+    synced_end, _ = store.get_sync_state('x')
+    now = int(datetime.now().timestamp())
+
+    assert store.is_covered(synced_end, now=now)
+    assert not store.is_covered(synced_end, now=now + store.max_age + 1)
+
+
+def test_max_age_shorter_than_price_refresh():
+    import price_service
+
+    shortest_refresh = price_service.DEFAULT_INTERVAL * (1 - price_service.DEFAULT_JITTER)
+    assert kline_store.DEFAULT_MAX_AGE < shortest_refresh
+
+
+def test_second_call_in_covered_window_skips_upstream(tmp_path, upstream):
+    store = kline_store.KlineStore(str(tmp_path / 'kline.db'))
+    end_date = str(datetime.now().date() - timedelta(days=5))
+
+    first = store.fetch_kline('x', None, end_date)
+    second = store.fetch_kline('x', None, end_date)
+
+    assert len(upstream) == 1
+    assert second['attempts'] == 0
+    pd.testing.assert_frame_equal(first['data'], second['data'])
+
+
+def test_extended_end_date_fetches_only_the_tail(tmp_path, upstream):
+    store = kline_store.KlineStore(str(tmp_path / 'kline.db'))
+    today = datetime.now().date()
+
+    store.fetch_kline('x', None, str(today - timedelta(days=10)))
+    _, last_ts = store.get_sync_state('x')
+    result = store.fetch_kline('x', None, str(today - timedelta(days=5)))
+
+    assert len(upstream) == 2
+    # 第二次请求只解析本地最后一根K线当天及之后的部分
+    assert upstream[1] == (datetime.fromtimestamp(last_ts).strftime('%Y-%m-%d'), str(today - timedelta(days=5)))
+    assert result['data'].index[-1].date() == today - timedelta(days=5)
+    # 原有30根 + 新增5根
+    assert len(store.load('x')) == 35
+
+
+def test_merge_since_ts_keeps_older_bars(tmp_path):
+    store = kline_store.KlineStore(str(tmp_path / 'kline.db'))
+    dates = pd.date_range(end=datetime.now().replace(hour=0, minute=0, second=0, microsecond=0), periods=10, freq='D')
+    original = pd.DataFrame({'open': 1.0, 'high': 1.0, 'low': 1.0, 'close': 1.0, 'volume': 1.0}, index=dates)
+    store.merge('x', original)
+
+    # 新数据中所有K线都被修改，但只有since_ts及之后的K线允许写入
+    revised = original * 2
+    since_ts = int(dates[6].timestamp())
+    written = store.merge('x', revised, since_ts=since_ts)
+
+    stored = store.load('x')
+    assert written == 4
+    assert (stored['close'].iloc[:6] == 1.0).all()
+    assert (stored['close'].iloc[6:] == 2.0).all()
@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import pytest
+
+from on_sale_store import OnSaleStore
+
+NOW = datetime(2024, 3, 10, 18, 0)
+
+
+def result(*platforms):
+    """on_sale_data 的返回格式：platforms 为 (平台, 在售量, 最低价)"""
+    return {
+        'success': True,
+        'platforms': [{'platform': name, 'on_sale_count': count, 'min_price': price}
+                      for name, count, price in platforms],
+    }
+
+
+def ts(*args):
+    return int(datetime(*args).timestamp())
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = OnSaleStore(str(tmp_path / 'snapshots.db'))
+    store.record('AK', result(('buff', 10, 5.0), ('youpin', 4, 4.5)), ts(2024, 3, 1, 12))  # 窗口之外
+    store.record('AK', result(('buff', 8, 6.0), ('youpin', 2, 0)), ts(2024, 3, 8, 9, 0))
+    store.record('AK', result(('buff', 7, 6.5)), ts(2024, 3, 8, 21, 30))
+    store.record('AK', result(('buff', 5, 7.0), ('youpin', 1, 6.8)), ts(2024, 3, 10, 8, 15))
+    store.record('M4', result(('buff', 99, 1.0)), ts(2024, 3, 10, 8, 15))
+    return store
+
+
+def test_day_granularity_keeps_last_snapshot_per_day(store):
+    history = store.get_history('AK', days=3, now=NOW)
+
+    assert history == [
+        {'date': '2024-03-08', 'on_sale_count': 7, 'min_price': 6.5},
+        {'date': '2024-03-10', 'on_sale_count': 6, 'min_price': 6.8},
+    ]
+
+
+def test_snapshot_granularity_returns_each_snapshot(store):
+    history = store.get_history('AK', days=3, granularity='snapshot', now=NOW)
+
+    # 价格为0的平台不参与最低价
+    assert history == [
+        {'date': '2024-03-08 09:00', 'on_sale_count': 10, 'min_price': 6.0},
+        {'date': '2024-03-08 21:30', 'on_sale_count': 7, 'min_price': 6.5},
+        {'date': '2024-03-10 08:15', 'on_sale_count': 6, 'min_price': 6.8},
+    ]
+
+
+def test_window_starts_at_midnight(store):
+    assert [row['date'] for row in store.get_history('AK', days=1, now=NOW)] == ['2024-03-10']
+    assert len(store.get_history('AK', days=30, now=NOW)) == 3
+    assert store.get_history('missing', days=30, now=NOW) == []
+
+
+def test_duplicate_snapshot_is_ignored(store):
+    snapshot_ts = ts(2024, 3, 10, 8, 15)
+
+    store.record('AK', result(('buff', 500, 1.0), ('steam', 3, 9.0)), snapshot_ts)
+
+    # 已有的 (物品, 时间, 平台) 保持不变，新平台照常写入
+    assert store.get_snapshots('AK', snapshot_ts, snapshot_ts + 1) == [(snapshot_ts, 5 + 1 + 3, 6.8)]
+
+
+def test_failed_result_is_not_recorded(store):
+    assert store.record('AK', {'success': False, 'error': 'x'}, ts(2024, 3, 10, 9)) == 0
+    assert len(store.get_history('AK', days=1, granularity='snapshot', now=NOW)) == 1
@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+from portfolio_valuation import PortfolioValuation
+
+
+def portfolio_of(positions, cash=1000.0):
+    return {'cash': cash, 'positions': {symbol: {'quantity': q, 'avg_price': p} for symbol, (q, p) in positions.items()}}
+
+
+def test_from_portfolio_totals():
+    prices = {'a': 12.0, 'b': 3.0}
+    valuation = PortfolioValuation.from_portfolio(portfolio_of({'a': (2, 10.0), 'b': (5, 4.0)}), prices.get)
+
+    assert valuation.market_value == 39.0
+    assert valuation.cost_value == 40.0
+    assert valuation.total_value == 1039.0
+    assert valuation.total_pnl == -1.0
+    assert valuation.total_pnl_percent == pytest.approx(-2.5)
+    assert valuation.position('a') == (24.0, 4.0, pytest.approx(20.0))
+    assert valuation.position('missing') == (0, 0, 0)
+
+
+def test_fill_and_price_updates():
+    valuation = PortfolioValuation.from_portfolio(portfolio_of({'a': (2, 10.0)}), lambda symbol: 10.0)
+
+    valuation.on_fill('b', 3, 5.0, cash=985.0)
+    assert valuation.positions['b']['price'] == 5.0
+    valuation.on_price('b', 6.0)
+    valuation.on_price('missing', 1.0)
+    valuation.on_fill('a', 0, 10.0)
+
+    assert list(valuation.positions) == ['b']
+    assert (valuation.market_value, valuation.cost_value, valuation.cash) == (18.0, 15.0, 985.0)
+    # 未给出价格时沿用已有价格
+    valuation.on_fill('b', 4, 5.25)
+    assert valuation.position('b')[0] == 24.0
+
+
+def test_incremental_totals_match_rebuild():
+    rng = random.Random(3)
+    symbols = [f's{i}' for i in range(20)]
+    positions = {}
+    prices = {}
+    valuation = PortfolioValuation.from_portfolio(portfolio_of({}), prices.get)
+
+    for _ in range(20000):
+        symbol = rng.choice(symbols)
+        if symbol in positions and rng.random() < 0.8:
+            prices[symbol] = round(rng.uniform(0.01, 1000), 2) + rng.random() * 1e-7
+            valuation.on_price(symbol, prices[symbol])
+        else:
+            quantity = rng.choice([0, rng.randint(1, 500)])
+            avg_price = round(rng.uniform(0.01, 1000), 3)
+            if symbol not in positions:
+                # 新建仓的标的以持仓均价作为价格，已持有的沿用原价格
+                prices[symbol] = avg_price
+            valuation.on_fill(symbol, quantity, avg_price)
+            if quantity:
+                positions[symbol] = (quantity, avg_price)
+            else:
+                positions.pop(symbol, None)
+
+    rebuilt = PortfolioValuation.from_portfolio(portfolio_of(positions), prices.get)
+    assert valuation.market_value == pytest.approx(rebuilt.market_value, rel=1e-9)
+    assert valuation.cost_value == pytest.approx(rebuilt.cost_value, rel=1e-9)
+
+    valuation.resync()
+    assert (valuation.market_value, valuation.cost_value) == (rebuilt.market_value, rebuilt.cost_value)
+    assert valuation.positions == rebuilt.positions
+
+
+def test_resync_clears_drift_after_closing_everything():
+    valuation = PortfolioValuation.from_portfolio(portfolio_of({}), lambda symbol: 0.1)
+    for i in range(100):
+        valuation.on_fill(f's{i}', 3, 0.1, price=0.7)
+        valuation.on_price(f's{i}', 0.3)
+    for i in range(100):
+        valuation.on_fill(f's{i}', 0, 0.1)
+    # 增量加减留下了浮点残差
+    assert valuation.market_value != 0.0
+
+    valuation.resync()
+
+    assert (valuation.market_value, valuation.cost_value) == (0.0, 0.0)
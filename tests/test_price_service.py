@@ -0,0 +1,112 @@
+import pandas as pd
+import pytest
+
+import kline_data
+from price_service import DEFAULT_PRICE, PriceService
+
+T0 = 1_700_000_000.0
+
+
+class Clock:
+    def __init__(self, now=T0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class Upstream:
+    """替换单标的获取：url 即标的名称，outcomes[url] 依次为每次请求的收盘价（None 表示失败）"""
+
+    def __init__(self, **outcomes):
+        self.outcomes = {url: list(values) for url, values in outcomes.items()}
+        self.calls = []
+
+    def __call__(self, url, start_date=None, end_date=None):
+        self.calls.append(url)
+        close = self.outcomes[url].pop(0)
+        if close is None:
+            return kline_data._failure('❌ 网络连接失败', attempts=1)
+        frame = pd.DataFrame({'close': [close]}, index=pd.DatetimeIndex(['2024-01-01'], name='date'))
+        return {'success': True, 'data': frame, 'error': None, 'level': None, 'latency': 0.0, 'attempts': 1}
+
+
+def make_service(upstream, clock, **kwargs):
+    kwargs.setdefault('interval', 60)
+    return PriceService({url: url for url in upstream.outcomes}, fetch=upstream, jitter=0, clock=clock, **kwargs)
+
+
+def test_failed_symbol_backs_off_exponentially_up_to_cap():
+    clock = Clock()
+    upstream = Upstream(bad=[None] * 10, ok=[1.0] * 100)
+    service = make_service(upstream, clock, max_backoff=200)
+
+    # 每次失败后的退避：60, 120, 200(封顶), 200 秒
+    attempts = []
+    for _ in range(30):
+        upstream.calls.clear()
+        service.refresh()
+        if 'bad' in upstream.calls:
+            attempts.append(clock.now - T0)
+        assert 'ok' in upstream.calls
+        clock.now += 20
+
+    assert attempts == [0, 60, 180, 380, 580]
+    assert service.get_price('bad')['status'] == 'error'
+    assert service.get_price('bad')['price'] == DEFAULT_PRICE
+    assert service.get_price('ok')['status'] == 'success'
+
+
+def test_success_resets_backoff():
+    clock = Clock()
+    upstream = Upstream(flaky=[None, None, 5.0, None])
+    service = make_service(upstream, clock)
+
+    service.refresh()
+    clock.now += 60
+    service.refresh()
+    clock.now += 120
+    service.refresh()
+    assert service.get_current_price('flaky') == 5.0
+
+    # 成功后失败计数清零，再次失败时重新从一个刷新周期开始退避
+    clock.now += 60
+    service.refresh()
+    assert service.get_price('flaky')['status'] == 'error'
+    assert service.get_current_price('flaky') == 5.0
+    clock.now += 59
+    upstream.calls.clear()
+    service.refresh()
+    assert upstream.calls == []
+
+
+def test_price_goes_stale_after_ttl():
+    clock = Clock()
+    upstream = Upstream(a=[2.0, None])
+    service = make_service(upstream, clock, ttl=180)
+
+    service.refresh()
+    clock.now += 180
+    fresh = service.get_price('a')
+    clock.now += 1
+    stale = service.get_price('a')
+
+    assert (fresh['stale'], fresh['age']) == (False, pytest.approx(180))
+    assert (stale['stale'], stale['price']) == (True, 2.0)
+    assert service.snapshot()['a']['stale']
+
+
+def test_failed_refresh_keeps_price_but_marks_stale():
+    clock = Clock()
+    upstream = Upstream(a=[2.0, None])
+    service = make_service(upstream, clock)
+
+    service.refresh()
+    clock.now += 60
+    updated = service.refresh()
+
+    entry = service.get_price('a')
+    assert updated == 0
+    assert (entry['price'], entry['status'], entry['stale']) == (2.0, 'error', True)
+    assert service.refresh_count == 2
+    assert service.last_stats['failed'] == 1
@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import http_client
+import on_sale_data
+
+RATE = 40.0
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """本地在售量接口：每个请求耗时 delay 秒，throttle 中的物品第一次请求返回429"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        item = self.path.lstrip('/')
+        with server.lock:
+            server.arrivals.append(time.monotonic())
+            throttled = item in server.throttle
+            server.throttle.discard(item)
+        time.sleep(server.delay.get(item, 0.05))
+        if throttled:
+            body, status = b'{}', 429
+        else:
+            rows = [{'platformName': 'stub', 'sellCount': 3, 'price': 1.0}]
+            body, status = json.dumps({'success': True, 'data': rows}).encode(), 200
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.arrivals = []
+    server.throttle = set()
+    server.delay = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    base = f'http://127.0.0.1:{server.server_address[1]}'
+    names = [f'item{i}' for i in range(40)]
+    monkeypatch.setattr(on_sale_data, 'ON_SALE_URL_MAP', {name: f'{base}/{name}' for name in names})
+    # 退避时间缩短到毫秒级，重试几乎立即发出
+    client = http_client.HttpClient(retry=http_client.RetryPolicy(base=0.001, jitter=False))
+    monkeypatch.setattr(http_client, '_client', client)
+    yield server, names
+    server.shutdown()
+    server.server_close()
+    client.session.close()
+
+
+def observed_rate(arrivals):
+    return (len(arrivals) - 1) / (arrivals[-1] - arrivals[0])
+
+
+def test_throughput_reaches_rate_limit(stub):
+    server, names = stub
+
+    start = time.monotonic()
+    results = dict(on_sale_data.iter_on_sale_data(names, rate=RATE, max_workers=8))
+    elapsed = time.monotonic() - start
+
+    assert all(result['success'] for result in results.values())
+    assert len(server.arrivals) == len(names)
+    # 单个请求耗时50ms，8个并发足以跑满上限：吞吐量接近且不超过 rate
+    assert 0.85 * RATE <= len(names) / elapsed
+    assert observed_rate(server.arrivals) <= 1.05 * RATE
+
+
+def test_retries_are_rate_limited(stub):
+    server, names = stub
+    server.throttle.update(names)
+
+    results = dict(on_sale_data.iter_on_sale_data(names, rate=RATE, max_workers=8))
+
+    assert all(result['success'] for result in results.values())
+    assert len(server.arrivals) == 2 * len(names)
+    assert observed_rate(server.arrivals) <= 1.05 * RATE
+
+
+def test_batch_keeps_item_order(stub):
+    server, names = stub
+    names = names[:8]
+    # 靠前的物品响应更慢，完成顺序与请求顺序相反
+    server.delay.update({name: 0.2 - 0.02 * i for i, name in enumerate(names)})
+
+    results = on_sale_data.batch_get_on_sale_data(names, rate=1000.0, max_workers=8)
+
+    assert list(results) == names
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+import backtest_engine
+import strategy_optimizer
+
+PARAMS = [(6.7, 0.07, 3, -0.05), (5.0, 0.05, 2, -0.03)]
+
+
+def make_close(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    return pd.Series(close, index=pd.date_range('2020-01-01', periods=n, freq='D'), name='close')
+
+
+def test_sliced_and_fresh_indicators_do_not_share_cache():
+    close = make_close(300)
+    indicators = backtest_engine.prepare_indicators(close)
+    window = close.iloc[100:300].to_frame()
+    cache = strategy_optimizer.ResultCache()
+
+    sliced = strategy_optimizer.Evaluator(window, 'x', cache, max_workers=1,
+                                          indicators=backtest_engine.slice_indicators(indicators, 100, 300))
+    sliced.evaluate(PARAMS)
+    fresh = strategy_optimizer.Evaluator(window, 'x', cache, max_workers=1)
+    fresh.evaluate(PARAMS)
+
+    assert sliced.prefix != fresh.prefix
+    assert fresh.cached == 0
+    assert len(cache) == 2 * len(PARAMS)
+
+
+def test_same_inputs_hit_cache():
+    window = make_close(200).to_frame()
+    cache = strategy_optimizer.ResultCache()
+
+    first = strategy_optimizer.Evaluator(window, 'x', cache, max_workers=1).evaluate(PARAMS)
+    again = strategy_optimizer.Evaluator(window, 'x', cache, max_workers=1)
+
+    assert again.evaluate(PARAMS) == first
+    assert again.cached == len(PARAMS)
+
+
+def test_halving_search_runs_on_precomputed_indicators():
+    kline_df = make_close(600).to_frame()
+    axes = strategy_optimizer.build_param_axes((5.0, 7.0), (0.03, 0.07), (2, 4), (-0.05, -0.03))
+
+    result = strategy_optimizer.search(kline_df, axes, mode='halving', budget=60, seed=0, max_workers=1,
+                                       cache=strategy_optimizer.ResultCache())
+
+    assert result['best_params'] is not None
+    assert 0 < result['spent'] <= 60
+
+
+def test_executor_spawns_workers():
+    indicators = backtest_engine.prepare_indicators(make_close(200))
+    try:
+        executor = strategy_optimizer.get_executor(2)
+        assert executor._mp_context.get_start_method() == 'spawn'
+        result = executor.submit(strategy_optimizer._evaluate_chunk, indicators, PARAMS).result(timeout=120)
+    finally:
+        strategy_optimizer._reset_executor()
+
+    assert result == strategy_optimizer._evaluate_chunk(indicators, PARAMS)
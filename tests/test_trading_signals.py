@@ -0,0 +1,140 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicators import with_indicators
+
+pytest.importorskip('streamlit')
+pytest.importorskip('plotly')
+
+
+@pytest.fixture(scope='module')
+def trading_app(tmp_path_factory):
+    # 导入时会在当前目录创建本地K线库，放到临时目录中
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('app'))
+    try:
+        import trading_app
+    finally:
+        os.chdir(cwd)
+    return trading_app
+
+
+def loop_analyze_trading_signals(df):
+    """向量化之前的逐行实现，作为对照"""
+    df = df.copy()
+    df['signal'] = 0
+    df['signal_type'] = ''
+    df['trend_status'] = ''
+
+    for i in range(60, len(df)):
+        signals = []
+
+        current_price = df['close'].iloc[i]
+        ma60_current = df['ma60'].iloc[i]
+        ma60_prev = df['ma60'].iloc[i-5] if i >= 65 else ma60_current
+
+        if current_price > ma60_current and ma60_current > ma60_prev:
+            trend = "强势上涨"
+            trend_bullish = True
+        elif current_price > ma60_current and ma60_current <= ma60_prev:
+            trend = "震荡上涨"
+            trend_bullish = True
+        elif current_price <= ma60_current and ma60_current > ma60_prev:
+            trend = "高位震荡"
+            trend_bullish = False
+        else:
+            trend = "下跌趋势"
+            trend_bullish = False
+
+        df.iloc[i, df.columns.get_loc('trend_status')] = trend
+
+        if trend_bullish:
+            buy_conditions = []
+            if (df['ma5'].iloc[i] > df['ma20'].iloc[i] and
+                    df['ma5'].iloc[i-1] <= df['ma20'].iloc[i-1]):
+                buy_conditions.append('MA5上穿MA20')
+            if (current_price > df['ma20'].iloc[i] and
+                    current_price < df['ma20'].iloc[i] * 1.03 and
+                    df['close'].iloc[i-1] <= df['ma20'].iloc[i-1]):
+                buy_conditions.append('回调MA20后反弹')
+            if (df['rsi'].iloc[i] > 35 and df['rsi'].iloc[i] < 60 and
+                    df['rsi'].iloc[i-1] <= 35):
+                buy_conditions.append('RSI超卖回升')
+            if (df['macd'].iloc[i] > df['macd_signal'].iloc[i] and
+                    df['macd'].iloc[i-1] <= df['macd_signal'].iloc[i-1] and
+                    df['macd'].iloc[i] > 0):
+                buy_conditions.append('MACD金叉')
+            if len(buy_conditions) >= 2:
+                signals.append(f"买入信号: {', '.join(buy_conditions)}")
+
+        sell_conditions = []
+        if not trend_bullish and trend in ["高位震荡", "下跌趋势"]:
+            if (df['ma5'].iloc[i] < df['ma20'].iloc[i] and
+                    df['ma5'].iloc[i-1] >= df['ma20'].iloc[i-1]):
+                sell_conditions.append('MA5下穿MA20')
+        if (df['rsi'].iloc[i] > 75 and df['rsi'].iloc[i-1] > df['rsi'].iloc[i] and
+                current_price < df['close'].iloc[i-1]):
+            sell_conditions.append('极度超买回落')
+        if (current_price < df['ma60'].iloc[i] and
+                df['close'].iloc[i-1] >= df['ma60'].iloc[i-1]):
+            sell_conditions.append('跌破60日均线')
+        if (df['macd'].iloc[i] < df['macd_signal'].iloc[i] and
+                df['macd'].iloc[i-1] >= df['macd_signal'].iloc[i-1] and
+                df['macd'].iloc[i] < 0):
+            sell_conditions.append('MACD死叉转负')
+        if len(sell_conditions) >= 2:
+            signals.append(f"卖出信号: {', '.join(sell_conditions)}")
+
+        if signals:
+            if any('买入信号' in s for s in signals):
+                df.iloc[i, df.columns.get_loc('signal')] = 1
+            elif any('卖出信号' in s for s in signals):
+                df.iloc[i, df.columns.get_loc('signal')] = -1
+            df.iloc[i, df.columns.get_loc('signal_type')] = '; '.join(signals)
+
+    return df
+
+
+def make_klines(n, seed, plateaus=False, gaps=False):
+    """随机游走K线；plateaus 插入价格不变的区间（触发 <=/>= 的相等情形），gaps 插入缺失值"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    if plateaus:
+        for start in rng.integers(0, max(n - 30, 1), size=max(n // 100, 1)):
+            close[start:start + rng.integers(5, 30)] = close[start]
+    spread = np.abs(rng.normal(0, 0.01, n)) * close
+    kline_df = pd.DataFrame({
+        'open': close,
+        'high': close + spread,
+        'low': close - spread,
+        'close': close,
+        'volume': rng.integers(1, 1000, n).astype(float),
+    }, index=pd.date_range('2020-01-01', periods=n, freq='D'))
+    kline_df.index.name = 'date'
+    kline_df = with_indicators(kline_df)
+    if gaps:
+        for column in ('ma5', 'ma20', 'rsi', 'macd'):
+            kline_df.loc[kline_df.index[rng.integers(0, n, size=max(n // 50, 1))], column] = np.nan
+    return kline_df
+
+
+CASES = ([(n, seed, False, False) for seed, n in enumerate([0, 1, 59, 60, 61, 64, 65, 66, 120])]
+         + [(500, seed, plateaus, gaps) for seed in range(10, 30) for plateaus in (False, True) for gaps in (False, True)])
+
+
+@pytest.mark.parametrize('n, seed, plateaus, gaps', CASES)
+def test_matches_loop(trading_app, n, seed, plateaus, gaps):
+    kline_df = make_klines(n, seed, plateaus, gaps)
+    expected = loop_analyze_trading_signals(kline_df)
+    result = trading_app.analyze_trading_signals(kline_df)
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_cases_fire_signals(trading_app):
+    kline_df = make_klines(3000, 1, plateaus=True)
+    result = trading_app.analyze_trading_signals(kline_df)
+    assert (result['signal'] == 1).any() and (result['signal'] == -1).any()
+    pd.testing.assert_frame_equal(result, loop_analyze_trading_signals(kline_df))
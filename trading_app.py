@@ -4,11 +4,20 @@ import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
 from plotly.subplots import make_subplots
-import requests
 from datetime import datetime, timedelta
-import time
 import json
 import warnings
+import kline_data
+from kline_store import KlineStore, get_type_val
+from price_service import PriceService
+from on_sale_store import OnSaleStore, SnapshotRecorder
+from indicators import (IndicatorEngine, IndicatorFrame, COLUMN_INDEX, INDICATOR_CACHE, cached_frame,
+                        cached_indicators, compute_panel, frame_key, panel_frames, stack_klines)
+from backtest_engine import backtest_strategy, get_risk_metrics
+import strategy_optimizer
+import symbol_registry
+from symbol_registry import DATA_SOURCES
+from portfolio_valuation import PortfolioValuation
 warnings.filterwarnings('ignore')
 
 # 导入在售量数据集成模块
@@ -374,395 +383,248 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# 数据源库（分组结构）
-DATA_SOURCES = {
-    "龙头大件": {
-        "树篱迷宫（久经沙场）": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=525873303&platform=YOUPIN&specialStyle",
-        "薄荷（久经沙场）": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=489477781&platform=YOUPIN&specialStyle",
-        "超导体（久经沙场）": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=553370575&platform=YOUPIN&specialStyle",
-        "深红和服（久经沙场）": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=339340704&platform=YOUPIN&specialStyle",
-        "潘多拉之盒（久经沙场）": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=495302338&platform=YOUPIN&specialStyle",
-        "蝴蝶刀伽马多普勒": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=914710920195035136&platform=YOUPIN&specialStyle",
-        "爪子刀伽马多普勒":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=5534979&platform=YOUPIN&specialStyle",
-        "m9刺刀伽马多普勒":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=50942855&platform=YOUPIN&specialStyle"
-    },
-    "收藏品": {
-        "水栽竹": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=26422&platform=YOUPIN&specialStyle",
-        "赤红新星": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=24693&platform=YOUPIN&specialStyle",
-        "九头金蛇": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=914680597258567680&platform=YOUPIN&specialStyle",
-        "X射线":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=814309374440767488&platform=YOUPIN&specialStyle",
-        "火蛇":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=26664&platform=YOUPIN&specialStyle",
-        "黄金藤蔓":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=915059323698278400&platform=YOUPIN&specialStyle",
-        "澜磷":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=808842805052440576&platform=YOUPIN&specialStyle",
-    },
-    "千战ak": {
-        "血腥运动": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=553370749&platform=YOUPIN&specialStyle",
-        "燃料喷射器": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=27166&platform=YOUPIN&specialStyle",
-        "火神": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=24281&platform=YOUPIN&specialStyle",
-        "抽象派":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=914726163117477888&platform=YOUPIN&specialStyle",
-        "霓虹骑士":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=553468213&platform=YOUPIN&specialStyle",
-        "二西莫夫":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=553480796&platform=YOUPIN&specialStyle",
-        "皇后":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=553454872&platform=YOUPIN&specialStyle",
-        "红线":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=24339&platform=YOUPIN&specialStyle",
-        "传承":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=1229264305591787520&platform=YOUPIN&specialStyle",
-        "深海复仇":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=24721&platform=YOUPIN&specialStyle",
-        "霓虹革命":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=87809662&platform=YOUPIN&specialStyle",
-    },
-    "武库":{
-        "怪兽在b": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=1315999843394654208&platform=YOUPIN&specialStyle",
-        "m4a1渐变之色": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=1315817295203307520&platform=YOUPIN&specialStyle",
-        "m4a1蒸汽波":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=1316060605966323712&platform=YOUPIN&specialStyle",
-        "awp克拉考": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=1315936965627445248&platform=YOUPIN&specialStyle",
-    },
-    "贴纸": {
-        "21tyloo": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=925497374167523328&platform=YOUPIN&specialStyle",
-        "22C9": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=995815251158949888&platform=YOUPIN&specialStyle",
-        "金贴lvg": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=1244761416324870144&platform=YOUPIN&specialStyle",
-        "24上海金zywoo":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=1336126932723073024&platform=YOUPIN&specialStyle"
-    },
-    "探员": {
-        "出逃的萨利": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=808803044176429056&platform=YOUPIN&specialStyle",
-        "迈阿密人士": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=808805648347430912&platform=YOUPIN&specialStyle",
-        "红苍蝇":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=914706546146541568&platform=YOUPIN&specialStyle",
-        "蛙人":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=914672680855793664&platform=YOUPIN&specialStyle",
-        "老K":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=808792879539683328&platform=YOUPIN&specialStyle",
-        "薇帕姐":"https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=914664236297879552&platform=YOUPIN&specialStyle",
-    }
-
-}
+# 本地K线存储（优化、回测、持仓分析共用，只增量获取新K线）
+KLINE_STORE = KlineStore()
 
 # 数据获取函数
 def get_kline(url, start_date=None, end_date=None):
     """爬取网站K线数据（包含成交量）"""
-    kline_ls = []
-    max_retries = 3  # 最大重试次数
-    
-    # 处理时间范围
-    end_ts = int(datetime.now().timestamp()) if end_date is None else int(datetime.strptime(end_date, '%Y-%m-%d').timestamp())
-    start_ts = 0 if start_date is None else int(datetime.strptime(start_date, '%Y-%m-%d').timestamp())
-    
     # 只在时间范围过大时提示
     if start_date and end_date:
         date_range_days = (datetime.strptime(end_date, '%Y-%m-%d') - datetime.strptime(start_date, '%Y-%m-%d')).days
         if date_range_days > 365:
             st.warning(f"⚠️ 时间范围较大（{date_range_days}天），可能影响数据获取")
     
-    for retry in range(max_retries):
-        try:
-            ts = int(datetime.now().timestamp() * 1000)
-            request_url = url.format(ts, end_ts)
-            
-            response = requests.get(request_url, timeout=15)
-            
-            
-            if response.status_code != 200:
-                if retry < max_retries - 1:
-                    time.sleep(1)  # 等待1秒后重试
-                    continue
-                st.error(f"❌ 数据获取失败: HTTP {response.status_code}")
-                return pd.DataFrame(columns=['date', 'open', 'high', 'low', 'close', 'volume']).set_index('date')
-            
-            data = response.json()
-            if 'data' not in data:
-                if retry < max_retries - 1:
-                    time.sleep(1)
-                    continue
-                st.error(f"❌ 数据格式错误")
-                return pd.DataFrame(columns=['date', 'open', 'high', 'low', 'close', 'volume']).set_index('date')
-            
-            kline_data = data['data']
-            if not kline_data:
-                if retry < max_retries - 1:
-                    time.sleep(1)
-                    continue
-                st.warning("⚠️ 该时间段内无数据，请尝试调整时间范围或选择其他标的")
-                return pd.DataFrame(columns=['date', 'open', 'high', 'low', 'close', 'volume']).set_index('date')
-            
-            kline_ls = kline_data
-            break
-            
-        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
-            if retry < max_retries - 1:
-                time.sleep(2)  # 网络问题等待更长时间
-                continue
-            st.error("❌ 网络连接失败，请检查网络或稍后重试")
-            return pd.DataFrame(columns=['date', 'open', 'high', 'low', 'close', 'volume']).set_index('date')
-        except Exception as e:
-            if retry < max_retries - 1:
-                time.sleep(1)
-                continue
-            st.error(f"❌ 数据获取出错: {str(e)}")
-            return pd.DataFrame(columns=['date', 'open', 'high', 'low', 'close', 'volume']).set_index('date')
+    result = KLINE_STORE.fetch_kline(url, start_date, end_date)
+    if not result['success']:
+        if result['level'] == 'warning':
+            st.warning(result['error'])
+        else:
+            st.error(result['error'])
     
-    try:
-        # 数据处理
-        kline_df = pd.DataFrame(kline_ls)
-        
-        # 检查数据是否为空
-        if kline_df.empty:
-            st.warning("⚠️ 获取的数据为空，请尝试调整时间范围")
-            return pd.DataFrame(columns=['date', 'open', 'high', 'low', 'close', 'volume']).set_index('date')
-        
-        # 检查列数
-        if len(kline_df.columns) < 6:
-            st.error(f"❌ 数据格式错误，期望6列，实际{len(kline_df.columns)}列")
-            return pd.DataFrame(columns=['date', 'open', 'high', 'low', 'close', 'volume']).set_index('date')
-        
-        # 提取完整的OHLCV数据：时间戳、开盘价、最高价、最低价、收盘价、成交量
-        kline_df = kline_df.iloc[:, [0, 1, 2, 3, 4, 5]]
-        kline_df.columns = ['date', 'open', 'high', 'low', 'close', 'volume']
-        
-        # 处理时间戳
-        try:
-            kline_df['date'] = kline_df['date'].apply(lambda x: datetime.fromtimestamp(int(x) / 1000 if int(x) > 1e10 else int(x)))
-        except Exception as e:
-            st.error(f"❌ 时间戳处理错误: {str(e)}")
-            return pd.DataFrame(columns=['date', 'open', 'high', 'low', 'close', 'volume']).set_index('date')
-        
-        # 转换数据类型
-        for col in ['open', 'high', 'low', 'close', 'volume']:
-            kline_df[col] = pd.to_numeric(kline_df[col], errors='coerce')
-        
-        # 删除无效数据
-        kline_df = kline_df.dropna(subset=['close'])
-        
-        if kline_df.empty:
-            st.warning("⚠️ 数据处理后为空，可能数据质量有问题")
-            return pd.DataFrame(columns=['date', 'open', 'high', 'low', 'close', 'volume']).set_index('date')
-        
-        # 应用时间范围筛选
-        if start_date or end_date:
-            original_count = len(kline_df)
-            mask = pd.Series([True] * len(kline_df))
-            if start_date:
-                start_datetime = datetime.strptime(start_date, '%Y-%m-%d')
-                mask = mask & (kline_df['date'] >= start_datetime)
-            if end_date:
-                end_datetime = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
-                mask = mask & (kline_df['date'] < end_datetime)
-            kline_df = kline_df[mask]
-            
-            if len(kline_df) == 0:
-                st.warning("⚠️ 指定时间范围内无数据，请调整时间范围")
-                return pd.DataFrame(columns=['date', 'open', 'high', 'low', 'close', 'volume']).set_index('date')
-        
-        # 设置索引并排序
-        kline_df = kline_df.set_index('date').sort_index()
-        
-        # 最终检查
-        if kline_df.empty:
-            st.warning("⚠️ 最终数据为空")
-            return pd.DataFrame(columns=['open', 'high', 'low', 'close', 'volume'], index=pd.DatetimeIndex([], name='date'))
-        
-        return kline_df
-        
-    except Exception as e:
-        st.error(f"❌ 数据处理出错: {str(e)}")
-        return pd.DataFrame(columns=['date', 'open', 'high', 'low', 'close', 'volume']).set_index('date')
+    return result['data']
 
 # 技术指标计算函数
-def calculate_technical_indicators(df):
-    """计算技术指标"""
-    df = df.copy()
+def calculate_technical_indicators(df, symbol=None):
+    """
+    计算技术指标（单次遍历的NumPy实现，见 indicators.compute_indicators）
     
-    # 基础移动平均线
-    df['ma5'] = df['close'].rolling(5).mean()
-    df['ma10'] = df['close'].rolling(10).mean()
-    df['ma20'] = df['close'].rolling(20).mean()
-    df['ma30'] = df['close'].rolling(30).mean()
-    df['ma60'] = df['close'].rolling(60).mean()
-    
-    # 指数移动平均线
-    df['ema12'] = df['close'].ewm(span=12).mean()
-    df['ema26'] = df['close'].ewm(span=26).mean()
-    
-    # RSI相对强弱指标
-    delta = df['close'].diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-    rs = gain / loss
-    df['rsi'] = 100 - (100 / (1 + rs))
-    
-    # MACD指标
-    df['macd'] = df['ema12'] - df['ema26']
-    df['macd_signal'] = df['macd'].ewm(span=9).mean()
-    df['macd_histogram'] = df['macd'] - df['macd_signal']
-    
-    # 布林带
-    df['bb_middle'] = df['close'].rolling(20).mean()
-    bb_std = df['close'].rolling(20).std()
-    df['bb_upper'] = df['bb_middle'] + (bb_std * 2)
-    df['bb_lower'] = df['bb_middle'] - (bb_std * 2)
-    df['bb_position'] = (df['close'] - df['bb_lower']) / (df['bb_upper'] - df['bb_lower'])
-    
-    # KDJ指标
-    low_min = df['low'].rolling(9).min()
-    high_max = df['high'].rolling(9).max()
-    rsv = (df['close'] - low_min) / (high_max - low_min) * 100
-    df['k'] = rsv.ewm(com=2).mean()
-    df['d'] = df['k'].ewm(com=2).mean()
-    df['j'] = 3 * df['k'] - 2 * df['d']
-    
-    # OBV能量潮
-    df['obv'] = (df['volume'] * ((df['close'] > df['close'].shift(1)).astype(int) * 2 - 1)).cumsum()
-    
-    # MFI资金流量指数
-    typical_price = (df['high'] + df['low'] + df['close']) / 3
-    money_flow = typical_price * df['volume']
-    positive_flow = money_flow.where(typical_price > typical_price.shift(1), 0).rolling(14).sum()
-    negative_flow = money_flow.where(typical_price < typical_price.shift(1), 0).rolling(14).sum()
-    mfi_ratio = positive_flow / negative_flow
-    df['mfi'] = 100 - (100 / (1 + mfi_ratio))
-    
-    # ATR平均真实波幅
-    high_low = df['high'] - df['low']
-    high_close = (df['high'] - df['close'].shift(1)).abs()
-    low_close = (df['low'] - df['close'].shift(1)).abs()
-    true_range = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-    df['atr'] = true_range.rolling(14).mean()
-    
-    # 成交量比率
-    df['volume_ma'] = df['volume'].rolling(20).mean()
-    df['volume_ratio'] = df['volume'] / df['volume_ma']
+    相同K线数据的结果会被缓存，重复分析和Streamlit重跑时直接返回缓存的副本。
     
-    return df
+    Args:
+        symbol (str): 标的名称，用于缓存键（未提供时按数据摘要识别）
+    """
+    return cached_indicators(df, symbol)
+
+def _pandas_ta_indicators(df):
+    """使用pandas-ta计算技术指标（不经过缓存）"""
+    # 使用pandas_ta而不是talib
+    import pandas_ta as ta
+    
+    # 创建DataFrame的副本以避免警告
+    result = df.copy()
+    
+    # 计算MACD
+    result.ta.macd(close='close', fast=12, slow=26, signal=9, append=True)
+    
+    # 计算RSI
+    result.ta.rsi(close='close', length=14, append=True)
+    
+    # 计算布林带
+    result.ta.bbands(close='close', length=20, std=2, append=True)
+    
+    # 计算KDJ (随机指标)
+    result.ta.stoch(high='high', low='low', close='close', k=14, d=3, append=True)
+    
+    # 计算移动平均线
+    result.ta.sma(close='close', length=5, append=True, col_names=('SMA_5',))
+    result.ta.sma(close='close', length=10, append=True, col_names=('SMA_10',))
+    result.ta.sma(close='close', length=20, append=True, col_names=('SMA_20',))
+    
+    return result
 
 # 技术指标计算函数
-def calculate_technical_indicators_talib(df):
-    """使用pandas-ta计算技术指标（高性能版本）"""
+def calculate_technical_indicators_talib(df, symbol=None):
+    """使用pandas-ta计算技术指标（高性能版本，结果按K线数据缓存）"""
     try:
-        # 使用pandas_ta而不是talib
-        import pandas_ta as ta
-        
-        # 创建DataFrame的副本以避免警告
-        result = df.copy()
-        
-        # 计算MACD
-        result.ta.macd(close='close', fast=12, slow=26, signal=9, append=True)
-        
-        # 计算RSI
-        result.ta.rsi(close='close', length=14, append=True)
-        
-        # 计算布林带
-        result.ta.bbands(close='close', length=20, std=2, append=True)
-        
-        # 计算KDJ (随机指标)
-        result.ta.stoch(high='high', low='low', close='close', k=14, d=3, append=True)
-        
-        # 计算移动平均线
-        result.ta.sma(close='close', length=5, append=True, col_names=('SMA_5',))
-        result.ta.sma(close='close', length=10, append=True, col_names=('SMA_10',))
-        result.ta.sma(close='close', length=20, append=True, col_names=('SMA_20',))
-        
-        return result
+        return cached_frame(df, _pandas_ta_indicators, symbol, kind='pandas_ta')
     except Exception as e:
         print(f"pandas_ta计算失败: {str(e)}")
         # 回退到基本的技术指标计算
-        return calculate_technical_indicators(df)
+        return calculate_technical_indicators(df, symbol)
+
+def _shifted(values, periods):
+    """沿最后一维前移periods个数据点，开头不足的部分用NaN填充"""
+    out = np.full(values.shape, np.nan)
+    out[..., periods:] = values[..., :-periods]
+    return out
+
+def _trading_signal_masks(close, ma5, ma20, ma60, rsi, macd, macd_signal, position):
+    """
+    计算趋势状态和买卖条件（沿最后一维，可同时处理多个标的）
+    
+    Args:
+        position (np.ndarray): 每个数据点在该标的自身序列中的位置（多标的右对齐填充时开头为负数）
+    
+    Returns:
+        tuple: (trend, buy_conditions, sell_conditions, buy_signal, sell_signal)
+    """
+    close_prev = _shifted(close, 1)
+    ma5_prev = _shifted(ma5, 1)
+    ma20_prev = _shifted(ma20, 1)
+    ma60_prev_bar = _shifted(ma60, 1)
+    rsi_prev = _shifted(rsi, 1)
+    macd_prev = _shifted(macd, 1)
+    macd_signal_prev = _shifted(macd_signal, 1)
+    
+    # 1. 主趋势判断（基于60日均线，与5天前的MA60比较）
+    ma60_prev = np.where(position < 65, ma60, _shifted(ma60, 5))
+    
+    above_ma60 = close > ma60
+    ma60_rising = ma60 > ma60_prev
+    strong_up = above_ma60 & ma60_rising
+    range_up = ~strong_up & above_ma60 & (ma60 <= ma60_prev)
+    high_range = ~strong_up & ~range_up & (close <= ma60) & ma60_rising
+    trend_bullish = strong_up | range_up
+    
+    trend = np.full(close.shape, '下跌趋势', dtype=object)
+    trend[strong_up] = '强势上涨'
+    trend[range_up] = '震荡上涨'
+    trend[high_range] = '高位震荡'
+    
+    # 2. 买入条件（只在多头趋势中给出）
+    buy_conditions = [
+        ('MA5上穿MA20', (ma5 > ma20) & (ma5_prev <= ma20_prev)),
+        ('回调MA20后反弹', (close > ma20) & (close < ma20 * 1.03) & (close_prev <= ma20_prev)),
+        ('RSI超卖回升', (rsi > 35) & (rsi < 60) & (rsi_prev <= 35)),
+        ('MACD金叉', (macd > macd_signal) & (macd_prev <= macd_signal_prev) & (macd > 0)),
+    ]
+    
+    # 3. 卖出条件（更严格的条件，减少踏空）
+    sell_conditions = [
+        ('MA5下穿MA20', ~trend_bullish & (ma5 < ma20) & (ma5_prev >= ma20_prev)),
+        ('极度超买回落', (rsi > 75) & (rsi_prev > rsi) & (close < close_prev)),
+        ('跌破60日均线', (close < ma60) & (close_prev >= ma60_prev_bar)),
+        ('MACD死叉转负', (macd < macd_signal) & (macd_prev >= macd_signal_prev) & (macd < 0)),
+    ]
+    
+    # 至少满足2个条件才给出信号
+    buy_count = np.sum([mask for _, mask in buy_conditions], axis=0)
+    sell_count = np.sum([mask for _, mask in sell_conditions], axis=0)
+    buy_signal = trend_bullish & (buy_count >= 2)
+    sell_signal = sell_count >= 2
+    
+    # 从第60个数据点开始，确保MA60有效
+    valid = position >= 60
+    buy_signal &= valid
+    sell_signal &= valid
+    trend[~valid] = ''
+    
+    return trend, buy_conditions, sell_conditions, buy_signal, sell_signal
+
+def _signal_types(buy_conditions, sell_conditions, buy_signal, sell_signal):
+    """生成信号说明文字（只遍历有信号的数据点）"""
+    signal_type = np.full(buy_signal.shape, '', dtype=object)
+    for i in np.flatnonzero(buy_signal | sell_signal):
+        signals = []
+        if buy_signal[i]:
+            signals.append(f"买入信号: {', '.join(name for name, mask in buy_conditions if mask[i])}")
+        if sell_signal[i]:
+            signals.append(f"卖出信号: {', '.join(name for name, mask in sell_conditions if mask[i])}")
+        signal_type[i] = '; '.join(signals)
+    return signal_type
 
 # 优化的交易信号分析
 def analyze_trading_signals(df):
-    """优化的交易信号分析 - 基于主趋势判断"""
+    """优化的交易信号分析 - 基于主趋势判断（向量化实现）"""
     df = df.copy()
     df['signal'] = 0
     df['signal_type'] = ''
     df['trend_status'] = ''  # 趋势状态
     
-    for i in range(60, len(df)):  # 从第60个数据点开始，确保MA60有效
-        signals = []
-        
-        # 1. 主趋势判断（基于60日均线）
-        current_price = df['close'].iloc[i]
-        ma60_current = df['ma60'].iloc[i]
-        ma60_prev = df['ma60'].iloc[i-5] if i >= 65 else ma60_current  # 5天前的MA60
-        
-        # 判断主趋势方向
-        if current_price > ma60_current and ma60_current > ma60_prev:
-            trend = "强势上涨"
-            trend_bullish = True
-        elif current_price > ma60_current and ma60_current <= ma60_prev:
-            trend = "震荡上涨"
-            trend_bullish = True
-        elif current_price <= ma60_current and ma60_current > ma60_prev:
-            trend = "高位震荡"
-            trend_bullish = False
-        else:
-            trend = "下跌趋势"
-            trend_bullish = False
-        
-        df.iloc[i, df.columns.get_loc('trend_status')] = trend
-        
-        # 2. 买入信号（只在多头趋势中给出）
-        if trend_bullish:
-            buy_conditions = []
-            
-            # 条件1：MA5上穿MA20（金叉）
-            if (df['ma5'].iloc[i] > df['ma20'].iloc[i] and 
-                df['ma5'].iloc[i-1] <= df['ma20'].iloc[i-1]):
-                buy_conditions.append('MA5上穿MA20')
-            
-            # 条件2：价格回调到MA20附近后反弹
-            if (current_price > df['ma20'].iloc[i] and 
-                current_price < df['ma20'].iloc[i] * 1.03 and  # 价格在MA20上方3%以内
-                df['close'].iloc[i-1] <= df['ma20'].iloc[i-1]):  # 前一天在MA20下方
-                buy_conditions.append('回调MA20后反弹')
-            
-            # 条件3：RSI从超卖区域回升
-            if (df['rsi'].iloc[i] > 35 and df['rsi'].iloc[i] < 60 and 
-                df['rsi'].iloc[i-1] <= 35):
-                buy_conditions.append('RSI超卖回升')
-            
-            # 条件4：MACD金叉且在零轴上方
-            if (df['macd'].iloc[i] > df['macd_signal'].iloc[i] and 
-                df['macd'].iloc[i-1] <= df['macd_signal'].iloc[i-1] and
-                df['macd'].iloc[i] > 0):
-                buy_conditions.append('MACD金叉')
-            
-            # 至少满足2个买入条件才给出买入信号
-            if len(buy_conditions) >= 2:
-                signals.append(f"买入信号: {', '.join(buy_conditions)}")
-        
-        # 3. 卖出信号（更严格的条件，减少踏空）
-        sell_conditions = []
-        
-        # 条件1：明确的趋势转弱信号
-        if not trend_bullish and trend in ["高位震荡", "下跌趋势"]:
-            # MA5下穿MA20（死叉）
-            if (df['ma5'].iloc[i] < df['ma20'].iloc[i] and 
-                df['ma5'].iloc[i-1] >= df['ma20'].iloc[i-1]):
-                sell_conditions.append('MA5下穿MA20')
-        
-        # 条件2：极度超买且出现顶部信号
-        if (df['rsi'].iloc[i] > 75 and df['rsi'].iloc[i-1] > df['rsi'].iloc[i] and
-            current_price < df['close'].iloc[i-1]):  # 价格开始下跌
-            sell_conditions.append('极度超买回落')
-        
-        # 条件3：跌破重要支撑位
-        if (current_price < df['ma60'].iloc[i] and 
-            df['close'].iloc[i-1] >= df['ma60'].iloc[i-1]):  # 跌破60日均线
-            sell_conditions.append('跌破60日均线')
-        
-        # 条件4：MACD死叉且转负
-        if (df['macd'].iloc[i] < df['macd_signal'].iloc[i] and 
-            df['macd'].iloc[i-1] >= df['macd_signal'].iloc[i-1] and
-            df['macd'].iloc[i] < 0):
-            sell_conditions.append('MACD死叉转负')
-        
-        # 至少满足2个卖出条件才给出卖出信号（减少误判）
-        if len(sell_conditions) >= 2:
-            signals.append(f"卖出信号: {', '.join(sell_conditions)}")
-        
-        # 4. 设置信号
-        if signals:
-            if any('买入信号' in s for s in signals):
-                df.iloc[i, df.columns.get_loc('signal')] = 1
-            elif any('卖出信号' in s for s in signals):
-                df.iloc[i, df.columns.get_loc('signal')] = -1
-            
-            df.iloc[i, df.columns.get_loc('signal_type')] = '; '.join(signals)
+    n = len(df)
+    if n <= 60:  # 从第60个数据点开始，确保MA60有效
+        return df
+    
+    columns = ['close', 'ma5', 'ma20', 'ma60', 'rsi', 'macd', 'macd_signal']
+    trend, buy_conditions, sell_conditions, buy_signal, sell_signal = _trading_signal_masks(
+        *(df[column].to_numpy(dtype=float) for column in columns), np.arange(n))
+    
+    # 4. 设置信号
+    signal = np.zeros(n, dtype=df['signal'].dtype)
+    signal[sell_signal] = -1
+    signal[buy_signal] = 1
+    
+    df['signal'] = signal
+    df['signal_type'] = _signal_types(buy_conditions, sell_conditions, buy_signal, sell_signal)
+    df['trend_status'] = trend
     
     return df
 
+def analyze_trading_signals_bulk(kline_dfs):
+    """
+    批量计算多个标的的技术指标和交易信号
+    
+    所有标的右对齐堆叠为一个矩阵，指标和信号条件各只计算一次，
+    每个标的的结果与 analyze_trading_signals(calculate_technical_indicators(df)) 一致。
+    K线数据未变化的标的直接使用缓存的结果，只有其余标的进入矩阵计算。
+    
+    Args:
+        kline_dfs (dict): symbol -> 以date为索引的OHLCV数据
+        
+    Returns:
+        dict: symbol -> 含指标和信号列的DataFrame（空数据的标的不包含在内）
+    """
+    keys = {symbol: frame_key(df, symbol, kind='signals')
+            for symbol, df in kline_dfs.items() if df is not None and not df.empty}
+    frames = {}
+    pending = {}
+    for symbol, key in keys.items():
+        cached = INDICATOR_CACHE.get(key)
+        if cached is None:
+            pending[symbol] = kline_dfs[symbol]
+        else:
+            frames[symbol] = cached.copy()
+    for symbol, df in _trading_signals_panel(pending).items():
+        INDICATOR_CACHE.put(keys[symbol], df)
+        frames[symbol] = df.copy()
+    # 保持输入的标的顺序
+    return {symbol: frames[symbol] for symbol in keys}
+
+def _trading_signals_panel(kline_dfs):
+    """在堆叠的矩阵上计算多个标的的技术指标和交易信号（不经过缓存）"""
+    panel = stack_klines(kline_dfs)
+    if not panel.symbols:
+        return {}
+    block = compute_panel(panel)
+    frames = panel_frames(panel, block)
+    
+    n_bars = panel.close.shape[-1]
+    lengths = np.array([len(dates) for dates in panel.dates])
+    position = np.arange(n_bars) - (n_bars - lengths)[:, None]
+    column = lambda name: block[COLUMN_INDEX[name]]
+    trend, buy_conditions, sell_conditions, buy_signal, sell_signal = _trading_signal_masks(
+        panel.close, column('ma5'), column('ma20'), column('ma60'), column('rsi'), column('macd'),
+        column('macd_signal'), position)
+    
+    for i, symbol in enumerate(panel.symbols):
+        df = frames[symbol]
+        start = n_bars - lengths[i]
+        df['signal'] = 0
+        df['signal_type'] = ''
+        df['trend_status'] = ''
+        if lengths[i] <= 60:
+            continue
+        signal = np.zeros(lengths[i], dtype=df['signal'].dtype)
+        signal[sell_signal[i, start:]] = -1
+        signal[buy_signal[i, start:]] = 1
+        df['signal'] = signal
+        df['signal_type'] = _signal_types([(name, mask[i, start:]) for name, mask in buy_conditions],
+                                          [(name, mask[i, start:]) for name, mask in sell_conditions],
+                                          buy_signal[i, start:], sell_signal[i, start:])
+        df['trend_status'] = trend[i, start:]
+    return frames
+
 # 导入认证模块
 from datetime import datetime, timedelta
 import sqlite3
@@ -879,7 +741,7 @@ class TempAuthManager:
 
 # 尝试导入真实的认证模块，如果失败则使用临时认证
 try:
-    from auth import AuthManager, init_auth_session, load_user_data, save_user_data
+    from auth import AuthManager, init_auth_session, load_user_data
     from database import DatabaseManager
 except ImportError:
     # 使用临时认证模块
@@ -899,10 +761,6 @@ except ImportError:
                 'positions': {},
                 'transactions': []
             }
-    
-    def save_user_data():
-        # 在实际应用中，这里会保存用户数据到数据库
-        pass
 
 # 初始化会话状态
 def init_session_state():
@@ -927,110 +785,104 @@ def init_session_state():
         st.session_state.last_price_update = None
     
 # 实时价格更新函数
+@st.cache_resource
+def get_price_service():
+    """进程级共享价格服务（后台线程定时刷新，所有会话共用）"""
+    # 指标引擎首次同步某标的时从本地K线存储预热，之后只处理新增K线
+    engine = IndicatorEngine(history=lambda symbol: KLINE_STORE.load(get_type_val(symbol_registry.KLINE_URLS[symbol])))
+    service = PriceService(symbol_registry.KLINE_URLS, fetch=KLINE_STORE.fetch_kline, indicators=engine)
+    service.start()
+    return service
+
+@st.cache_resource
+def get_snapshot_recorder():
+    """进程级共享的在售量快照采集器（后台线程定时采集，所有会话共用）"""
+    recorder = SnapshotRecorder(OnSaleStore())
+    recorder.start()
+    return recorder
+
+def sync_real_time_prices():
+    """将共享价格快照同步到当前会话"""
+    service = get_price_service()
+    st.session_state.real_time_prices = service.snapshot()
+    st.session_state.price_fetch_stats = service.last_stats
+
 def initialize_all_prices():
     """初始化所有物品的价格（首次运行时）"""
     if not st.session_state.real_time_prices:
-        # 静默初始化，不显示进度
-        all_symbols = [(symbol, url) for items in DATA_SOURCES.values() for symbol, url in items.items()]
-        for symbol, url in all_symbols:
-            try:
-                current_time = datetime.now()
-                end_date = current_time.strftime('%Y-%m-%d')
-                start_date = (current_time - timedelta(days=1)).strftime('%Y-%m-%d')
-                kline_df = get_kline(url, start_date, end_date)
-                if not kline_df.empty:
-                    latest_price = kline_df['close'].iloc[-1]
-                    st.session_state.real_time_prices[symbol] = {
-                        'price': latest_price,
-                        'update_time': current_time,
-                        'status': 'success'
-                    }
-                else:
-                    st.session_state.real_time_prices[symbol] = {
-                        'price': 100.0,
-                        'update_time': current_time,
-                        'status': 'no_data'
-                    }
-            except Exception as e:
-                st.session_state.real_time_prices[symbol] = {
-                    'price': 100.0,
-                    'update_time': datetime.now(),
-                    'status': 'error'
-                }
-        st.session_state.last_price_update = datetime.now()
+        # 静默初始化，不等待网络请求
+        sync_real_time_prices()
+        if not st.session_state.real_time_prices:
+            st.info("⏳ 实时价格正在后台加载，请稍后刷新页面")
 
 def update_real_time_prices():
-    """更新实时价格（每分钟更新一次）"""
-    current_time = datetime.now()
-    if (st.session_state.last_price_update is None or 
-        (current_time - st.session_state.last_price_update).seconds >= 60):
-        
-        # 静默更新，不显示spinner
-            st.session_state.last_price_update = current_time
-            updated_count = 0
-            all_symbols = [(symbol, url) for items in DATA_SOURCES.values() for symbol, url in items.items()]
-            
-            for symbol, url in all_symbols:
-                try:
-                    end_date = current_time.strftime('%Y-%m-%d')
-                    start_date = (current_time - timedelta(days=1)).strftime('%Y-%m-%d')
-                    kline_df = get_kline(url, start_date, end_date)
-                    
-                    if not kline_df.empty:
-                        latest_price = kline_df['close'].iloc[-1]
-                        st.session_state.real_time_prices[symbol] = {
-                            'price': latest_price,
-                            'update_time': current_time,
-                            'status': 'success'
-                        }
-                        updated_count += 1
-                except Exception as e:
-                    if symbol in st.session_state.real_time_prices:
-                        st.session_state.real_time_prices[symbol]['status'] = 'error'
-                        st.session_state.real_time_prices[symbol]['update_time'] = current_time
-            
-            # 强制重新计算总资产
-            if 'portfolio' in st.session_state:
-                portfolio = st.session_state.portfolio
-                total_value = portfolio['cash']
-                for symbol, position in portfolio['positions'].items():
-                    if symbol in st.session_state.real_time_prices:
-                        current_price = st.session_state.real_time_prices[symbol]['price']
-                        total_value += position['quantity'] * current_price
-                portfolio['total_value'] = total_value
-                
-            save_user_data()  # 保存更新后的数据
-            return updated_count
+    """同步后台刷新的实时价格（页面渲染不阻塞在网络请求上）"""
+    service = get_price_service()
+    if service.last_refresh is None or st.session_state.last_price_update == service.last_refresh:
+        return 0
+    
+    # 后台已发布新快照
+    st.session_state.last_price_update = service.last_refresh
+    sync_real_time_prices()
+    updated_count = sum(1 for info in st.session_state.real_time_prices.values() if not info['stale'])
+    
+    # 按新价格增量更新估值
+    if 'portfolio' in st.session_state:
+        portfolio = st.session_state.portfolio
+        total_value = get_portfolio_valuation().total_value
+        
+        # 总资产有变化时才写库；只写总资产，现金、持仓和库存只由交易事务写入，
+        # 避免过期的会话副本覆盖其他会话已提交的交易
+        if abs(total_value - portfolio.get('total_value', 0)) > 1e-6:
+            portfolio['total_value'] = total_value
+            user = st.session_state.get('user')
+            if user:
+                DatabaseManager().update_total_value(user['id'], total_value)
+    return updated_count
 
 def get_current_price(symbol):
     """获取指定标的的当前价格"""
-    all_symbols = [item for items in DATA_SOURCES.values() for item in items.keys()]
-    if symbol not in all_symbols:
+    if not symbol_registry.is_tradable(symbol):
         # 静默返回 0.0，不再 st.error
         return 0.0
-    if symbol in st.session_state.real_time_prices:
-        return st.session_state.real_time_prices[symbol]['price']
+    service = get_price_service()
+    price = service.get_current_price(symbol)
+    if price is not None:
+        return price
+    elif service.last_refresh is None:
+        # 后台首次刷新尚未完成
+        return 100.0
     else:
         st.warning(f"未获取到 {symbol} 的实时价格，使用默认价格 100.0")
         return 100.0
 
+def get_portfolio_valuation():
+    """
+    当前会话的投资组合估值
+    
+    账户重新加载后重建；价格服务发布新快照时只按新价格更新持有的标的，其余情况直接返回已有估值。
+    """
+    portfolio = st.session_state.portfolio
+    valuation = st.session_state.get('valuation')
+    if valuation is None or valuation.source is not portfolio:
+        valuation = PortfolioValuation.from_portfolio(portfolio, get_current_price)
+        st.session_state.valuation = valuation
+    
+    service = get_price_service()
+    if valuation.price_version != service.refresh_count:
+        for symbol in valuation.positions:
+            valuation.on_price(symbol, get_current_price(symbol))
+        # 已逐个标的更新过，顺便重新求和，避免长时间运行的会话累积误差
+        valuation.resync()
+        valuation.price_version = service.refresh_count
+    valuation.cash = portfolio['cash']
+    return valuation
+
 def calculate_total_portfolio_pnl():
     """计算总投资组合盈亏"""
-    portfolio = st.session_state.portfolio
-    total_cost = 0
-    total_market_value = 0
-    for symbol, position in portfolio['positions'].items():
-        current_price = get_current_price(symbol)
-        quantity = position['quantity']
-        avg_price = position['avg_price']
-        cost_value = quantity * avg_price
-        market_value = quantity * current_price
-        total_cost += cost_value
-        total_market_value += market_value
-    if total_cost > 0:
-        total_pnl = total_market_value - total_cost
-        total_pnl_percent = (total_pnl / total_cost) * 100
-        return total_market_value, total_pnl, total_pnl_percent
+    valuation = get_portfolio_valuation()
+    if valuation.cost_value > 0:
+        return valuation.market_value, valuation.total_pnl, valuation.total_pnl_percent
     else:
         return 0, 0, 0
 
@@ -1042,26 +894,11 @@ def update_inventory_availability():
     
     for symbol in portfolio['inventory']:
         inventory = portfolio['inventory'][symbol]
-        available_items = []
-        locked_items = []
-        
-        for item in inventory['locked_items']:
-            # 检查是否已过7天 - 处理字符串和datetime对象
-            purchase_date = item['purchase_date']
-            if isinstance(purchase_date, str):
-                purchase_date = datetime.fromisoformat(purchase_date)
-            
-            if (current_time - purchase_date).days >= 7:
-                available_items.append(item)
-            else:
-                locked_items.append(item)
-        
-        # 更新可用数量
-        inventory['available_quantity'] = len(available_items)
-        inventory['locked_items'] = locked_items
+        # 按批次统计已过7天的数量
+        inventory['available_quantity'] = inventory['lots'].available_quantity(current_time)
         
 def calculate_pnl(symbol, current_price):
-    """计算单个标的的盈亏情况"""
+    """计算单个标的的盈亏情况（按给定价格，不使用估值缓存）"""
     portfolio = st.session_state.portfolio
     if symbol not in portfolio['positions']:
         return 0, 0, 0
@@ -1080,181 +917,36 @@ def calculate_pnl(symbol, current_price):
 # 模拟交易函数
 def execute_trade(symbol, action, quantity, price):
     """执行模拟交易（包含库存管理和T+7限制）"""
-    portfolio = st.session_state.portfolio
-    current_time = datetime.now()
     db = DatabaseManager()
     user_id = st.session_state.user['id']
     
-    # 更新库存可用性
-    update_inventory_availability()
+    # 行情在开启事务前取好快照，避免在数据库写锁内请求价格
+    symbols = set(st.session_state.portfolio['positions']) | {symbol}
+    prices = {sym: get_current_price(sym) for sym in symbols}
     
+    # 校验、现金、持仓、库存批次和交易记录在同一个数据库事务中完成，成功后直接返回更新后的账户
+    success, message, portfolio = db.execute_trade_tx(
+        user_id, st.session_state.portfolio, symbol, action, quantity, price,
+        prices=prices
+    )
+    if not success:
+        st.error(message)
+        return False, message
+    
+    st.session_state.portfolio = portfolio
+    position = portfolio['positions'].get(symbol, {'quantity': 0, 'avg_price': 0.0})
+    get_portfolio_valuation().on_fill(symbol, position['quantity'], position['avg_price'],
+                                      prices[symbol], cash=portfolio['cash'])
     if action == "买入":
-        # 检查库存限制
-        current_total = portfolio['inventory'].get(symbol, {}).get('total_quantity', 0)
-        if current_total + quantity > portfolio['max_items_per_symbol']:
-            st.error(f"超出库存限制！当前持有 {current_total} 个，最多可持有 {portfolio['max_items_per_symbol']} 个")
-            return False, f"超出库存限制！当前持有 {current_total} 个，最多可持有 {portfolio['max_items_per_symbol']} 个"
-        
-        total_cost = quantity * price
-        if portfolio['cash'] >= total_cost:
-            portfolio['cash'] -= total_cost
-            
-            # 更新持仓
-            if symbol in portfolio['positions']:
-                old_qty = portfolio['positions'][symbol]['quantity']
-                old_price = portfolio['positions'][symbol]['avg_price']
-                new_qty = old_qty + quantity
-                new_avg_price = (old_qty * old_price + quantity * price) / new_qty
-                portfolio['positions'][symbol]['quantity'] = new_qty
-                portfolio['positions'][symbol]['avg_price'] = new_avg_price
-                # 将datetime对象转换为字符串
-                portfolio['positions'][symbol]['purchase_dates'].extend([current_time.isoformat()] * quantity)
-            else:
-                portfolio['positions'][symbol] = {
-                    'quantity': quantity,
-                    'avg_price': price,
-                    'purchase_dates': [current_time.isoformat()] * quantity
-                }
-            
-            # 更新库存
-            if symbol not in portfolio['inventory']:
-                portfolio['inventory'][symbol] = {
-                    'total_quantity': 0,
-                    'available_quantity': 0,
-                    'locked_items': []
-                }
-            
-            # 添加到锁定库存（T+7）- 将datetime转换为字符串
-            for i in range(quantity):
-                portfolio['inventory'][symbol]['locked_items'].append({
-                    'purchase_date': current_time.isoformat(),
-                    'purchase_price': price
-                })
-            
-            portfolio['inventory'][symbol]['total_quantity'] += quantity
-            
-            # 记录交易历史 - 将datetime转换为字符串
-            trade_data = {
-                'date': current_time.isoformat(),
-                'symbol': symbol,
-                'action': action,
-                'quantity': quantity,
-                'price': price,
-                'total': total_cost,
-                'type': '买入'
-            }
-            portfolio['trade_history'].append(trade_data)
-            
-            # 更新总资产
-            total_value = portfolio['cash']
-            for sym, pos in portfolio['positions'].items():
-                current_price = get_current_price(sym)
-                total_value += pos['quantity'] * current_price
-            portfolio['total_value'] = total_value
-            
-            # 保存到数据库和会话状态
-            db.add_trade_record(user_id, trade_data)
-            save_user_data()
-            load_user_data()
-            st.success(f"成功买入 {quantity} 单位 {symbol}，成交价格 ¥{price:.2f}（7天后可卖出）")
-            st.rerun()
-        else:
-            st.error(f"资金不足，需要 ¥{total_cost:.2f}，可用资金 ¥{portfolio['cash']:.2f}")
-            return False, f"资金不足，需要 ¥{total_cost:.2f}，可用资金 ¥{portfolio['cash']:.2f}"
-    
-    elif action == "卖出":
-        # 检查库存可用性
-        if symbol not in portfolio['inventory']:
-            st.error(f"未持有 {symbol}")
-            return False, f"未持有 {symbol}"
-        
-        available_qty = portfolio['inventory'][symbol]['available_quantity']
-        if available_qty < quantity:
-            locked_qty = len(portfolio['inventory'][symbol]['locked_items'])
-            st.error(f"可卖数量不足！可卖: {available_qty} 个，锁定中: {locked_qty} 个（需等待7天）")
-            return False, f"可卖数量不足！可卖: {available_qty} 个，锁定中: {locked_qty} 个（需等待7天）"
-        
-        total_revenue = quantity * price
-        portfolio['cash'] += total_revenue
-        
-        # 计算盈亏（使用FIFO方式）
-        sold_items = []
-        total_cost = 0
-        inventory = portfolio['inventory'][symbol]
-        
-        # 从最早可用的物品开始卖出
-        available_items = []
-        for item in inventory['locked_items']:
-            # 将字符串转换回datetime对象进行比较
-            purchase_date = datetime.fromisoformat(item['purchase_date']) if isinstance(item['purchase_date'], str) else item['purchase_date']
-            if (current_time - purchase_date).days >= 7:
-                available_items.append(item)
-        
-        available_items.sort(key=lambda x: datetime.fromisoformat(x['purchase_date']) if isinstance(x['purchase_date'], str) else x['purchase_date'])
-        
-        for i in range(quantity):
-            if i < len(available_items):
-                item = available_items[i]
-                sold_items.append(item)
-                total_cost += item['purchase_price']
-        
-        # 更新库存
-        for item in sold_items:
-            inventory['locked_items'].remove(item)
-        
-        inventory['total_quantity'] -= quantity
-        inventory['available_quantity'] -= quantity
-        
-        # 更新持仓
-        portfolio['positions'][symbol]['quantity'] -= quantity
-        if portfolio['positions'][symbol]['quantity'] == 0:
-            del portfolio['positions'][symbol]
-        
-        # 计算盈亏
-        pnl_amount = total_revenue - total_cost
-        pnl_percent = (pnl_amount / total_cost) * 100 if total_cost > 0 else 0
-        
-        # 记录交易历史 - 将datetime转换为字符串
-        trade_data = {
-            'date': current_time.isoformat(),
-            'symbol': symbol,
-            'action': action,
-            'quantity': quantity,
-            'price': price,
-            'total': total_revenue,
-            'cost': total_cost,
-            'pnl_amount': pnl_amount,
-            'pnl_percent': pnl_percent,
-            'type': '卖出'
-        }
-        portfolio['trade_history'].append(trade_data)
-        
-        # 更新总资产
-        total_value = portfolio['cash']
-        for sym, pos in portfolio['positions'].items():
-            current_price = get_current_price(sym)
-            total_value += pos['quantity'] * current_price
-        portfolio['total_value'] = total_value
-        
-        # 保存到数据库和会话状态
-        db.add_trade_record(user_id, trade_data)
-        save_user_data()
-        load_user_data()
-        st.success(f"成功卖出 {quantity} 单位 {symbol}，成交价格 ¥{price:.2f}")
-        st.rerun()
+        st.success(f"成功买入 {quantity} 单位 {symbol}，成交价格 ¥{price:.2f}（7天后可卖出）")
     else:
-        st.error("未知错误")
-        return False, "未知错误"
+        st.success(f"成功卖出 {quantity} 单位 {symbol}，成交价格 ¥{price:.2f}")
+    st.rerun()
 
-def calculate_portfolio_value(current_prices):
+def calculate_portfolio_value():
     """计算投资组合总价值"""
     portfolio = st.session_state.portfolio
-    total_value = portfolio['cash']
-    
-    for symbol, position in portfolio['positions'].items():
-        if symbol in current_prices:
-            total_value += position['quantity'] * current_prices[symbol]
-    
+    total_value = get_portfolio_valuation().total_value
     portfolio['total_value'] = total_value
     return total_value
 
@@ -1269,108 +961,11 @@ def t7_adjust(flag):
             flag.iloc[i] = 1
     return flag
 
-def backtest_strategy(kline_df, k0=6.7, bias_th=0.07, sell_days=3, sell_drop_th=-0.05):
-    """回测函数，增加仓位记录和买卖信号"""
-    # 计算指标
-    ret = kline_df['close'].pct_change()
-    ma5 = kline_df['close'].rolling(5).mean()
-    ma10 = kline_df['close'].rolling(10).mean()
-    ma20 = kline_df['close'].rolling(20).mean()
-    ma30 = kline_df['close'].rolling(30).mean()
-    
-    # 执行回测
-    pos = {}
-    ret_ls = []
-    
-    for i in range(19, len(kline_df)):
-        close = kline_df['close'].iloc[i]
-        bias = close / ma5.iloc[i] - 1
-        
-        # 计算价格跌幅
-        price_drop = 0
-        ma10_break = False
-        if i >= sell_days:
-            drop_cal = kline_df['close'].iloc[i-sell_days]
-            price_drop = close / drop_cal - 1
-            ma10_break = close < ma10.iloc[i]
-        
-        current_pos = sum(list(pos.values()))
-        buy = 0
-        sell = 0
-        sold_pos = 0
-        
-        # 买入逻辑
-        if ma5.iloc[i] > ma20.iloc[i] and close > ma10.iloc[i] and bias < bias_th:
-            if not pos:
-                pos[i] = 0.3
-                buy = 0.3
-            elif current_pos < 1:
-                pos[i] = 0.1
-                buy = 0.1
-        # 卖出逻辑
-        else:
-            # 清仓条件：3日跌幅超5%且跌破MA10
-            if i >= sell_days and price_drop < sell_drop_th and ma10_break:
-                sell_pos = current_pos  # 全额卖出
-                for k in list(pos.keys()):  # 清空所有持仓
-                    sold_pos += pos[k]
-                    del pos[k]
-            else:
-                # 保持原有止盈逻辑
-                sell_pos = current_pos * (1 - np.exp(-k0 * bias_th)) if bias >= bias_th else 0
-                for k in list(pos.keys()):
-                    if i - k >= 7:
-                        sold_pos += pos[k]
-                        del pos[k]
-                        if sold_pos >= sell_pos:
-                            break
-            
-            sell = sold_pos
-        
-        # 记录当日结果
-        ret_ls.append({
-            'date': kline_df.index[i],
-            'pos': current_pos + buy - sell,
-            'ret': (current_pos + buy - sell) * ret.iloc[i],
-            'buy': buy,
-            'sell': sell,
-            'price': close,
-            'ma5': ma5.iloc[i],
-            'ma10': ma10.iloc[i],
-            'ma20': ma20.iloc[i],
-            'bias': bias
-        })
-    
-    return pd.DataFrame(ret_ls).set_index('date')
-
-def get_risk_metrics(df, num=365):
-    """计算策略收益情况"""
-    if df.empty or 'ret' not in df.columns:
-        return {}
-    
-    value_df = (1 + df['ret']).cumprod()
-    annual_ret = value_df.iloc[-1] ** (num / len(df)) - 1
-    vol = df['ret'].std() * np.sqrt(num)
-    sharpe = annual_ret / vol if vol != 0 else 0
-    max_dd = (1 - value_df / value_df.cummax()).max()
-    calmar = annual_ret / max_dd if max_dd != 0 else 0
-    
-    return {
-        '总收益率': (value_df.iloc[-1] - 1),
-        '年化收益': annual_ret,
-        '波动率': vol,
-        'Sharpe': sharpe,
-        '最大回撤': max_dd,
-        'Calmar': calmar
-    }
-
 def analyze_ma_positions(kline_df):
     """分析MA趋势及交叉，提供仓位建议"""
-    # 计算移动平均线
-    ma5 = kline_df['close'].rolling(5).mean()
-    ma10 = kline_df['close'].rolling(10).mean()
-    ma20 = kline_df['close'].rolling(20).mean()
-    ma30 = kline_df['close'].rolling(30).mean()
+    # 计算移动平均线（只计算用到的4条均线，不计算其余指标）
+    lazy = IndicatorFrame(close=kline_df['close'].to_numpy(), index=kline_df.index)
+    ma5, ma10, ma20, ma30 = (lazy.series(f'ma{window}') for window in (5, 10, 20, 30))
 
     # 初始化信号列
     kline_df = kline_df.copy()
@@ -1411,6 +1006,10 @@ def main():
     # 初始化会话状态
     init_session_state()
     
+    # 后台价格刷新和在售量快照采集随应用启动，不依赖用户打开哪个页面，快照历史不会出现空档
+    get_price_service()
+    get_snapshot_recorder()
+    
     # 初始化管理员用户
     init_admin_users()
     
@@ -1458,7 +1057,7 @@ def main():
             </div>
         </div>
         """.format(
-            st.session_state.portfolio.get('cash', 100000) + sum([pos.get('quantity', 0) * get_current_price(symbol) for symbol, pos in st.session_state.portfolio.get('positions', {}).items()]),
+            get_portfolio_valuation().total_value,
             len(st.session_state.portfolio.get('positions', {}))
         ), unsafe_allow_html=True)
         
@@ -1539,6 +1138,61 @@ def main():
         # 显示登录页面
         auth.login_page()
 
+def display_walk_forward(history_df, param_axes, train_bars, test_bars, search_mode, search_budget, selected_symbol):
+    """滚动验证：逐段优化参数并显示每个测试区间的样本外表现"""
+    st.markdown("### 🔁 滚动验证（样本外表现）")
+    
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+    
+    def show_progress(done, total):
+        progress = done / total if total else 1.0
+        progress_bar.progress(progress)
+        status_text.text(f"滚动验证进度: {done}/{total} 个区间")
+    
+    with st.spinner("正在进行滚动验证..."):
+        walk_forward_result = strategy_optimizer.walk_forward(
+            history_df, param_axes, train_bars, test_bars, mode=search_mode, budget=search_budget,
+            symbol=selected_symbol, progress=show_progress
+        )
+    
+    progress_bar.empty()
+    status_text.empty()
+    
+    folds = walk_forward_result['folds']
+    if not folds:
+        st.warning("⚠️ 历史数据不足以划分训练/测试窗口，请缩短窗口或延长优化周期")
+        return
+    
+    oos_metrics = walk_forward_result['oos_metrics']
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("验证区间数", f"{len(folds)}")
+    with col2:
+        st.metric("平均样本外夏普", f"{walk_forward_result['mean_oos_sharpe']:.3f}")
+    with col3:
+        st.metric("样本外整体夏普", f"{oos_metrics.get('Sharpe', 0):.3f}")
+    with col4:
+        st.metric("样本外总收益", f"{oos_metrics.get('总收益率', 0)*100:.2f}%")
+    
+    fold_rows = []
+    for fold in folds:
+        params = fold['best_params'] or {}
+        fold_rows.append({
+            '区间': fold['fold'] + 1,
+            '训练期': f"{fold['train_start'].strftime('%Y-%m-%d')} ~ {fold['train_end'].strftime('%Y-%m-%d')}",
+            '测试期': f"{fold['test_start'].strftime('%Y-%m-%d')} ~ {fold['test_end'].strftime('%Y-%m-%d')}",
+            'K因子': params.get('k0'),
+            '偏离阈值': params.get('bias_th'),
+            '观察天数': params.get('sell_days'),
+            '止损阈值': params.get('sell_drop_th'),
+            '样本内夏普': fold['train_sharpe'],
+            '样本外夏普': fold['test_sharpe'],
+            '样本外收益': fold['test_return'],
+            '样本外回撤': fold['test_max_drawdown']
+        })
+    st.dataframe(pd.DataFrame(fold_rows).set_index('区间'), use_container_width=True)
+
 def kline_analysis_page():
     """K线分析页面 - 基于回测系统优化的策略分析"""
     # 确保session state已初始化
@@ -1621,6 +1275,44 @@ def kline_analysis_page():
         with col2:
             sell_days_range = st.slider("观察天数范围", min_value=1, max_value=10, value=(2, 5), step=1)
             sell_drop_range = st.slider("止损阈值范围", min_value=-0.20, max_value=-0.01, value=(-0.10, -0.03), step=0.01)
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            search_mode = st.selectbox(
+                "搜索方式",
+                options=list(strategy_optimizer.SEARCH_MODES.keys()),
+                format_func=lambda mode: strategy_optimizer.SEARCH_MODES[mode],
+                index=0,
+                help="网格搜索回测全部组合；其他方式在回测次数预算内搜索，连续多轮无提升时提前停止"
+            )
+        
+        with col2:
+            search_budget = st.number_input(
+                "回测次数预算",
+                min_value=50,
+                max_value=20000,
+                value=strategy_optimizer.DEFAULT_BUDGET,
+                step=50,
+                disabled=search_mode == 'grid'
+            )
+        
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            walk_forward_enabled = st.checkbox(
+                "滚动验证（Walk-forward）",
+                value=False,
+                help="在历史数据上滑动训练/测试窗口，逐段优化参数并统计样本外表现"
+            )
+        
+        with col2:
+            wf_train_bars = st.number_input("训练窗口（K线数）", min_value=30, max_value=365, value=60, step=10,
+                                            disabled=not walk_forward_enabled)
+        
+        with col3:
+            wf_test_bars = st.number_input("测试窗口（K线数）", min_value=5, max_value=90, value=14, step=1,
+                                           disabled=not walk_forward_enabled)
     
     # 开始智能分析按钮
     col1, col2, col3 = st.columns([1, 2, 1])
@@ -1638,97 +1330,40 @@ def kline_analysis_page():
                 st.markdown("### 🔍 第一步：策略参数优化")
                 
                 with st.spinner("正在获取历史数据进行策略优化..."):
-                    # 获取优化用的历史数据
+                    # 一次获取优化、滚动验证和分析需要的全部历史，各步骤按日期截取
                     optimization_start_str = optimization_start.strftime('%Y-%m-%d')
                     optimization_end_str = optimization_end.strftime('%Y-%m-%d')
+                    analysis_start_str = analysis_start.strftime('%Y-%m-%d')
+                    analysis_end_str = analysis_end.strftime('%Y-%m-%d')
                     
-                    optimization_df = get_kline(data_url, optimization_start_str, optimization_end_str)
+                    history_df = get_kline(data_url, min(optimization_start, analysis_start).strftime('%Y-%m-%d'),
+                                           analysis_end_str)
+                    optimization_df = kline_data.filter_by_date(history_df, optimization_start_str, optimization_end_str)
                     
                     if optimization_df.empty:
                         st.error("❌ 无法获取优化数据，请检查网络连接")
                         return
                 
-                # 参数优化过程
+                # 参数优化过程（多进程并行回测，结果按数据缓存）
                 with st.spinner("正在寻找最佳策略参数..."):
-                    best_params = None
-                    best_sharpe = -999
-                    optimization_results = []
-                    
-                    # 创建参数组合
-                    k0_values = np.arange(k0_range[0], k0_range[1] + 0.5, 0.5)
-                    bias_th_values = np.arange(bias_th_range[0], bias_th_range[1] + 0.01, 0.01)
-                    sell_days_values = range(int(sell_days_range[0]), int(sell_days_range[1]) + 1)
-                    sell_drop_values = np.arange(sell_drop_range[0], sell_drop_range[1] + 0.01, 0.01)
-                    
-                    # 限制组合数量以避免过长时间
-                    max_combinations = 100
-                    total_combinations = len(k0_values) * len(bias_th_values) * len(sell_days_values) * len(sell_drop_values)
-                    
-                    if total_combinations > max_combinations:
-                        # 采样减少组合数
-                        k0_values = k0_values[::max(1, len(k0_values) // 5)]
-                        bias_th_values = bias_th_values[::max(1, len(bias_th_values) // 5)]
-                        sell_days_values = list(sell_days_values)[::max(1, len(sell_days_values) // 3)]
-                        sell_drop_values = sell_drop_values[::max(1, len(sell_drop_values) // 4)]
+                    param_axes = strategy_optimizer.build_param_axes(
+                        k0_range, bias_th_range, sell_days_range, sell_drop_range
+                    )
                     
                     # 进度条
                     progress_bar = st.progress(0)
                     status_text = st.empty()
                     
-                    combination_count = 0
-                    total_count = len(k0_values) * len(bias_th_values) * len(sell_days_values) * len(sell_drop_values)
+                    def show_progress(done, total):
+                        progress = done / total if total else 1.0
+                        progress_bar.progress(progress)
+                        status_text.text(f"优化进度: {done}/{total} ({progress*100:.1f}%)")
                     
-                    # 遍历参数组合
-                    for k0 in k0_values:
-                        for bias_th in bias_th_values:
-                            for sell_days in sell_days_values:
-                                for sell_drop_th in sell_drop_values:
-                                    try:
-                                        # 执行回测
-                                        backtest_result = backtest_strategy(optimization_df, k0, bias_th, sell_days, sell_drop_th)
-                                        
-                                        if not backtest_result.empty and len(backtest_result) > 10:
-                                            # 计算绩效指标
-                                            risk_metrics = get_risk_metrics(backtest_result)
-                                            sharpe = risk_metrics.get('Sharpe', -999)
-                                            
-                                            # 记录结果
-                                            optimization_results.append({
-                                                'k0': k0,
-                                                'bias_th': bias_th,
-                                                'sell_days': sell_days,
-                                                'sell_drop_th': sell_drop_th,
-                                                'sharpe': sharpe,
-                                                'total_return': risk_metrics.get('总收益率', 0),
-                                                'annual_return': risk_metrics.get('年化收益', 0),
-                                                'max_drawdown': risk_metrics.get('最大回撤', 0)
-                                            })
-                                            
-                                            # 更新最佳参数
-                                            if sharpe > best_sharpe:
-                                                best_sharpe = sharpe
-                                                best_params = {
-                                                    'k0': k0,
-                                                    'bias_th': bias_th,
-                                                    'sell_days': sell_days,
-                                                    'sell_drop_th': sell_drop_th,
-                                                    'metrics': risk_metrics
-                                                }
-                                    
-                                    except Exception as e:
-
-                                    
-                                        pass  # 忽略单个参数组合的错误
-
-                                    
-                                    
-
-                                    
-                                    # 更新进度
-                                    combination_count += 1
-                                    progress = combination_count / total_count
-                                    progress_bar.progress(progress)
-                                    status_text.text(f"优化进度: {combination_count}/{total_count} ({progress*100:.1f}%)")
+                    optimization = strategy_optimizer.search(
+                        optimization_df, param_axes, mode=search_mode, budget=search_budget,
+                        symbol=selected_symbol, progress=show_progress
+                    )
+                    best_params = optimization['best_params']
                 
                 # 清除进度显示
                 progress_bar.empty()
@@ -1763,22 +1398,24 @@ def kline_analysis_page():
                 with col4:
                     st.metric("最大回撤", f"{metrics.get('最大回撤', 0)*100:.2f}%")
                 
+                # 滚动验证：在已获取的历史上统计样本外表现
+                if walk_forward_enabled:
+                    display_walk_forward(history_df, param_axes, int(wf_train_bars), int(wf_test_bars),
+                                         search_mode, search_budget, selected_symbol)
+                
                 # 第二步：应用最佳策略进行K线分析
                 st.markdown("### 📈 第二步：基于最佳策略的K线分析")
                 
-                with st.spinner("正在获取最新数据并应用最佳策略..."):
-                    # 获取分析用的最新数据
-                    analysis_start_str = analysis_start.strftime('%Y-%m-%d')
-                    analysis_end_str = analysis_end.strftime('%Y-%m-%d')
-                    
-                    analysis_df = get_kline(data_url, analysis_start_str, analysis_end_str)
+                with st.spinner("正在应用最佳策略..."):
+                    # 分析用的最新数据（从已获取的历史中截取）
+                    analysis_df = kline_data.filter_by_date(history_df, analysis_start_str, analysis_end_str)
                     
                     if analysis_df.empty:
                         st.error("❌ 无法获取分析数据")
                         return
                 
                     # 计算技术指标
-                    analysis_df = calculate_technical_indicators_talib(analysis_df)
+                    analysis_df = calculate_technical_indicators_talib(analysis_df, selected_symbol)
                     
                     # 应用最佳策略进行回测
                     strategy_result = backtest_strategy(
@@ -2079,18 +1716,13 @@ def simulation_trading_page():
             </div>
         </div>
     </div>
-    """.format(sum(len(items) for items in DATA_SOURCES.values())), unsafe_allow_html=True)
+    """.format(len(symbol_registry.KLINE_URLS)), unsafe_allow_html=True)
     
     # 投资组合概览
     portfolio = st.session_state.portfolio
     
     # 使用实时价格计算总价值
-    current_prices = {}
-    for category_items in DATA_SOURCES.values():
-        for symbol in category_items.keys():
-            current_prices[symbol] = get_current_price(symbol)
-    
-    total_value = calculate_portfolio_value(current_prices)
+    total_value = calculate_portfolio_value()
     total_pnl = total_value - 100000  # 初始资金10万
     pnl_pct = (total_pnl / 100000) * 100
     
@@ -2363,13 +1995,10 @@ def simulation_trading_page():
                 if inventory.get('total_quantity', 0) > 0:
                     current_price = get_current_price(symbol)
                     total_qty = inventory.get('total_quantity', 0)
-                    locked_items_list = inventory.get('locked_items', [])
+                    lots = inventory['lots']
                     
                     # 计算平均成本
-                    total_cost = 0
-                    for item in locked_items_list:
-                        total_cost += item.get('purchase_price', current_price)
-                    avg_cost = total_cost / len(locked_items_list) if locked_items_list else current_price
+                    avg_cost = lots.avg_cost(default=current_price)
                     
                     total_value = total_qty * current_price
                     pnl_amount = total_value - (total_qty * avg_cost)
@@ -2395,11 +2024,7 @@ def simulation_trading_page():
             for symbol, inventory in portfolio['inventory'].items():
                 if inventory.get('total_quantity', 0) > 0:
                     # 确定分类
-                    item_category = "未知"
-                    for cat, items in DATA_SOURCES.items():
-                        if symbol in items:
-                            item_category = cat
-                            break
+                    item_category = symbol_registry.category_of(symbol, "未知")
                     
                     # 应用分类筛选
                     if filter_category != "全部" and item_category != filter_category:
@@ -2416,29 +2041,16 @@ def simulation_trading_page():
                     
                     # 计算价值和盈亏
                     total_value = total_qty * current_price
-                    locked_items_list = inventory.get('locked_items', [])
+                    lots = inventory['lots']
                     
                     # 计算平均成本
-                    total_cost = 0
-                    for item in locked_items_list:
-                        total_cost += item.get('purchase_price', current_price)
-                    avg_cost = total_cost / len(locked_items_list) if locked_items_list else current_price
+                    avg_cost = lots.avg_cost(default=current_price)
                     
                     pnl_amount = total_value - (total_qty * avg_cost)
                     pnl_percent = (pnl_amount / (total_qty * avg_cost)) * 100 if avg_cost > 0 else 0
                     
                     # 计算剩余锁定时间
-                    min_unlock_time = None
-                    if locked_items_list:
-                        current_time = datetime.now()
-                        for item in locked_items_list:
-                            purchase_date = item['purchase_date']
-                            if isinstance(purchase_date, str):
-                                purchase_date = datetime.fromisoformat(purchase_date)
-                            unlock_time = purchase_date + timedelta(days=7)
-                            if unlock_time > current_time:
-                                if min_unlock_time is None or unlock_time < min_unlock_time:
-                                    min_unlock_time = unlock_time
+                    min_unlock_time = lots.next_unlock()
                     
                     inventory_items.append({
                         'symbol': symbol,
@@ -2607,33 +2219,20 @@ def simulation_trading_page():
             # 持仓概览
             st.markdown("#### 💼 持仓概览")
             
-            # 创建持仓数据
+            # 创建持仓数据（直接读取估值中按标的维护的市值和盈亏）
+            valuation = get_portfolio_valuation()
             position_data = []
-            total_cost = 0
-            total_market_value = 0
             
-            for symbol, position in portfolio['positions'].items():
-                current_price = get_current_price(symbol)
-                quantity = position['quantity']
-                avg_price = position['avg_price']
-                
-                cost_value = quantity * avg_price
-                market_value = quantity * current_price
-                pnl_amount = market_value - cost_value
-                pnl_percent = (pnl_amount / cost_value) * 100 if cost_value > 0 else 0
-                
-                total_cost += cost_value
-                total_market_value += market_value
-                
+            for symbol, entry in valuation.positions.items():
                 position_data.append({
                     '标的名称': symbol,
-                    '持有数量': f"{quantity} 个",
-                    '平均成本': f"¥{avg_price:.2f}",
-                    '当前价格': f"¥{current_price:.2f}",
-                    '成本价值': f"¥{cost_value:.2f}",
-                    '市场价值': f"¥{market_value:.2f}",
-                    '盈亏金额': f"¥{pnl_amount:.2f}",
-                    '盈亏比例': f"{pnl_percent:+.2f}%"
+                    '持有数量': f"{entry['quantity']} 个",
+                    '平均成本': f"¥{entry['avg_price']:.2f}",
+                    '当前价格': f"¥{entry['price']:.2f}",
+                    '成本价值': f"¥{entry['cost_value']:.2f}",
+                    '市场价值': f"¥{entry['market_value']:.2f}",
+                    '盈亏金额': f"¥{entry['pnl_amount']:.2f}",
+                    '盈亏比例': f"{entry['pnl_percent']:+.2f}%"
                 })
             
             # 显示持仓表格
@@ -2641,8 +2240,10 @@ def simulation_trading_page():
             st.dataframe(df_positions, use_container_width=True)
             
             # 持仓统计
-            total_pnl = total_market_value - total_cost
-            total_pnl_percent = (total_pnl / total_cost) * 100 if total_cost > 0 else 0
+            total_cost = valuation.cost_value
+            total_market_value = valuation.market_value
+            total_pnl = valuation.total_pnl
+            total_pnl_percent = valuation.total_pnl_percent
             
             col1, col2, col3, col4 = st.columns(4)
             with col1:
@@ -2701,8 +2302,11 @@ def simulation_trading_page():
                     # 计算投资组合总价值
                     portfolio_total_value = total_market_value + portfolio['cash']
                     
+                    # 所有持仓的指标和信号在一个矩阵上一次算完
+                    analyzed_klines = analyze_trading_signals_bulk(get_position_klines(portfolio['positions']))
                     for symbol, position in portfolio['positions'].items():
-                        analysis = analyze_position_with_kline(symbol, position, portfolio_total_value)
+                        kline_df = analyzed_klines.get(symbol, pd.DataFrame())
+                        analysis = analyze_position_with_kline(symbol, position, portfolio_total_value, kline_df)
                         analysis_results.append(analysis)
                     
                     st.session_state.position_analysis_results = analysis_results
@@ -3278,24 +2882,20 @@ def render_user_overview():
     st.markdown("##### 📊 用户总览")
     
     try:
-        from database import DatabaseManager
+        from database import DatabaseManager, get_connection
         db = DatabaseManager()
         
         # 获取所有用户信息
-        import sqlite3
-        conn = sqlite3.connect("trading_platform.db")
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT u.id, u.username, u.display_name, u.email, u.is_active, u.created_at,
-                   ua.cash, ua.total_value
-            FROM users u
-            LEFT JOIN user_accounts ua ON u.id = ua.user_id
-            ORDER BY u.created_at DESC
-        """)
-        
-        users_data = cursor.fetchall()
-        conn.close()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT u.id, u.username, u.display_name, u.email, u.is_active, u.created_at,
+                       ua.cash, ua.total_value
+                FROM users u
+                LEFT JOIN user_accounts ua ON u.id = ua.user_id
+                ORDER BY u.created_at DESC
+            """)
+            users_data = cursor.fetchall()
         
         if users_data:
             # 创建用户数据表格
@@ -3337,16 +2937,13 @@ def render_fund_management():
     
     # 选择用户
     try:
-        from database import DatabaseManager
+        from database import DatabaseManager, get_connection
         db = DatabaseManager()
         
-        import sqlite3
-        conn = sqlite3.connect("trading_platform.db")
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT id, username, display_name FROM users WHERE is_active = 1")
-        users = cursor.fetchall()
-        conn.close()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, username, display_name FROM users WHERE is_active = 1")
+            users = cursor.fetchall()
         
         if users:
             user_options = {f"{user[1]} ({user[2]})": user[0] for user in users}
@@ -3356,11 +2953,10 @@ def render_fund_management():
                 user_id = user_options[selected_user]
                 
                 # 获取用户当前资金
-                conn = sqlite3.connect("trading_platform.db")
-                cursor = conn.cursor()
-                cursor.execute("SELECT cash, total_value FROM user_accounts WHERE user_id = ?", (user_id,))
-                account_data = cursor.fetchone()
-                conn.close()
+                with get_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("SELECT cash, total_value FROM user_accounts WHERE user_id = ?", (user_id,))
+                    account_data = cursor.fetchone()
                 
                 if account_data:
                     current_cash, current_total = account_data
@@ -3390,15 +2986,14 @@ def render_fund_management():
                             
                             # 更新数据库
                             try:
-                                conn = sqlite3.connect("trading_platform.db")
-                                cursor = conn.cursor()
-                                cursor.execute("""
-                                    UPDATE user_accounts 
-                                    SET cash = ?, total_value = ?, updated_at = CURRENT_TIMESTAMP
-                                    WHERE user_id = ?
-                                """, (new_cash, new_cash, user_id))
-                                conn.commit()
-                                conn.close()
+                                with get_connection() as conn:
+                                    cursor = conn.cursor()
+                                    cursor.execute("""
+                                        UPDATE user_accounts 
+                                        SET cash = ?, total_value = ?, updated_at = CURRENT_TIMESTAMP
+                                        WHERE user_id = ?
+                                    """, (new_cash, new_cash, user_id))
+                                    conn.commit()
                                 
                                 st.success(f"✅ 资金调整成功！{selected_user} 的现金已调整为 ¥{new_cash:,.2f}")
                                 st.rerun()
@@ -3420,16 +3015,13 @@ def render_user_management():
     st.markdown("##### 👥 用户管理")
     
     try:
-        from database import DatabaseManager
+        from database import DatabaseManager, get_connection
         db = DatabaseManager()
         
-        import sqlite3
-        conn = sqlite3.connect("trading_platform.db")
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT id, username, display_name, email, is_active FROM users")
-        users = cursor.fetchall()
-        conn.close()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, username, display_name, email, is_active FROM users")
+            users = cursor.fetchall()
         
         if users:
             for user in users:
@@ -3449,11 +3041,10 @@ def render_user_management():
                         if new_status != bool(is_active):
                             if st.button(f"更新状态", key=f"update_{user_id}"):
                                 try:
-                                    conn = sqlite3.connect("trading_platform.db")
-                                    cursor = conn.cursor()
-                                    cursor.execute("UPDATE users SET is_active = ? WHERE id = ?", (new_status, user_id))
-                                    conn.commit()
-                                    conn.close()
+                                    with get_connection() as conn:
+                                        cursor = conn.cursor()
+                                        cursor.execute("UPDATE users SET is_active = ? WHERE id = ?", (new_status, user_id))
+                                        conn.commit()
                                     st.success("状态更新成功！")
                                     st.rerun()
                                 except Exception as e:
@@ -3466,11 +3057,10 @@ def render_user_management():
                                 new_password = "123456"  # 默认密码
                                 password_hash = db.hash_password(new_password)
                                 
-                                conn = sqlite3.connect("trading_platform.db")
-                                cursor = conn.cursor()
-                                cursor.execute("UPDATE users SET password_hash = ? WHERE id = ?", (password_hash, user_id))
-                                conn.commit()
-                                conn.close()
+                                with get_connection() as conn:
+                                    cursor = conn.cursor()
+                                    cursor.execute("UPDATE users SET password_hash = ? WHERE id = ?", (password_hash, user_id))
+                                    conn.commit()
                                 
                                 st.success(f"密码已重置为: {new_password}")
                             except Exception as e:
@@ -3506,31 +3096,29 @@ def render_system_statistics():
     st.markdown("##### 📈 系统统计")
     
     try:
-        import sqlite3
-        conn = sqlite3.connect("trading_platform.db")
-        cursor = conn.cursor()
-        
-        # 用户统计
-        cursor.execute("SELECT COUNT(*) FROM users")
-        total_users = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM users WHERE is_active = 1")
-        active_users = cursor.fetchone()[0]
-        
-        # 资金统计
-        cursor.execute("SELECT SUM(cash), SUM(total_value) FROM user_accounts")
-        cash_total, assets_total = cursor.fetchone()
-        cash_total = cash_total or 0
-        assets_total = assets_total or 0
-        
-        # 交易统计
-        cursor.execute("SELECT COUNT(*) FROM trade_records")
-        total_trades = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(DISTINCT user_id) FROM trade_records")
-        trading_users = cursor.fetchone()[0]
-        
-        conn.close()
+        from database import get_connection
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            
+            # 用户统计
+            cursor.execute("SELECT COUNT(*) FROM users")
+            total_users = cursor.fetchone()[0]
+            
+            cursor.execute("SELECT COUNT(*) FROM users WHERE is_active = 1")
+            active_users = cursor.fetchone()[0]
+            
+            # 资金统计
+            cursor.execute("SELECT SUM(cash), SUM(total_value) FROM user_accounts")
+            cash_total, assets_total = cursor.fetchone()
+            cash_total = cash_total or 0
+            assets_total = assets_total or 0
+            
+            # 交易统计
+            cursor.execute("SELECT COUNT(*) FROM trades")
+            total_trades = cursor.fetchone()[0]
+            
+            cursor.execute("SELECT COUNT(DISTINCT user_id) FROM trades")
+            trading_users = cursor.fetchone()[0]
         
         # 显示统计信息
         col1, col2, col3, col4 = st.columns(4)
@@ -3613,33 +3201,22 @@ def render_user_panel(user, portfolio):
     
     if portfolio['positions']:
         # 计算投资组合数据
-        total_cost = 0
-        total_market_value = 0
-        position_data = []
-        
-        for symbol, position in portfolio['positions'].items():
-            current_price = get_current_price(symbol)
-            quantity = position['quantity']
-            avg_price = position['avg_price']
-            
-            cost_value = quantity * avg_price
-            market_value = quantity * current_price
-            pnl_amount = market_value - cost_value
-            pnl_percent = (pnl_amount / cost_value) * 100 if cost_value > 0 else 0
-            
-            total_cost += cost_value
-            total_market_value += market_value
-            
-            position_data.append({
+        valuation = get_portfolio_valuation()
+        position_data = [
+            {
                 'symbol': symbol,
-                'market_value': market_value,
-                'pnl_amount': pnl_amount,
-                'pnl_percent': pnl_percent
-            })
+                'market_value': entry['market_value'],
+                'pnl_amount': entry['pnl_amount'],
+                'pnl_percent': entry['pnl_percent']
+            }
+            for symbol, entry in valuation.positions.items()
+        ]
         
         # 投资组合概览
-        total_pnl = total_market_value - total_cost
-        total_pnl_percent = (total_pnl / total_cost) * 100 if total_cost > 0 else 0
+        total_cost = valuation.cost_value
+        total_market_value = valuation.market_value
+        total_pnl = valuation.total_pnl
+        total_pnl_percent = valuation.total_pnl_percent
         
         col1, col2, col3, col4 = st.columns(4)
         with col1:
@@ -3735,7 +3312,7 @@ def render_user_panel(user, portfolio):
     with col2:
         if st.button("📜 导出交易历史", use_container_width=True):
             if portfolio['trade_history']:
-                df = pd.DataFrame(portfolio['trade_history'])
+                df = pd.DataFrame(list(portfolio['trade_history']))
                 csv = df.to_csv(index=False, encoding='utf-8-sig')
                 st.download_button(
                     label="下载交易历史CSV",
@@ -3751,7 +3328,12 @@ def render_user_panel(user, portfolio):
             # 创建完整的数据备份
             backup_data = {
                 'user_info': user,
-                'portfolio': portfolio,
+                'portfolio': dict(
+                    portfolio,
+                    inventory={symbol: dict(inv, lots=inv['lots'].to_records())
+                               for symbol, inv in portfolio['inventory'].items()},
+                    trade_history=list(portfolio['trade_history'])
+                ),
                 'export_time': datetime.now().isoformat()
             }
             
@@ -3765,15 +3347,25 @@ def render_user_panel(user, portfolio):
             )
 
 # 智能仓位分析函数
-def analyze_position_with_kline(symbol, position_info, portfolio_total_value):
-    """基于K线分析的智能仓位建议"""
+def get_position_klines(symbols):
+    """获取持仓分析用的最近30天K线"""
+    current_time = datetime.now()
+    end_date = current_time.strftime('%Y-%m-%d')
+    start_date = (current_time - timedelta(days=30)).strftime('%Y-%m-%d')
+    return {symbol: get_kline(symbol_registry.kline_url(symbol), start_date, end_date)
+            for symbol in symbols if symbol_registry.kline_url(symbol)}
+
+def analyze_position_with_kline(symbol, position_info, portfolio_total_value, kline_df=None):
+    """
+    基于K线分析的智能仓位建议
+    
+    Args:
+        kline_df (pd.DataFrame): 已计算指标和交易信号的K线（见 analyze_trading_signals_bulk），
+            为None时单独获取并计算
+    """
     try:
         # 获取该标的的数据源URL
-        symbol_url = None
-        for category_items in DATA_SOURCES.values():
-            if symbol in category_items:
-                symbol_url = category_items[symbol]
-                break
+        symbol_url = symbol_registry.kline_url(symbol)
         
         if not symbol_url:
             return {
@@ -3783,12 +3375,13 @@ def analyze_position_with_kline(symbol, position_info, portfolio_total_value):
                 'risk_level': 'unknown'
             }
         
-        # 获取最近30天的K线数据进行分析
-        current_time = datetime.now()
-        end_date = current_time.strftime('%Y-%m-%d')
-        start_date = (current_time - timedelta(days=30)).strftime('%Y-%m-%d')
-        
-        kline_df = get_kline(symbol_url, start_date, end_date)
+        if kline_df is None:
+            # 获取最近30天的K线数据进行分析
+            kline_df = get_position_klines([symbol])[symbol]
+            if not kline_df.empty:
+                # 计算技术指标
+                kline_df = calculate_technical_indicators_talib(kline_df, symbol)
+                kline_df = analyze_trading_signals(kline_df)
         
         if kline_df.empty:
             return {
@@ -3798,10 +3391,6 @@ def analyze_position_with_kline(symbol, position_info, portfolio_total_value):
                 'risk_level': 'high'
             }
         
-        # 计算技术指标
-        kline_df = calculate_technical_indicators_talib(kline_df)
-        kline_df = analyze_trading_signals(kline_df)
-        
         # 获取最新数据
         latest_data = kline_df.iloc[-1]
         current_price = latest_data['close']
@@ -4174,10 +3763,7 @@ def analyze_total_position_risk(portfolio):
         investment_ratio = (invested_amount / initial_capital) * 100
         
         # 计算当前总市值
-        total_market_value = 0
-        for symbol, position in portfolio['positions'].items():
-            current_price = get_current_price(symbol)
-            total_market_value += position['quantity'] * current_price
+        total_market_value = get_portfolio_valuation().market_value
         
         # 计算总盈亏
         total_pnl = total_market_value - invested_amount
@@ -5113,17 +4699,17 @@ def generate_enhanced_trading_recommendations(df, market_analysis):
     return enhanced_recommendations
 
 # 添加一个简单的包装函数来替代原始的计算函数调用
-def calculate_indicators(df):
+def calculate_indicators(df, symbol=None):
     """智能选择最佳的指标计算方法"""
     # 首先检查是否有传统方法的计算函数
     if 'calculate_technical_indicators' in globals():
         if TALIB_AVAILABLE:
-            return calculate_technical_indicators_talib(df)
+            return calculate_technical_indicators_talib(df, symbol)
         else:
-            return calculate_technical_indicators(df)
+            return calculate_technical_indicators(df, symbol)
     # 如果没有传统方法的函数，直接使用TA-Lib函数
     elif TALIB_AVAILABLE:
-        return calculate_technical_indicators_talib(df)
+        return calculate_technical_indicators_talib(df, symbol)
     # 最后的后备方案，使用基本的计算方法
     else:
         # 提供一个最基本的指标计算，确保程序不会崩溃
@@ -5148,23 +4734,20 @@ def is_admin_user(user):
     
     # 方式2：通过数据库字段判断（推荐方式）
     try:
-        import sqlite3
-        conn = sqlite3.connect("trading_platform.db")
-        cursor = conn.cursor()
-        
-        # 检查用户表是否有user_type字段
-        cursor.execute("PRAGMA table_info(users)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        if 'user_type' in columns:
-            cursor.execute("SELECT user_type FROM users WHERE username = ?", (user.get('username'),))
-            result = cursor.fetchone()
-            conn.close()
+        from database import get_connection
+        with get_connection() as conn:
+            cursor = conn.cursor()
             
-            if result and result[0] == 'admin':
-                return True
-        else:
-            conn.close()
+            # 检查用户表是否有user_type字段
+            cursor.execute("PRAGMA table_info(users)")
+            columns = [column[1] for column in cursor.fetchall()]
+            
+            if 'user_type' in columns:
+                cursor.execute("SELECT user_type FROM users WHERE username = ?", (user.get('username'),))
+                result = cursor.fetchone()
+                
+                if result and result[0] == 'admin':
+                    return True
     except Exception:
         pass
     
@@ -5173,24 +4756,23 @@ def is_admin_user(user):
 def set_user_admin_status(username, is_admin=True):
     """设置用户的管理员状态"""
     try:
-        import sqlite3
-        conn = sqlite3.connect("trading_platform.db")
-        cursor = conn.cursor()
-        
-        # 检查用户表是否有user_type字段，如果没有则添加
-        cursor.execute("PRAGMA table_info(users)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        if 'user_type' not in columns:
-            cursor.execute("ALTER TABLE users ADD COLUMN user_type TEXT DEFAULT 'user'")
+        from database import get_connection
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            
+            # 检查用户表是否有user_type字段，如果没有则添加
+            cursor.execute("PRAGMA table_info(users)")
+            columns = [column[1] for column in cursor.fetchall()]
+            
+            if 'user_type' not in columns:
+                cursor.execute("ALTER TABLE users ADD COLUMN user_type TEXT DEFAULT 'user'")
+                conn.commit()
+            
+            # 设置用户类型
+            user_type = 'admin' if is_admin else 'user'
+            cursor.execute("UPDATE users SET user_type = ? WHERE username = ?", (user_type, username))
             conn.commit()
         
-        # 设置用户类型
-        user_type = 'admin' if is_admin else 'user'
-        cursor.execute("UPDATE users SET user_type = ? WHERE username = ?", (user_type, username))
-        conn.commit()
-        conn.close()
-        
         return True
     except Exception as e:
         print(f"设置管理员状态失败: {e}")